@@ -2,9 +2,10 @@
 import os
 import threading
 from traceback import print_exc
-from typing import List, Dict, Optional
 
 from BitTornado.Meta.BTTree import BTTree
+from BitTornado.Meta.FileFilter import FileFilter
+from BitTornado.Meta.FileTable import FileTable
 from BitTornado.Meta.Info import MetaInfo
 
 defaults = [
@@ -20,7 +21,15 @@ defaults = [
         "optional specification for filesystem encoding " +
         "(set automatically in recent Python versions)"),
     ('target', '',
-        "optional target file for the torrent")
+        "optional target file for the torrent"),
+    ('hash_threads', 1,
+        "number of threads used to hash pieces (1 = hash while reading)"),
+    ('read_size', 0,
+        "bytes per read, rounded up to whole pieces (0 = one piece)"),
+    ('read_mmap', False,
+        "read files through mmap, falling back to regular reads"),
+    ('read_drop_cache', False,
+        "advise the OS to drop file data from the page cache once hashed")
 ]
 
 ignore = ['core', 'CVS']
@@ -46,113 +55,30 @@ httpseeds = optional list of http-seed URLs, in the format:
         url[|url...]"""
 
 
-def is_file_valid(file_obj, params):
-    path = [x2.lower() for x2 in file_obj.path]
-
-    # Check if any of the file/foldernames contain a blacklisted word
-    for match in params['blacklist_path_matches']:
-        for pathsegment in path:
-            if match == pathsegment:
-                return False
-
-        filename = os.path.splitext(os.path.basename(path[-1]))[0]
-        if filename.lower().endswith(match.lower()):  # exact/postfix match
-            return False
-
-    # Check if the file is on the extension blacklist
-    if path[-1].endswith(tuple(params['blacklist_file_extensions'])):
-        return False
-
-    return True
-
-
-def remove_invalid_files(tree: BTTree, params: Dict) -> None:
-    """Remove blacklisted files from the metadata tree"""
-    to_remove = []
-    find_paths_to_remove(tree, params, to_remove)
-
-    for path in to_remove:
-        did_remove = remove_invalid_file(tree, path)
-        next_path = next_in_file_sequence(path)
-        while did_remove and next_path:
-            did_remove = remove_invalid_file(tree, next_path)
-            next_path = next_in_file_sequence(next_path)
-
-
-def next_in_file_sequence(path: List[str]) -> Optional[List[str]]:
-    """Return the next filename in a logical sequence"""
-    parts = path[-1].lower().split('.')
-    if len(parts) == 1:
-        return None
-    name = '.'.join(parts[:-1])
-    ext = parts[-1].lower()
-
-    # rar .r00+
-    if ext == 'rar':
-        return path[:-1] + [f"{name}.r00"]
-    elif ext[0] == 'r' and ext[1:].isnumeric():
-        num = int(ext[1:]) + 1
-        if num == 99:
-            return path[:-1] + [f"{name}.000"]
-        return path[:-1] + [f"{name}.r{num:02}"]
-
-    # zip .z01+
-    elif ext == 'zip':
-        return path[:-1] + [f"{name}.z01"]
-    elif ext[0] == 'z' and ext[1:].isnumeric():
-        num = int(ext[1:]) + 1
-        return path[:-1] + [f"{name}.z{num:02}"]
-
-    # multipart .000+
-    elif ext.isnumeric():
-        num = int(ext) + 1
-        if num == 999:
-            return None
-        return path[:-1] + [f"{name}.{num:03}"]
-
-    return None
-
-
-def find_paths_to_remove(node: BTTree, params: Dict, marked: List[List[str]]):
-    """Create a list of paths to remove"""
-    if not node.subs:  # node is a file
-        if not is_file_valid(node, params):
-            marked.append(node.path)
-    else:  # node is a folder
-        for sub in node.subs:
-            find_paths_to_remove(sub, params, marked)
-
-
-def remove_invalid_file(node: BTTree, path: List[str]) -> bool:
-    """Recurse through the tree and remove the specified path"""
-    if not node.subs:  # Should only happen in a single file torrent
-        raise ValueError('Single file torrents are not supported')
-
-    for sub in node.subs:
-        if not sub.subs and path == sub.path:  # leaf node matched, remove file
-            node.subs = [x for x in node.subs if x != sub]
-            return True
-
-        if path[0:len(sub.path)] == sub.path:
-            if remove_invalid_file(sub, path):  # file was removed further down the recursion chain
-                if len(sub.subs) == 0:  # remove empty subdirectory
-                    node.subs = [x for x in node.subs if x != sub]
-                return True
-
-    return False  # The tree was fully searched, path was not found
-
-
 def make_meta_file(loc, url, params=None, flag=None,
-                   progress=lambda x: None, progress_percent=True):
-    """Make a single .torrent file for a given location"""
+                   progress=lambda x: None, progress_percent=True,
+                   filedone=lambda x, y: None, digests=(), cache=None,
+                   table=None):
+    """Make a single .torrent file for a given location
+
+    Hashing stops early, returning None, if flag is set. filedone is called
+    with the path of each file once it has been hashed, along with a
+    {name: hexdigest} dict of any additional digests (e.g. md5, crc32)
+    computed in the same pass. cache optionally stores the digests of
+    pieces within each file, see BTTree.addCachedFileToInfo.
+
+    Files matching params['blacklist_path_matches'] or
+    params['blacklist_file_extensions'] are left out, see FileFilter. table
+    optionally provides a FileTable of loc, if it has already been walked
+    with the same filter."""
     if params is None:
         params = {}
     if flag is None:
         flag = threading.Event()
 
-    tree = BTTree(loc, [])
-
-    remove_invalid_files(tree, params)
+    if table is None:
+        table = FileTable(loc, [], FileFilter.from_params(params))
+    tree = BTTree(loc, [], table)
 
     # Extract target from parameters
     if 'target' not in params or params['target'] == '':
@@ -163,7 +89,8 @@ def make_meta_file(loc, url, params=None, flag=None,
             target = os.path.join(fname, ext + '.torrent')
         params['target'] = target
 
-    info = tree.makeInfo(flag=flag, progress=progress,
+    info = tree.makeInfo(flag=flag, filedone=filedone, digests=digests,
+                         cache=cache, progress=progress,
                          progress_percent=progress_percent, **params)
 
     if flag is not None and flag.is_set():
@@ -6,6 +6,8 @@ BitTornado makemetafile.py behaviors.
 
 import os
 from .Info import Info, MetaInfo
+from .FanoutReader import FanoutReader
+from .FileTable import FileTable
 
 
 class BTTree(object):
@@ -17,36 +19,38 @@ class BTTree(object):
         str[]    path   Path
         BTTree[] subs   List of direct children (empty, if a file)
         int      size   Total size of subfiles (or self, if a file)
+        FileEntry entry Size, mtime and inode, if a file
     """
-    def __init__(self, loc, path):
+    def __init__(self, loc, path, table=None):
         """
         Parameters
             str         loc     Location of source file/directory
             str[]       path    File path e.g. ['path','to','file.ext']
+            FileTable   table   Entries below loc, from a previous walk
         """
         self.loc = os.path.abspath(loc)
         self.path = path
         self.subs = []
+        self.entry = None
+
+        if table is None:
+            table = FileTable(loc, path)
+        key = tuple(path)
 
         # The only important bit of information at this stage is size
-        if os.path.isfile(loc):
-            self.size = os.path.getsize(loc)
+        if key in table.files:
+            self.entry = table.files[key]
+            self.size = self.entry.size
 
         # We'll need to know the size of all subfiles
-        elif os.path.isdir(loc):
-            for sub in sorted(os.listdir(self.loc)):
+        elif key in table.dirs:
+            for sub in table.dirs[key]:
                 # Ignore .* (glob, not regex)
                 if sub[0] == '.':
                     continue
                 sloc = os.path.join(loc, sub)
                 spath = self.path + [sub]
-                try:
-                    self.subs.append(BTTree(sloc, spath))
-
-                # Notify, but ignore entries that are neither
-                # files nor directories
-                except IOError as problem:
-                    print(problem)
+                self.subs.append(BTTree(sloc, spath, table))
 
             # For bittorrent's purposes, size(dir) = size(subs)
             self.size = sum(sub.size for sub in self.subs)
@@ -62,43 +66,131 @@ class BTTree(object):
 
         return Info(name, self.size, **params)
 
-    def makeInfo(self, **params):
-        """Generate an Info data structure from a BTTree"""
+    def makeInfo(self, flag=None, filedone=lambda x, y: None, digests=(),
+                 cache=None, **params):
+        """Generate an Info data structure from a BTTree
+
+        Parameters
+            Event   flag     - stop hashing further files when set
+            f()     filedone - called with the path and additional digests
+                               of each hashed file
+            str[]   digests  - additional per-file digests, e.g. md5, crc32
+            cache   cache    - optional store of piece digests, see
+                               addCachedFileToInfo
+
+        read_size, read_mmap and read_drop_cache params are passed to
+        FanoutReader
+        """
 
         info = self.initInfo(**params)
+        readopts = {'read_size': params.get('read_size', 0),
+                    'use_mmap': params.get('read_mmap', False),
+                    'drop_cache': params.get('read_drop_cache', False)}
 
-        self.updateInfo(info)
+        try:
+            self.updateInfo(info, flag, filedone, digests, cache, readopts)
+        finally:
+            info.close()
+        info.check_files()
 
         return info
 
-    def addFileToInfos(self, infos):
+    def addFileToInfos(self, infos, digests=(), cache=None, readopts=None):
         """Add file information and data hash to a sequence of Info
-        structures"""
-        with open(self.loc, 'rb') as fhandle:
-            pos = 0
-            piece_length = 0
-            for info in infos:
-                piece_length = max(piece_length, info.hasher.pieceLength)
-                info.add_file_info(self.size, self.path)
-
-            while pos < self.size:
-                nbytes = min(piece_length, self.size - pos)
-                buf = fhandle.read(nbytes)
-                pos += nbytes
-                for info in infos:
-                    info.add_data(buf)
-
-    def updateInfo(self, info):
+        structures, reading the file once. readopts are additional
+        FanoutReader arguments
+
+        Return
+            dict    - {name: hexdigest} of any additional digests
+        """
+        piece_length = 0
+        for info in infos:
+            piece_length = max(piece_length, info.hasher.pieceLength)
+            # sizes and paths come from the walk, and are checked once
+            # the tree has been added, see Info.check_files
+            info.add_file_info(self.size, self.path, trusted=True)
+
+        if cache is not None and len(infos) == 1:
+            return self.addCachedFileToInfo(infos[0], digests, cache,
+                                            readopts)
+
+        reader = FanoutReader(piece_length, digests, **(readopts or {}))
+        return reader.read(self.loc, self.size,
+                           [info.add_data for info in infos])
+
+    def addCachedFileToInfo(self, info, digests, cache, readopts=None):
+        """Hash a file, reusing the digests of the whole pieces it contains
+        if they are cached.
+
+        Pieces that span file boundaries can't be cached, so the head of
+        the file (completing the piece started by previous files) and its
+        tail are always read. The number of head bytes is part of the
+        cache key, as it determines where piece boundaries fall.
+
+        Additional per-file digests are cached as well. The whole file is
+        read if any of them is missing.
+
+        The cache must provide:
+            get_pieces(loc, piece_length, offset, entry) -> bytes or None
+            put_pieces(loc, piece_length, offset, digests, entry)
+            get_digests(loc, names, entry) -> {name: hexdigest} or None
+            put_digests(loc, {name: hexdigest}, entry)
+        where entry is the file's FileEntry
+
+        Return
+            dict    - {name: hexdigest} of any additional digests
+        """
+        piece_length = info.hasher.pieceLength
+        head = min((piece_length - info.hasher.done) % piece_length,
+                   self.size)
+        npieces = (self.size - head) // piece_length
+        tail = head + npieces * piece_length
+
+        file_digests = cache.get_digests(self.loc, digests, self.entry) \
+            if digests else {}
+        if file_digests is not None and npieces > 0:
+            pieces = cache.get_pieces(self.loc, piece_length, head,
+                                      self.entry)
+            if pieces is not None and len(pieces) == npieces * 20:
+                reader = FanoutReader(piece_length, (), **(readopts or {}))
+                reader.read(self.loc, head, [info.add_data])
+                info.add_piece_digests(pieces)
+                reader.read(self.loc, self.size - tail, [info.add_data],
+                            tail)
+                return file_digests
+
+        reader = FanoutReader(piece_length, digests, **(readopts or {}))
+        first = len(info.hasher.pieces) + (1 if head else 0)
+        file_digests = reader.read(self.loc, self.size, [info.add_data])
+        if npieces > 0:
+            cache.put_pieces(self.loc, piece_length, head, b''.join(
+                info.hasher.pieces[first:first + npieces]), self.entry)
+        if digests:
+            cache.put_digests(self.loc, file_digests, self.entry)
+        return file_digests
+
+    def updateInfo(self, info, flag=None, filedone=lambda x, y: None,
+                   digests=(), cache=None, readopts=None):
         """Add a sub-BTTree to an Info structure
 
         Parameters
-            Info    info   - Info structure to update
+            Info    info     - Info structure to update
+            Event   flag     - stop hashing further files when set
+            f()     filedone - called with the path and additional digests
+                               of each hashed file
+            str[]   digests  - additional per-file digests, e.g. md5, crc32
+            cache   cache    - optional store of piece digests
+            dict    readopts - additional FanoutReader arguments
         """
-        if not os.path.isdir(self.loc) and self.subs == []:
-            self.addFileToInfos((info,))
+        if flag is not None and flag.is_set():
+            return
+        if self.entry is not None:
+            filedone(self.path,
+                     self.addFileToInfos((info,), digests, cache, readopts))
         else:
             for sub in self.subs:
-                sub.updateInfo(info)
+                sub.updateInfo(info, flag, filedone, digests, cache,
+                               readopts)
 
     #pylint: disable=W0102
     def buildMetaTree(self, tracker, target, infos=[], **params):
@@ -134,6 +226,8 @@ class BTTree(object):
         if not os.path.exists(target_dir):
             os.makedirs(target_dir)
 
+        info.close()
+        info.check_files()
         metainfo = MetaInfo(announce=tracker, info=info, **params)
         metainfo.write(os.path.join(target, *self.path) + '.torrent')
 
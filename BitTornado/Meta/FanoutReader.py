@@ -0,0 +1,154 @@
+"""Read files once, passing each buffer to several consumers
+
+This allows piece hashing and per-file checksums (e.g. MD5 or CRC32 for
+SFV files) to share a single pass over the data.
+"""
+
+import hashlib
+import mmap
+import os
+import zlib
+
+
+class CRC32(object):
+    """hashlib-style wrapper around zlib.crc32"""
+    name = 'crc32'
+    digest_size = 4
+
+    def __init__(self, data=b''):
+        self.value = zlib.crc32(data)
+
+    def update(self, data):
+        self.value = zlib.crc32(data, self.value)
+
+    def digest(self):
+        return self.value.to_bytes(4, 'big')
+
+    def hexdigest(self):
+        return '{:08x}'.format(self.value)
+
+
+def new_digest(name):
+    """Construct a hash object by name, supporting crc32 alongside the
+    algorithms provided by hashlib"""
+    if name == 'crc32':
+        return CRC32()
+    return hashlib.new(name)
+
+
+def advise(fileno, offset, length, advice):
+    """posix_fadvise, where the platform supports it"""
+    if hasattr(os, 'posix_fadvise') and length > 0:
+        os.posix_fadvise(fileno, offset, length, getattr(os, advice))
+
+
+class FanoutReader(object):
+    """FanoutReader - reads each file sequentially, handing every buffer
+    to a list of consumers
+
+    FanoutReader attributes
+        int      blocksize  - maximum number of bytes per read
+        str[]    digests    - names of additional per-file digests
+        bool     use_mmap   - map files into memory rather than reading
+                              them into a buffer
+        bool     drop_cache - advise the kernel that data will not be
+                              reused once it has been consumed
+        memoryview buffer   - read buffer, reused for every block
+    """
+    def __init__(self, blocksize, digests=(), read_size=0, use_mmap=False,
+                 drop_cache=False):
+        """Parameters
+            int     blocksize   - piece length; reads are whole multiples
+            str[]   digests     - names of additional per-file digests
+            int     read_size   - preferred bytes per read, rounded up to a
+                                  multiple of blocksize (0 = blocksize)
+            bool    use_mmap    - read files through mmap
+            bool    drop_cache  - drop data from the page cache once read
+        """
+        if read_size > blocksize:
+            blocksize *= -(-read_size // blocksize)
+        self.blocksize = blocksize
+        self.digests = tuple(digests)
+        self.use_mmap = use_mmap
+        self.drop_cache = drop_cache
+        self.buffer = memoryview(bytearray())
+
+    def read(self, loc, size, consumers, offset=0):
+        """Read a file, passing each buffer to every consumer
+
+        Data is read into a single pre-allocated buffer, or a memory map,
+        which is passed to consumers as a memoryview and reused for the
+        next read. Consumers must copy any data they keep.
+
+        Parameters
+            str     loc         - location of file
+            int     size        - number of bytes to read
+            f()[]   consumers   - functions accepting a buffer
+            int     offset      - position to start reading from
+
+        Return
+            dict                - {name: hexdigest} of additional digests
+        """
+        hashes = [new_digest(name) for name in self.digests]
+        consumers = list(consumers) + [digest.update for digest in hashes]
+
+        with open(loc, 'rb') as fhandle:
+            fileno = fhandle.fileno()
+            advise(fileno, offset, size, 'POSIX_FADV_SEQUENTIAL')
+
+            mapped = None
+            if self.use_mmap and size > 0:
+                try:
+                    mapped = mmap.mmap(fileno, 0, access=mmap.ACCESS_READ)
+                except (OSError, ValueError):
+                    # e.g. special files and some network filesystems
+                    pass
+
+            if mapped is not None:
+                with mapped:
+                    self._read_mapped(mapped, fileno, offset, size, consumers)
+            else:
+                fhandle.seek(offset)
+                self._read_file(fhandle, fileno, offset, size, consumers)
+
+        return {name: digest.hexdigest()
+                for name, digest in zip(self.digests, hashes)}
+
+    def _read_file(self, fhandle, fileno, offset, size, consumers):
+        """Read blocks into the reused buffer"""
+        if len(self.buffer) < min(self.blocksize, size):
+            self.buffer = memoryview(bytearray(min(self.blocksize, size)))
+
+        pos = 0
+        while pos < size:
+            nbytes = min(self.blocksize, size - pos)
+            buf = self.buffer[:fhandle.readinto(self.buffer[:nbytes])]
+            for consumer in consumers:
+                consumer(buf)
+            self._consumed(fileno, None, offset + pos, nbytes)
+            pos += nbytes
+
+    def _read_mapped(self, mapped, fileno, offset, size, consumers):
+        """Pass blocks of a memory map"""
+        if hasattr(mapped, 'madvise'):
+            mapped.madvise(mmap.MADV_SEQUENTIAL)
+
+        with memoryview(mapped) as view:
+            pos = 0
+            while pos < size:
+                nbytes = min(self.blocksize, size - pos)
+                with view[offset + pos:offset + pos + nbytes] as buf:
+                    for consumer in consumers:
+                        consumer(buf)
+                self._consumed(fileno, mapped, offset + pos, nbytes)
+                pos += nbytes
+
+    def _consumed(self, fileno, mapped, start, length):
+        """Drop a block that has been consumed from the page cache"""
+        if not self.drop_cache:
+            return
+        if mapped is not None and hasattr(mapped, 'madvise'):
+            # madvise requires a page aligned start
+            aligned = start - start % mmap.PAGESIZE
+            mapped.madvise(mmap.MADV_DONTNEED, aligned, start + length - aligned)
+        advise(fileno, start, length, 'POSIX_FADV_DONTNEED')
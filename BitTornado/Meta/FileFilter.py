@@ -0,0 +1,123 @@
+"""Blacklist rules for the files included in a torrent, compiled into a
+single matcher that is applied to each directory as it is walked
+
+A file is excluded if its name or any directory above it equals a
+blacklisted path match, its name (without extension) ends with one, or its
+name ends with a blacklisted extension. Volumes that follow an excluded
+archive in the same directory (.rar, .r00, .r01, ...) are excluded with it.
+All matching is case-insensitive.
+"""
+
+import os
+
+
+def next_in_file_sequence(name):
+    """Return the next filename in a logical sequence, lowercased, or None
+
+    Parameters
+        str     name    Filename, e.g. 'archive.rar'
+    Return
+        str     Next filename, e.g. 'archive.r00'
+    """
+    parts = name.lower().split('.')
+    if len(parts) == 1 or not parts[-1]:
+        return None
+    name = '.'.join(parts[:-1])
+    ext = parts[-1]
+
+    # rar .r00+
+    if ext == 'rar':
+        return f"{name}.r00"
+    elif ext[0] == 'r' and ext[1:].isdecimal():
+        num = int(ext[1:]) + 1
+        if num == 99:
+            return f"{name}.000"
+        return f"{name}.r{num:02}"
+
+    # zip .z01+
+    elif ext == 'zip':
+        return f"{name}.z01"
+    elif ext[0] == 'z' and ext[1:].isdecimal():
+        num = int(ext[1:]) + 1
+        return f"{name}.z{num:02}"
+
+    # multipart .000+
+    elif ext.isdecimal():
+        num = int(ext) + 1
+        if num == 999:
+            return None
+        return f"{name}.{num:03}"
+
+    return None
+
+
+class FileFilter(object):
+    """FileFilter - compiled blacklist of paths and file extensions
+
+    FileFilter attributes
+        frozenset   path_matches    Blacklisted file and directory names
+        tuple       name_suffixes   Blacklisted endings of filenames, without
+                                    extension
+        tuple       extensions      Blacklisted file extensions
+    """
+    def __init__(self, path_matches=(), extensions=()):
+        """
+        Parameters
+            str[]   path_matches    e.g. ['sample', 'proof']
+            str[]   extensions      e.g. ['.sfv', '.md5']
+        """
+        self.path_matches = frozenset(match.lower() for match in path_matches)
+        self.name_suffixes = tuple(self.path_matches)
+        self.extensions = tuple(ext.lower() for ext in extensions)
+
+    @classmethod
+    def from_params(cls, params):
+        """Build a filter from the blacklist_path_matches and
+        blacklist_file_extensions entries of make_meta_file parameters"""
+        return cls(params.get('blacklist_path_matches', ()),
+                   params.get('blacklist_file_extensions', ()))
+
+    def excludes_dir(self, name):
+        """Return whether a directory, and everything below it, is excluded"""
+        return name.lower() in self.path_matches
+
+    def excludes_file(self, name):
+        """Return whether a file is excluded by name alone"""
+        name = name.lower()
+        return name in self.path_matches or \
+            os.path.splitext(name)[0].endswith(self.name_suffixes) or \
+            name.endswith(self.extensions)
+
+    def exclude(self, dirs, files):
+        """Return the names excluded from a directory listing
+
+        Each excluded file starts a sequence, which is followed through the
+        listing until a volume is missing, so each name is visited at most
+        once.
+
+        Parameters
+            str[]   dirs    Names of subdirectories
+            str[]   files   Names of files
+        Return
+            set     Excluded names
+        """
+        excluded = {name for name in dirs if self.excludes_dir(name)}
+        seeds = [name for name in files if self.excludes_file(name)]
+        excluded.update(seeds)
+        if not seeds:
+            return excluded
+
+        volumes = {}
+        for name in files:
+            volumes.setdefault(name.lower(), []).append(name)
+
+        for name in seeds:
+            following = next_in_file_sequence(name)
+            while following in volumes:
+                names = volumes[following]
+                if excluded.issuperset(names):
+                    break
+                excluded.update(names)
+                following = next_in_file_sequence(following)
+
+        return excluded
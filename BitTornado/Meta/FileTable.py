@@ -0,0 +1,95 @@
+"""Walk a file or directory once, recording what is needed to build
+torrents and extract metadata
+
+Each directory is listed with os.scandir and each file is stat'ed once,
+where separate isfile/isdir/getsize calls would stat every entry several
+times. On network filesystems this metadata traffic is significant.
+Files excluded by a FileFilter are dropped as each directory is listed,
+without being stat'ed or descended into.
+"""
+
+import os
+from collections import namedtuple
+
+FileEntry = namedtuple('FileEntry', ['path', 'size', 'mtime', 'inode'])
+FileEntry.__doc__ = """A file, with its path as a tuple of names, size,
+modification time (ns) and inode"""
+
+
+class FileTable(object):
+    """FileTable - files and directories below a location
+
+    FileTable attributes
+        str      loc    Location of the root file/directory
+        tuple    path   Path of the root, prefixed to all paths
+        dict     files  {path: FileEntry} of every file
+        dict     dirs   {path: [name, ...]} of every directory's entries,
+                        sorted
+        list     excluded       Paths dropped by the filter
+        FileFilter file_filter  Filter applied to each directory, or None
+    """
+    def __init__(self, loc, path=(), file_filter=None):
+        """
+        Parameters
+            str         loc     Location of source file/directory
+            str[]       path    Path of the source, e.g. [] or ['path']
+            FileFilter  file_filter Blacklist applied during the walk
+        """
+        self.loc = os.path.abspath(loc)
+        self.path = tuple(path)
+        self.files = {}
+        self.dirs = {}
+        self.excluded = []
+        self.file_filter = file_filter
+
+        if os.path.isdir(self.loc):
+            self._walk(self.loc, self.path)
+        elif os.path.isfile(self.loc):
+            stat = os.stat(self.loc)
+            self.files[self.path] = FileEntry(self.path, stat.st_size,
+                                              stat.st_mtime_ns, stat.st_ino)
+
+    def _walk(self, loc, path):
+        subdirs = {}
+        files = {}
+        with os.scandir(loc) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir():
+                        subdirs[entry.name] = entry
+                    elif entry.is_file():
+                        files[entry.name] = entry
+                    else:
+                        raise IOError("Entry is neither file nor directory: "
+                                      + entry.path)
+
+                # Notify, but ignore entries that are neither
+                # files nor directories
+                except IOError as problem:
+                    print(problem)
+
+        if self.file_filter is not None:
+            excluded = self.file_filter.exclude(subdirs, files)
+            for name in excluded:
+                subdirs.pop(name, None)
+                files.pop(name, None)
+            self.excluded.extend(sorted(path + (name,) for name in excluded))
+
+        for name, entry in files.items():
+            sub = path + (name,)
+            stat = entry.stat()
+            self.files[sub] = FileEntry(sub, stat.st_size, stat.st_mtime_ns,
+                                        stat.st_ino)
+
+        self.dirs[path] = sorted(list(subdirs) + list(files))
+        for name in self.dirs[path]:
+            if name in subdirs:
+                self._walk(subdirs[name].path, path + (name,))
+
+    def iter_files(self, path=None):
+        """Yield the FileEntry of each file below path, in sorted order"""
+        path = self.path if path is None else tuple(path)
+        if path in self.files:
+            yield self.files[path]
+        for name in self.dirs.get(path, ()):
+            yield from self.iter_files(path + (name,))
@@ -8,6 +8,7 @@ import os
 import re
 import time
 import hashlib
+from concurrent.futures import ThreadPoolExecutor
 from ..Types import TypedDict, TypedList, SplitList
 from .bencode import BencodedFile
 
@@ -111,39 +112,32 @@ class PieceHasher(object):
     def update(self, data, progress=lambda x: None):
         """Add data to PieceHasher, splitting pieces if necessary.
 
+        data may be any bytes-like object. Pieces are hashed in place
+        through a memoryview, so the data is never copied.
+
         Progress function that accepts a number of (new) bytes hashed
         is optional
         """
-        tofinish = self.pieceLength - self.done    # bytes to finish a piece
-
-        # Split data based on the number of bytes to finish the current piece
-        # If data is less than needed, remainder will be empty
-        init, remainder = data[:tofinish], data[tofinish:]
-
-        # Hash initial segment
-        self._hash.update(init)
-        progress(len(init))
-        self.done += len(init)
-
-        # Hash remainder, if present
-        if remainder:
-            toHash = len(remainder)
+        view = memoryview(data)
+        size = len(view)
+        pos = 0
 
-            # Create a new hash for each piece of data present
-            hashes = [self._hashtype(remainder[i:i + self.pieceLength])
-                      for i in range(0, toHash, self.pieceLength)]
-            progress(toHash)
+        while pos < size:
+            # Hash up to the end of the current piece
+            nbytes = min(self.pieceLength - self.done, size - pos)
+            self._hash.update(view[pos:pos + nbytes])
+            pos += nbytes
+            self.done += nbytes
 
-            self.done = toHash % self.pieceLength
+            # If the piece is finished, reinitialize
+            if self.done == self.pieceLength:
+                self.pieces.append(self._hash.digest())
+                self.resetHash()
 
-            self.pieces.append(self._hash.digest())
-            self._hash = hashes[-1]
-            self.pieces.extend(piece.digest() for piece in hashes[:-1])
+        progress(size)
 
-        # If the piece is finished, reinitialize
-        if self.done == self.pieceLength:
-            self.pieces.append(self._hash.digest())
-            self.resetHash()
+    def close(self):
+        """Release any resources held for hashing"""
 
     def __nonzero__(self):
         """Evaluate to true if any data has been hashed"""
@@ -172,6 +166,131 @@ class PieceHasher(object):
         return self._hash.name
 
 
+class ParallelPieceHasher(PieceHasher):
+    """PieceHasher that hashes complete pieces on a pool of worker threads
+
+    Data must still be passed in order, but each completed piece is handed
+    to a worker as soon as it is available. hashlib releases the GIL while
+    digesting, so pieces are hashed concurrently with reading. Pieces are
+    addressed by index (absolute offset // pieceLength), so the result is
+    identical to PieceHasher.
+    """
+    def __init__(self, pieceLength, threads, hashtype=hashlib.sha1):
+        super(ParallelPieceHasher, self).__init__(pieceLength, hashtype)
+        self.threads = threads
+        self._executor = ThreadPoolExecutor(max_workers=threads)
+        self._partial = bytearray()
+        self._pending = []
+        self._pieces = []
+
+    def _digest(self, data):
+        return self._hashtype(data).digest()
+
+    def _submit(self, data):
+        """Queue a complete piece, waiting on the oldest queued piece when
+        too many are in flight"""
+        if self._executor is None:
+            # closed, so hash in the calling thread
+            self._pieces.append(self._digest(data))
+            return
+        if len(self._pending) >= self.threads * 2:
+            self._pieces.append(self._pending.pop(0).result())
+        self._pending.append(self._executor.submit(self._digest, data))
+
+    def close(self):
+        """Wait for the queued pieces and shut down the worker threads.
+        Pieces added afterwards are hashed in the calling thread"""
+        if self._executor is None:
+            return
+        try:
+            self._pieces.extend(future.result() for future in self._pending)
+            self._pending = []
+        finally:
+            self._executor.shutdown()
+            self._executor = None
+
+    def resetHash(self):
+        """Set hash to initial state"""
+        self._partial = bytearray()
+        self.done = 0
+
+    def update(self, data, progress=lambda x: None):
+        """Add data to ParallelPieceHasher, splitting pieces if necessary.
+
+        Progress function that accepts a number of (new) bytes hashed
+        is optional
+        """
+        view = memoryview(data)
+        pos = 0
+
+        # Complete the piece started by a previous call
+        if self.done:
+            tofinish = min(self.pieceLength - self.done, len(view))
+            self._partial += view[:tofinish]
+            pos = tofinish
+            self.done += tofinish
+            if self.done == self.pieceLength:
+                self._submit(bytes(self._partial))
+                self.resetHash()
+
+        # Whole pieces are hashed straight from the caller's buffer. Copy
+        # it once if it is mutable, as it may be reused before hashing ends
+        if len(view) - pos >= self.pieceLength and \
+                not isinstance(data, bytes):
+            view = memoryview(bytes(view))
+        while len(view) - pos >= self.pieceLength:
+            self._submit(view[pos:pos + self.pieceLength])
+            pos += self.pieceLength
+
+        # Keep the remainder until the piece can be completed
+        if pos < len(view):
+            self._partial += view[pos:]
+            self.done += len(view) - pos
+
+        progress(len(view))
+
+    @property
+    def pieces(self):
+        """Digests of all completed pieces, in order"""
+        self._pieces.extend(future.result() for future in self._pending)
+        self._pending = []
+        return self._pieces
+
+    @pieces.setter
+    def pieces(self, pieces):
+        self._pending = []
+        self._pieces = pieces
+
+    def __repr__(self):
+        return "<ParallelPieceHasher[{:d}] ({})>".format(
+            len(self.pieces), self._hashtype(self._partial).hexdigest())
+
+    def __bytes__(self):
+        """Print concatenated digests of pieces and current digest, if
+        nonzero"""
+        excess = []
+        if self.done > 0:
+            excess.append(self.digest)
+        return b''.join(self.pieces + excess)
+
+    @property
+    def digest(self):
+        """Current hash digest as a byte string"""
+        return self._hashtype(self._partial).digest()
+
+    @property
+    def hashtype(self):
+        """Name of the hash function being used"""
+        return self._hashtype().name
+
+
+def make_hasher(piece_length, threads=1):
+    """Return a PieceHasher, hashing on a thread pool if threads > 1"""
+    if threads > 1:
+        return ParallelPieceHasher(piece_length, threads)
+    return PieceHasher(piece_length)
+
+
 class Info(TypedDict):   # pylint: disable=R0904
     """Info - information associated with a .torrent file
 
@@ -189,11 +308,30 @@ class Info(TypedDict):   # pylint: disable=R0904
 
                 def valconst(self, x):
                     return VALID_NAME.match(x)
+
+                @classmethod
+                def trusted(cls, path):
+                    """Path of names that are known to be valid, skipping
+                    normalization. See Info.check_files"""
+                    trusted = cls.__new__(cls)
+                    list.extend(trusted, path)
+                    return trusted
             typemap = {'length': int, 'path': Path, 'path.utf-8': Path, 'smarthash_info': str, 'pricker': str}
+            # shared by every File, rather than a set per instance
+            valid_keys = frozenset(typemap)
+
+            @classmethod
+            def trusted(cls, length, path):
+                """File entry built from values that are known to be valid,
+                skipping normalization. See Info.check_files"""
+                trusted = cls.__new__(cls)
+                dict.update(trusted, length=length,
+                            path=cls.Path.trusted(path))
+                return trusted
         valtype = File
     typemap = {'name': str, 'piece length': int, 'pieces': bytes,
                'files': Files, 'length': int, 'private': bool,
-               'name.utf-8': str}
+               'name.utf-8': str, 'smarthash_info_format': str}
     base_keys = set(('name', 'piece length', 'pieces', 'files', 'length'))
 
     def __init__(self, name, size=None,
@@ -206,6 +344,8 @@ class Info(TypedDict):   # pylint: disable=R0904
             bool progress_percent - flag for reporting percentage or change
         """
         super(Info, self).__init__()
+        self._unchecked = False
+        self._pieces = (None, b'')
 
         if not params and not isinstance(name, (str, bytes)):
             params = name
@@ -252,7 +392,8 @@ class Info(TypedDict):   # pylint: disable=R0904
                 piece_length = get_piece_len(size)
 
             self.totalhashed = 0
-            self.hasher = PieceHasher(piece_length)
+            self.hasher = make_hasher(piece_length,
+                                      params.get('hash_threads') or 1)
 
 
         # Progress for this function updates the total amount hashed
@@ -292,7 +433,7 @@ class Info(TypedDict):   # pylint: disable=R0904
         if key == 'piece length':
             return self.hasher.pieceLength
         elif key == 'pieces':
-            return bytes(self.hasher)
+            return self._get_pieces()
         elif key == 'files':
             pass
             #if 'files' not in self:
@@ -330,14 +471,61 @@ class Info(TypedDict):   # pylint: disable=R0904
     def _get(self, *args, **kwargs):
         return super(Info, self).get(*args, **kwargs)
 
-    def add_file_info(self, size, path):
+    def _get_pieces(self):
+        """Concatenated piece digests, joined again only once pieces have
+        been added or the current piece has changed"""
+        pieces = self.hasher.pieces
+        key = (id(pieces), len(pieces), pieces[-1] if pieces else None,
+               self.hasher.done)
+        if self._pieces[0] != key:
+            self._pieces = (key, bytes(self.hasher))
+        return self._pieces[1]
+
+    def add_file_info(self, size, path, trusted=False):
         """Add file information to torrent.
 
         Parameters
             long        size    size of file (in bytes)
             str[]       path    file path e.g. ['path','to','file.ext']
+            bool        trusted skip normalizing the entry, as size and path
+                                are known to be an int and a list of str,
+                                e.g. when they come from a FileTable.
+                                check_files must be called once all files
+                                have been added
         """
-        self._get('files').append({'length': size, 'path': path})
+        files = self._get('files')
+        if trusted:
+            list.append(files, Info.Files.File.trusted(size, path))
+            self._unchecked = True
+        else:
+            files.append({'length': size, 'path': path})
+
+    def check_files(self):
+        """Validate the entries added with trusted=True, in a single pass,
+        applying the constraints add_file_info otherwise applies to each
+        entry. Paths must also be unique.
+
+        Raises ValueError if an entry is invalid"""
+        if not self._unchecked:
+            return
+
+        seen = set()
+        for entry in self._get('files'):
+            length = entry['length']
+            if type(length) is not int or length < 0:
+                raise ValueError('Value rejected: {!r}'.format(length))
+            path = entry['path']
+            if not path:
+                raise ValueError('Value rejected: empty path')
+            for name in path:
+                if type(name) is not str or not VALID_NAME.match(name):
+                    raise ValueError('Value rejected: {!r}'.format(name))
+            key = tuple(path)
+            if key in seen:
+                raise ValueError('Value rejected: duplicate path {!r}'
+                                 ''.format(path))
+            seen.add(key)
+        self._unchecked = False
 
     def add_data(self, data):
         """Process a segment of data.
@@ -357,6 +545,32 @@ class Info(TypedDict):   # pylint: disable=R0904
         """
         self.hasher.update(data, self.progress)
 
+    def close(self):
+        """Release the hasher's worker threads, if any, once hashing is
+        done"""
+        # Info structures of empty trees have no hasher
+        if hasattr(self, 'hasher'):
+            self.hasher.close()
+
+    def add_piece_digests(self, digests):
+        """Add the digests of whole pieces that have already been hashed,
+        e.g. by a previous run. Data added so far must end on a piece
+        boundary.
+
+        Parameters
+            bytes digests   - concatenated 20 byte piece digests
+
+        Raises ValueError if data added so far ends partway through a piece
+        or digests is not a whole number of digests
+        """
+        if self.hasher.done != 0:
+            raise ValueError('Piece digests must start on a piece boundary')
+        if len(digests) % 20 != 0:
+            raise ValueError('Piece digests must be 20 bytes each')
+        self.hasher.pieces.extend(digests[i:i + 20]
+                                  for i in range(0, len(digests), 20))
+        self.progress(len(digests) // 20 * self.hasher.pieceLength)
+
     def resume(self, location):
         """Rehash last piece to prepare PieceHasher to accept more data
 
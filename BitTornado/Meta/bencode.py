@@ -4,6 +4,8 @@
 
 import warnings
 import mmap
+import itertools
+import operator
 import collections.abc
 
 BENCACHED_MARKER = []
@@ -21,51 +23,128 @@ class Bencached(object):
         return cls(bencode(data))
 
 
+def _encode_int(data, ctext):
+    ctext += b'i%de' % data
+
+
+def _encode_str(data, ctext):
+    # A string is encoded as nbytes:contents
+    data = data.encode('utf-8')
+    ctext += b'%d:%b' % (len(data), data)
+
+
+def _encode_bytes(data, ctext):
+    ctext += b'%d:' % len(data)
+    ctext += data
+
+
+def _encode_bencached(data, ctext):
+    assert data.marker == BENCACHED_MARKER
+    ctext += data.bencoded
+
+
+def _encode_list(data, ctext):
+    # A list takes the form lXe where X is the concatenation of the
+    # encodings of all elements in the list.
+    ctext += b'l'
+    return iter(data)
+
+
+def _encode_dict(data, ctext):
+    # A dictionary is encoded as dXe where X is the concatenation of the
+    # encodings of all key,value pairs in the dictionary, sorted by key.
+    # Key, value pairs are themselves concatenations of the encodings of
+    # keys and values, where keys are assumed to be strings.
+    items = sorted(data.items(), key=operator.itemgetter(0))
+    for key, _ in items:
+        if not isinstance(key, (str, bytes)):
+            raise TypeError("Dictionary keys must be (byte)strings")
+    ctext += b'd'
+    return itertools.chain.from_iterable(items)
+
+
 class BTEncoder(object):
     """Encode a data structure into a string for use in BitTorrent applications
+
+    Values are dispatched on their exact type through the encoders table,
+    which learns the encoder of any other type (e.g. subclasses) the first
+    time it is seen. Containers are walked with an explicit stack rather
+    than recursively, so nesting depth is unlimited.
     """
+    encoders = {
+        int: _encode_int,
+        bool: _encode_int,
+        str: _encode_str,
+        bytes: _encode_bytes,
+        Bencached: _encode_bencached,
+        list: _encode_list,
+        tuple: _encode_list,
+        dict: _encode_dict,
+    }
+    # Encoders of other types, in order of precedence
+    fallbacks = (
+        (int, _encode_int),
+        (str, _encode_str),
+        (bytes, _encode_bytes),
+        (Bencached, _encode_bencached),
+        (collections.abc.Sequence, _encode_list),
+        (collections.abc.Mapping, _encode_dict),
+    )
+    # Bytes buffered before they are flushed, see encode
+    bufsize = 2 ** 20
 
     def __call__(self, data):
         """Encode a data structure into a string."""
-        ctext = []
+        ctext = bytearray()
         self.encode(data, ctext)
-        return b''.join(ctext)
-
-    def encode(self, data, ctext):
-        """Determine type of data and encode into appropriate string"""
-        if isinstance(data, int):
-            ctext.append('i{:d}e'.format(data).encode('utf-8'))
-        elif isinstance(data, (str, bytes)):
-            # A string is encoded as nbytes:contents
-            if isinstance(data, str):
-                data = data.encode('utf-8')
-            ctext.extend((str(len(data)).encode('utf-8'), b':', data))
-        elif isinstance(data, Bencached):
-            assert data.marker == BENCACHED_MARKER
-            ctext.append(data.bencoded)
-        elif isinstance(data, collections.abc.Sequence):
-            # A list takes the form lXe where X is the concatenation of the
-            # encodings of all elements in the list.
-            ctext.append(b'l')
-            for element in data:
-                self.encode(element, ctext)
-            ctext.append(b'e')
-        elif isinstance(data, collections.abc.Mapping):
-            # A dictionary is encoded as dXe where X is the concatenation of
-            # the encodings of all key,value pairs in the dictionary, sorted by
-            # key. Key, value pairs are themselves concatenations of the
-            # encodings of keys and values, where keys are assumed to be
-            # strings.
-            ctext.append(b'd')
-            ilist = data.items()
-            for key, data in sorted(ilist):
-                if not isinstance(key, (str, bytes)):
-                    raise TypeError("Dictionary keys must be (byte)strings")
-                self.encode(key, ctext)
-                self.encode(data, ctext)
-            ctext.append(b'e')
-        else:
-            raise TypeError('Unknown type for bencode: ' + str(type(data)))
+        return bytes(ctext)
+
+    def dump(self, data, handle):
+        """Encode a data structure into a writable file object"""
+        ctext = bytearray()
+        self.encode(data, ctext, handle.write)
+        handle.write(ctext)
+
+    def encode(self, data, ctext, flush=None):
+        """Encode a data structure onto the end of a bytearray
+
+        Parameters
+            object      data    - bencodable data structure
+            bytearray   ctext   - buffer to append to
+            f()         flush   - if given, called with ctext, which is then
+                                  emptied, whenever it exceeds bufsize
+        """
+        encoders = self.encoders
+        bufsize = self.bufsize
+        # Iterators over the values left to encode in each open container
+        stack = [iter((data,))]
+        while stack:
+            for value in stack[-1]:
+                try:
+                    encoder = encoders[type(value)]
+                except KeyError:
+                    encoder = self.resolve(type(value))
+                values = encoder(value, ctext)
+                if flush is not None and len(ctext) >= bufsize:
+                    flush(ctext)
+                    del ctext[:]
+                if values is not None:
+                    stack.append(values)
+                    break
+            else:
+                stack.pop()
+                # Close every container but the outermost iterator
+                if stack:
+                    ctext += b'e'
+
+    def resolve(self, datatype):
+        """Determine the encoder of a type missing from the encoders table,
+        and add it to the table"""
+        for basetype, encoder in self.fallbacks:
+            if issubclass(datatype, basetype):
+                self.encoders[datatype] = encoder
+                return encoder
+        raise TypeError('Unknown type for bencode: ' + str(datatype))
 
 
 # pylint: disable=R0201
@@ -186,7 +265,7 @@ class BencodedFile(object):
     are (byte)strings or subclasses."""
     def write(self, fname):
         with open(fname, 'wb') as handle:
-            handle.write(bencode(self))
+            bencode.dump(self, handle)
 
     def gettorrent(self):
         return bencode(self)
@@ -1,5 +1,9 @@
 from ..Types.tests import *
 from .test_bencode import CodecTests
+from .test_fanoutreader import FanoutReaderTests
+from .test_filefilter import FileFilterTests
+from .test_filetable import FileTableTests
+from .test_info import InfoBuildTests, PieceHasherTests
 from .test_networkaddress import AddressFunctionTests, AddressRangeTests, \
     SubnetTests, TestAddrList
 from .test_parseargs import ParseArgsTest
@@ -1,6 +1,69 @@
+import collections
+import collections.abc
+import io
+import random
 import unittest
 
-from ..Meta.bencode import bencode, bdecode, Bencached
+from ..Meta.bencode import bencode, bdecode, Bencached, BTEncoder, \
+    BENCACHED_MARKER
+from ..Meta.Info import Info, MetaInfo
+from ..Types.collections import TypedDict, TypedList
+
+
+def legacy_bencode(data):
+    """The recursive encoder BTEncoder replaced, as a reference"""
+    def encode(data, ctext):
+        if isinstance(data, int):
+            ctext.append('i{:d}e'.format(data).encode('utf-8'))
+        elif isinstance(data, (str, bytes)):
+            if isinstance(data, str):
+                data = data.encode('utf-8')
+            ctext.extend((str(len(data)).encode('utf-8'), b':', data))
+        elif isinstance(data, Bencached):
+            assert data.marker == BENCACHED_MARKER
+            ctext.append(data.bencoded)
+        elif isinstance(data, collections.abc.Sequence):
+            ctext.append(b'l')
+            for element in data:
+                encode(element, ctext)
+            ctext.append(b'e')
+        elif isinstance(data, collections.abc.Mapping):
+            ctext.append(b'd')
+            for key, data in sorted(data.items()):
+                if not isinstance(key, (str, bytes)):
+                    raise TypeError("Dictionary keys must be (byte)strings")
+                encode(key, ctext)
+                encode(data, ctext)
+            ctext.append(b'e')
+        else:
+            raise TypeError('Unknown type for bencode: ' + str(type(data)))
+    ctext = []
+    encode(data, ctext)
+    return b''.join(ctext)
+
+
+def random_data(rand, depth=0):
+    """A random bencodable structure, including subclasses of the
+    bencodable types"""
+    kind = rand.randrange(7 if depth < 5 else 3)
+    if kind == 0:
+        return rand.choice([0, -1, True, 2 ** 70, rand.randrange(-999, 999)])
+    if kind == 1:
+        return rand.choice(['', 'abc', '\u00e9t\u00e9', '\U0001f600' * 3])
+    if kind == 2:
+        return bytes(rand.getrandbits(8) for _ in range(rand.randrange(40)))
+    if kind == 3:
+        return [random_data(rand, depth + 1)
+                for _ in range(rand.randrange(5))]
+    if kind == 4:
+        return tuple(random_data(rand, depth + 1)
+                     for _ in range(rand.randrange(5)))
+    if kind == 5:
+        return Bencached.cache(random_data(rand, depth + 1))
+    mapping = rand.choice([dict, collections.OrderedDict, TypedDict])
+    return mapping(dict((rand.choice(['a', 'b\u00e9', 'key{}'.format(i)]),
+                         random_data(rand, depth + 1))
+                        for i in range(rand.randrange(5))))
 
 
 class CodecTests(unittest.TestCase):
@@ -79,5 +142,54 @@ class CodecTests(unittest.TestCase):
         self.assertRaises(ValueError, bdecode, b'd0:0:')
         self.assertRaises(ValueError, bdecode, b'd0:')
 
+    def test_legacy(self):
+        """Test that encodings match the previous encoder"""
+        rand = random.Random(0)
+        for _ in range(300):
+            data = random_data(rand)
+            self.assertEqual(bencode(data), legacy_bencode(data))
+
+        data = [bytearray(b'ab'), TypedList([1, 2]), True, range(3),
+                collections.OrderedDict([('b', 1), ('a', 2)])]
+        self.assertEqual(bencode(data), legacy_bencode(data))
+
+        info = Info('name', 2 ** 20, piece_length=2 ** 15)
+        info.add_file_info(2 ** 20, ['a', 'b'])
+        info.hasher.update(bytes(2 ** 20))
+        metainfo = MetaInfo(announce='http://tracker', info=info)
+        self.assertEqual(bencode(metainfo), legacy_bencode(metainfo))
+        self.assertEqual(bdecode(bencode(metainfo)),
+                         bdecode(legacy_bencode(metainfo)))
+
+    def test_errors(self):
+        """Test that unencodable values are rejected wherever they are"""
+        for data in (1.0, [1, [2, None]], {'a': {'b': object()}},
+                     {'a': {b'b': 1, 2: 3}}, {1: 'foo'}):
+            self.assertRaises(TypeError, bencode, data)
+
+    def test_nesting(self):
+        """Test that nesting is not limited by recursion"""
+        data = []
+        for _ in range(100000):
+            data = [data, {'a': 1}]
+        ctext = bencode(data)
+        self.assertTrue(ctext.startswith(b'll' * 10))
+        self.assertEqual(len(ctext), 100000 * 10 + 2)
+
+    def test_dump(self):
+        """Test that encoding to a file matches, when flushed early"""
+        data = {'pieces': bytes(1000), 'files': [{'length': i, 'path': [
+            'file{}'.format(i)]} for i in range(100)]}
+        handle = io.BytesIO()
+        encoder = BTEncoder()
+        encoder.bufsize = 64
+        encoder.dump(data, handle)
+        self.assertEqual(handle.getvalue(), bencode(data))
+
+        ctext = bytearray(b'prefix')
+        bencode.encode(data, ctext)
+        self.assertEqual(ctext, b'prefix' + bencode(data))
+
+
 if __name__ == '__main__':
     unittest.main()
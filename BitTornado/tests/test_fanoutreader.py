@@ -0,0 +1,71 @@
+import hashlib
+import os
+import tempfile
+import unittest
+import zlib
+
+from ..Meta.FanoutReader import FanoutReader, CRC32, new_digest
+
+
+class FanoutReaderTests(unittest.TestCase):
+    def setUp(self):
+        self.data = os.urandom(100003)
+        handle, self.loc = tempfile.mkstemp()
+        with os.fdopen(handle, 'wb') as fhandle:
+            fhandle.write(self.data)
+
+    def tearDown(self):
+        os.remove(self.loc)
+
+    def test_read(self):
+        """Test that every consumer sees the whole file once"""
+        first, second = [], []
+        reader = FanoutReader(2 ** 15, ('md5', 'crc32'))
+        # the buffer is reused between reads, so consumers keep copies
+        digests = reader.read(self.loc, len(self.data),
+                              [lambda buf: first.append(bytes(buf)),
+                               lambda buf: second.append(bytes(buf))])
+
+        self.assertEqual(b''.join(first), self.data)
+        self.assertEqual(first, second)
+        self.assertTrue(all(len(buf) <= 2 ** 15 for buf in first))
+        self.assertEqual(digests, {
+            'md5': hashlib.md5(self.data).hexdigest(),
+            'crc32': '{:08x}'.format(zlib.crc32(self.data))})
+
+    def test_read_modes(self):
+        """Test that large reads, mmap and dropping the page cache pass the
+        same data, starting from an offset"""
+        for kwargs in ({'read_size': 2 ** 16 + 1}, {'use_mmap': True},
+                       {'use_mmap': True, 'drop_cache': True},
+                       {'drop_cache': True}):
+            for offset in (0, 12345):
+                blocks = []
+                reader = FanoutReader(2 ** 15, ('md5',), **kwargs)
+                digests = reader.read(self.loc, len(self.data) - offset,
+                                      [lambda buf: blocks.append(bytes(buf))],
+                                      offset)
+
+                self.assertEqual(b''.join(blocks), self.data[offset:])
+                self.assertEqual(digests['md5'],
+                                 hashlib.md5(self.data[offset:]).hexdigest())
+                self.assertTrue(all(len(buf) <= reader.blocksize
+                                    for buf in blocks))
+        self.assertEqual(FanoutReader(2 ** 15, read_size=2 ** 16 + 1)
+                         .blocksize, 3 * 2 ** 15)
+
+    def test_no_digests(self):
+        self.assertEqual(FanoutReader(2 ** 15).read(
+            self.loc, len(self.data), []), {})
+
+    def test_crc32(self):
+        crc = CRC32(self.data[:10])
+        crc.update(self.data[10:])
+        self.assertEqual(crc.digest(),
+                         zlib.crc32(self.data).to_bytes(4, 'big'))
+        self.assertEqual(new_digest('sha1').name, 'sha1')
+        self.assertEqual(new_digest('crc32').name, 'crc32')
+
+
+if __name__ == '__main__':
+    unittest.main()
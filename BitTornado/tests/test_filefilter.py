@@ -0,0 +1,69 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from ..Meta.FileFilter import FileFilter, next_in_file_sequence
+from ..Meta.FileTable import FileTable
+
+
+class FileFilterTests(unittest.TestCase):
+    def test_next_in_file_sequence(self):
+        """Test that archive volumes are followed in order"""
+        self.assertEqual(next_in_file_sequence('Movie.RAR'), 'movie.r00')
+        self.assertEqual(next_in_file_sequence('movie.r05'), 'movie.r06')
+        self.assertEqual(next_in_file_sequence('movie.r98'), 'movie.000')
+        self.assertEqual(next_in_file_sequence('movie.zip'), 'movie.z01')
+        self.assertEqual(next_in_file_sequence('movie.z09'), 'movie.z10')
+        self.assertEqual(next_in_file_sequence('movie.007'), 'movie.008')
+        self.assertIsNone(next_in_file_sequence('movie.998'))
+        self.assertIsNone(next_in_file_sequence('movie.mkv'))
+        self.assertIsNone(next_in_file_sequence('movie'))
+        self.assertIsNone(next_in_file_sequence('movie.'))
+
+    def test_excludes(self):
+        """Test path, name suffix and extension matches"""
+        file_filter = FileFilter(['sample', 'proof'], ['.sfv', '.rar'])
+
+        self.assertTrue(file_filter.excludes_dir('Sample'))
+        self.assertFalse(file_filter.excludes_dir('Samples'))
+        self.assertTrue(file_filter.excludes_file('movie-sample.mkv'))
+        self.assertTrue(file_filter.excludes_file('PROOF'))
+        self.assertTrue(file_filter.excludes_file('movie.SFV'))
+        self.assertFalse(file_filter.excludes_file('sample-movie.mkv'))
+        self.assertFalse(FileFilter().excludes_file('movie.sfv'))
+
+    def test_exclude_sequences(self):
+        """Test that volumes following an excluded archive are excluded,
+        up to the first missing volume"""
+        file_filter = FileFilter([], ['.rar'])
+        files = ['Movie.rar', 'Movie.r00', 'Movie.r01', 'Movie.r03',
+                 'other.r00', 'movie.mkv']
+        files += ['big.rar'] + ['big.r{:02}'.format(i) for i in range(99)]
+        files += ['big.{:03}'.format(i) for i in range(3)]
+
+        excluded = file_filter.exclude(['Sample'], files)
+
+        self.assertEqual(excluded - set(files[6:]),
+                         {'Movie.rar', 'Movie.r00', 'Movie.r01'})
+        self.assertEqual(excluded & set(files[6:]), set(files[6:]))
+
+    def test_walk(self):
+        """Test that a filtered walk drops excluded files and directories"""
+        root = tempfile.mkdtemp()
+        try:
+            for path in (('movie.mkv',), ('movie.sfv',), ('Sample', 'a.mkv'),
+                         ('Extras', 'extra-sample.mkv'), ('Extras', 'b.mkv')):
+                os.makedirs(os.path.join(root, *path[:-1]), exist_ok=True)
+                open(os.path.join(root, *path), 'wb').close()
+
+            table = FileTable(root, [], FileFilter(['sample'], ['.sfv']))
+
+            self.assertEqual([entry.path for entry in table.iter_files()],
+                             [('Extras', 'b.mkv'), ('movie.mkv',)])
+            self.assertEqual(sorted(table.excluded),
+                             [('Extras', 'extra-sample.mkv'), ('Sample',),
+                              ('movie.sfv',)])
+            self.assertNotIn(('Sample',), table.dirs)
+        finally:
+            shutil.rmtree(root)
@@ -0,0 +1,116 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from ..Meta.BTTree import BTTree
+from ..Meta.FileTable import FileTable
+
+
+class FileTableTests(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        for path, size in ((('b.txt',), 3), (('a', 'z.bin'), 5),
+                           (('a', 'c', 'y.bin'), 7), (('.hidden',), 1)):
+            os.makedirs(os.path.join(self.root, *path[:-1]), exist_ok=True)
+            with open(os.path.join(self.root, *path), 'wb') as fhandle:
+                fhandle.write(b'x' * size)
+        os.mkdir(os.path.join(self.root, 'empty'))
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_walk(self):
+        """Test that files and sorted directory listings are recorded"""
+        table = FileTable(self.root, ['root'])
+
+        self.assertEqual(table.dirs[('root',)],
+                         ['.hidden', 'a', 'b.txt', 'empty'])
+        self.assertEqual(table.dirs[('root', 'a')], ['c', 'z.bin'])
+        self.assertEqual(table.dirs[('root', 'empty')], [])
+        self.assertEqual(table.files[('root', 'a', 'c', 'y.bin')].size, 7)
+        self.assertEqual([entry.path for entry in table.iter_files()],
+                         [('root', '.hidden'), ('root', 'a', 'c', 'y.bin'),
+                          ('root', 'a', 'z.bin'), ('root', 'b.txt')])
+
+        stat = os.stat(os.path.join(self.root, 'b.txt'))
+        entry = table.files[('root', 'b.txt')]
+        self.assertEqual((entry.size, entry.mtime, entry.inode),
+                         (stat.st_size, stat.st_mtime_ns, stat.st_ino))
+
+    def test_file(self):
+        """Test that a single file is recorded under the root path"""
+        table = FileTable(os.path.join(self.root, 'b.txt'))
+
+        self.assertEqual(table.dirs, {})
+        self.assertEqual(list(table.files), [()])
+        self.assertEqual(table.files[()].size, 3)
+
+    def test_bttree(self):
+        """Test that a tree built from a table skips dotfiles and matches one
+        that walks the directory itself"""
+        table = FileTable(self.root)
+        tree = BTTree(self.root, [], table)
+        walked = BTTree(self.root, [])
+
+        self.assertEqual(tree.size, 15)
+        self.assertEqual([sub.path for sub in tree.subs],
+                         [['a'], ['b.txt'], ['empty']])
+        self.assertEqual([sub.path for sub in tree.subs],
+                         [sub.path for sub in walked.subs])
+        self.assertIs(tree.subs[1].entry, table.files[('b.txt',)])
+        self.assertIsNone(tree.subs[2].entry)
+
+    def test_makeinfo_filedone(self):
+        """Test that filedone is called once per file, in torrent order,
+        with its additional digests"""
+        done = []
+        info = BTTree(self.root, [], FileTable(self.root)).makeInfo(
+            filedone=lambda path, digests: done.append((path, digests)),
+            digests=('crc32',))
+
+        self.assertEqual([path for path, _ in done],
+                         [entry['path'] for entry in info['files']])
+        self.assertEqual([path for path, _ in done],
+                         [['a', 'c', 'y.bin'], ['a', 'z.bin'], ['b.txt']])
+        self.assertTrue(all(set(digests) == {'crc32'}
+                            for _, digests in done))
+
+    def test_makeinfo_flag(self):
+        """Test that hashing stops at the next file once flag is set"""
+        flag = threading.Event()
+        done = []
+
+        def filedone(path, digests):
+            done.append(path)
+            flag.set()
+
+        info = BTTree(self.root, [], FileTable(self.root)).makeInfo(
+            flag=flag, filedone=filedone)
+        self.assertEqual(done, [['a', 'c', 'y.bin']])
+        self.assertEqual([entry['path'] for entry in info['files']],
+                         [['a', 'c', 'y.bin']])
+
+    def test_makeinfo_closes_hasher(self):
+        """Test that the hashing threads are released once hashing ends,
+        including when it fails"""
+        tree = BTTree(self.root, [], FileTable(self.root))
+        info = tree.makeInfo(hash_threads=2, piece_size_pow2=15)
+        self.assertIsNone(info.hasher._executor)
+        self.assertEqual(info['pieces'],
+                         BTTree(self.root, []).makeInfo(
+                             piece_size_pow2=15)['pieces'])
+
+        class RecordingTree(BTTree):
+            def initInfo(self, **params):
+                self.info = super(RecordingTree, self).initInfo(**params)
+                return self.info
+
+        def filedone(path, digests):
+            raise RuntimeError(path)
+
+        tree = RecordingTree(self.root, [], FileTable(self.root))
+        with self.assertRaises(RuntimeError):
+            tree.makeInfo(filedone=filedone, hash_threads=2)
+        self.assertIsNone(tree.info.hasher._executor)
@@ -0,0 +1,158 @@
+import hashlib
+import os
+import random
+import unittest
+
+from ..Meta.Info import Info, PieceHasher, ParallelPieceHasher, make_hasher
+
+
+class PieceHasherTests(unittest.TestCase):
+    def setUp(self):
+        rand = random.Random(0)
+        self.data = bytes(rand.getrandbits(8) for _ in range(300000))
+        self.chunks = [5, 4096, 32768, 1, 65536, 100000, 777]
+
+    def feed(self, hasher, data):
+        """Pass data to a hasher in irregular chunks"""
+        pos = 0
+        i = 0
+        while pos < len(data):
+            size = self.chunks[i % len(self.chunks)]
+            hasher.update(data[pos:pos + size])
+            pos += size
+            i += 1
+        return hasher
+
+    def test_serial(self):
+        """Test that pieces match hashing each piece separately, including
+        updates spanning several whole pieces"""
+        piece_length = 2 ** 15
+        for length in (0, 1, piece_length, piece_length * 3,
+                       piece_length * 3 + 17, len(self.data)):
+            data = self.data[:length]
+            expected = [hashlib.sha1(data[i:i + piece_length]).digest()
+                        for i in range(0, length, piece_length)]
+            whole = PieceHasher(piece_length)
+            whole.update(bytearray(data))
+            for hasher in (self.feed(PieceHasher(piece_length), data), whole):
+                self.assertEqual(bytes(hasher), b''.join(expected))
+                self.assertEqual(hasher.done, length % piece_length)
+
+    def test_parallel(self):
+        """Test that threaded hashing matches the serial hasher"""
+        for piece_length in (2 ** 15, 2 ** 16):
+            for length in (0, 1, piece_length, piece_length * 3 + 17,
+                           len(self.data)):
+                data = self.data[:length]
+                serial = self.feed(PieceHasher(piece_length), data)
+                parallel = self.feed(ParallelPieceHasher(piece_length, 4),
+                                     data)
+                self.assertEqual(bytes(parallel), bytes(serial))
+                self.assertEqual(parallel.pieces, serial.pieces)
+                self.assertEqual(parallel.done, serial.done)
+
+    def test_mutable_buffer(self):
+        """Test that a reused input buffer does not corrupt queued pieces"""
+        serial = self.feed(PieceHasher(2 ** 15), self.data)
+        parallel = ParallelPieceHasher(2 ** 15, 4)
+        buf = bytearray(2 ** 16)
+        for pos in range(0, len(self.data), len(buf)):
+            chunk = self.data[pos:pos + len(buf)]
+            buf[:len(chunk)] = chunk
+            parallel.update(memoryview(buf)[:len(chunk)])
+        self.assertEqual(bytes(parallel), bytes(serial))
+
+    def test_progress(self):
+        """Test that every byte is reported to the progress callback"""
+        hashed = []
+        hasher = ParallelPieceHasher(2 ** 15, 2)
+        hasher.update(self.data, hashed.append)
+        self.assertEqual(sum(hashed), len(self.data))
+
+    def test_close(self):
+        """Test that closing waits for queued pieces and stops the worker
+        threads, and that pieces added afterwards are still hashed"""
+        serial = self.feed(PieceHasher(2 ** 15), self.data)
+        parallel = ParallelPieceHasher(2 ** 15, 4)
+        half = len(self.data) // 2
+        self.feed(parallel, self.data[:half])
+        executor = parallel._executor
+        parallel.close()
+        self.assertTrue(executor._shutdown)
+        self.assertEqual(parallel._pending, [])
+
+        self.feed(parallel, self.data[half:])
+        parallel.close()
+        self.assertEqual(bytes(parallel), bytes(serial))
+
+    def test_make_hasher(self):
+        self.assertIs(type(make_hasher(2 ** 15)), PieceHasher)
+        self.assertIs(type(make_hasher(2 ** 15, 1)), PieceHasher)
+        self.assertIs(type(make_hasher(2 ** 15, os.cpu_count() + 1)),
+                      ParallelPieceHasher)
+
+
+class InfoBuildTests(unittest.TestCase):
+    def build(self, files, trusted):
+        info = Info('name', 2 ** 20, piece_length=2 ** 15)
+        for size, path in files:
+            info.add_file_info(size, path, trusted=trusted)
+        return info
+
+    def test_trusted(self):
+        """Test that trusted entries match normalized ones"""
+        files = [(10, ['a', 'b.txt']), (0, ['c']), (2 ** 40, ['a', 'd'])]
+        info = self.build(files, True)
+        info.check_files()
+        self.assertEqual(info, self.build(files, False))
+        entry = info['files'][0]
+        self.assertIs(type(entry), Info.Files.File)
+        self.assertIs(type(entry['path']), Info.Files.File.Path)
+
+        # entries are still typed once added
+        entry['smarthash_info'] = '{}'
+        with self.assertRaises(KeyError):
+            entry['invalid'] = 1
+        with self.assertRaises(ValueError):
+            entry['path'].append('~invalid')
+        self.assertEqual(entry.copy(), entry)
+
+    def test_check_files(self):
+        """Test that invalid trusted entries are rejected"""
+        for files in ([(1, ['~a'])], [(1, ['a', '.b'])], [(1, ['a/b'])],
+                      [(1, [])], [(-1, ['a'])], [('1', ['a'])],
+                      [(1, ['a', 'b']), (2, ['a', 'b'])]):
+            info = self.build(files, True)
+            with self.assertRaises(ValueError):
+                info.check_files()
+
+    def test_add_piece_digests(self):
+        """Test that piece digests are only added on a piece boundary"""
+        info = Info('name', 2 ** 20, piece_length=2 ** 15)
+        info.add_piece_digests(bytes(40))
+        self.assertEqual(info['pieces'], bytes(40))
+        with self.assertRaises(ValueError):
+            info.add_piece_digests(bytes(30))
+
+        info.add_data(b'a')
+        with self.assertRaises(ValueError):
+            info.add_piece_digests(bytes(20))
+
+    def test_pieces(self):
+        """Test that the pieces are joined again only once they change"""
+        for threads in (1, 4):
+            info = Info('name', 2 ** 20, piece_length=2 ** 15,
+                        hash_threads=threads)
+            for data in (b'', b'a' * 40000, b'b', b'c' * (2 ** 15 - 7233),
+                         b'd' * 2 ** 16):
+                info.hasher.update(data)
+                pieces = info['pieces']
+                self.assertEqual(pieces, bytes(info.hasher))
+                self.assertIs(info['pieces'], pieces)
+
+            info.hasher.pieces = [bytes(20)]
+            self.assertEqual(info['pieces'], bytes(info.hasher))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,3 +1,5 @@
+from typing import List, Optional, Tuple
+
 from functions import PluginError
 from pluginmixin import PluginOutput
 
@@ -33,6 +35,28 @@ class OutputPlugin:
         """
         return
 
+    def handle_batch(self, items: List[Tuple[PluginOutput, str]]) -> List[Optional[PluginError]]:
+        """
+        Send several torrent files to an external program. Implement to add them in fewer calls where the program
+        supports it
+        :param items: (plugin_output, path) of each torrent
+        :return: for each torrent, the error it failed with, or None if it was added
+        """
+        errors = []
+        for plugin_output, path in items:
+            try:
+                self.handle(plugin_output, path)
+                errors.append(None)
+            except PluginError as e:
+                errors.append(e)
+        return errors
+
+    def close(self) -> None:
+        """
+        Release the connection to the external program. Connections are otherwise kept open between torrents
+        """
+        return
+
     def _get_port(self) -> int:
         if 'port' not in self.config or not self.config['port'].isnumeric():
             raise PluginError(f"Invalid {self.title} configuration value for 'port'")
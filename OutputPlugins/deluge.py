@@ -1,5 +1,5 @@
 import random
-from typing import Dict
+from typing import Dict, List, Optional, Tuple
 
 import requests
 
@@ -8,37 +8,57 @@ from functions import PluginError
 from pluginmixin import PluginOutput
 
 
+class SessionExpired(PluginError):
+    def __init__(self):
+        super().__init__("Not authenticated")
+
+
 class DelugeSession:
+    """Authenticated connection to the deluge web UI, kept alive between requests. Logs in again if the session
+    expires"""
+    NOT_AUTHENTICATED = 1  # deluge web JSON-RPC error code
+
     def __init__(self, host: str, port: int, password: str):
         self.base_url = f"http://{host}:{port}"
         self.password = password
         self.session = requests.Session()
+        self.login()
 
+    def login(self) -> None:
         req = {
             "method": "auth.login",
             "params": [self.password],
             "id": random.randint(1, 1000000)
         }
 
-        resp = self.post('/json', json=req)
+        resp = self._post('/json', json=req)
 
         if not resp['result']:
             raise PluginError("Login failed")
 
     def post(self, location: str, **kwargs) -> Dict:
-        # TODO cookies should be persisted in the requests session
-        kwargs['cookies'] = requests.utils.dict_from_cookiejar(self.session.cookies)
+        """Post a request, logging in again and retrying once if the session has expired"""
+        try:
+            return self._post(location, **kwargs)
+        except SessionExpired:
+            self.login()
+            return self._post(location, **kwargs)
+
+    def _post(self, location: str, **kwargs) -> Dict:
+        # the session cookie is kept by the requests session
         try:
-            http_resp = self.session.post(f"{self.base_url}/{location}", **kwargs)
+            http_resp = self.session.post(f"{self.base_url}/{location.lstrip('/')}", **kwargs)
         except requests.exceptions.ConnectionError as e:
             raise PluginError("Failed to connect to deluge: ConnectionError") from e
 
         if http_resp.status_code != 200:
-            PluginError(f"Failed to connect to deluge: HTTP response f{http_resp.status_code}")
+            raise PluginError(f"Failed to connect to deluge: HTTP response {http_resp.status_code}")
 
         resp = http_resp.json()
 
         if resp.get('error'):
+            if resp['error'].get('code') == self.NOT_AUTHENTICATED:
+                raise SessionExpired()
             raise PluginError(resp['error']['message'])
 
         return resp
@@ -76,62 +96,92 @@ class Deluge(OutputPlugin):
         :param path: the path being hashed
         :raises PluginError if the torrent cannot be processed
         """
-        deluge = self._get_session()
-
-        # Check the torrent hash isn't already in deluge
-        req = {
-            "method": "web.update_ui",
-            "params": [["download_location"], {}],
-            "id": random.randint(1, 1000000)
-        }
-
-        resp = deluge.post('/json', json=req)
+        error = self.handle_batch([(plugin_output, path)])[0]
+        if error:
+            raise error
 
-        if plugin_output.get_hex_hash() in resp['result']['torrents']:
-            raise PluginError("Torrent hash already exists")
-
-        # Upload the torrent
-        resp = deluge.post("/upload", files={'file': plugin_output.torrent_data})
-
-        if not resp['success']:
-            raise PluginError("Torrent upload failed")
-
-        # Add the uploaded torrent
-        req = {
-            "method": "web.add_torrents",
-            "params": [
-                [
-                    {
-                        "path": resp['files'][0],
-                        "options": {
-                            "file_priorities": [
-                                1,
-                                1
-                            ],
-                            "add_paused": self._get_add_paused(),
-                            "sequential_download": False,
-                            "pre_allocate_storage": False,
-                            "download_location": path,
-                            "move_completed": False,
-                            "move_completed_path": path,
-                            "max_connections": -1,
-                            "max_download_speed": -1,
-                            "max_upload_slots": -1,
-                            "max_upload_speed": -1,
-                            "prioritize_first_last_pieces": False,
-                            "seed_mode": False,
-                            "super_seeding": False
-                        }
-                    }
-                ]
+    def handle_batch(self, items: List[Tuple[PluginOutput, str]]) -> List[Optional[PluginError]]:
+        """
+        Send several torrent files to an external program, uploading and adding them in one call each
+        :param items: (plugin_output, path) of each torrent
+        :return: for each torrent, the error it failed with, or None if it was added
+        """
+        errors = [None] * len(items)
+        try:
+            deluge = self._get_session()
+
+            # Check the torrent hashes aren't already in deluge
+            req = {
+                "method": "web.update_ui",
+                "params": [["download_location"], {}],
+                "id": random.randint(1, 1000000)
+            }
+
+            resp = deluge.post('/json', json=req)
+
+            added = []
+            for i, (plugin_output, path) in enumerate(items):
+                if plugin_output.get_hex_hash() in resp['result']['torrents']:
+                    errors[i] = PluginError("Torrent hash already exists")
+                else:
+                    added.append(i)
+            if not added:
+                return errors
+
+            # Upload the torrents
+            resp = deluge.post("/upload", files=[('file', items[i][0].torrent_data) for i in added])
+
+            if not resp['success']:
+                raise PluginError("Torrent upload failed")
+
+            # Add the uploaded torrents
+            req = {
+                "method": "web.add_torrents",
+                "params": [[{"path": upload_path, "options": self._get_options(items[i][1])}
+                            for i, upload_path in zip(added, resp['files'])]],
+                "id": random.randint(1, 1000000)
+            }
+
+            resp = deluge.post('/json', json=req)
+
+            for i, result in zip(added, resp['result']):
+                if not result:
+                    errors[i] = PluginError("Failed to add torrent")
+
+        except PluginError as e:
+            errors = [error or e for error in errors]
+
+        return errors
+
+    def _get_options(self, path: str) -> Dict:
+        return {
+            "file_priorities": [
+                1,
+                1
             ],
-            "id": random.randint(1, 1000000)
+            "add_paused": self._get_add_paused(),
+            "sequential_download": False,
+            "pre_allocate_storage": False,
+            "download_location": path,
+            "move_completed": False,
+            "move_completed_path": path,
+            "max_connections": -1,
+            "max_download_speed": -1,
+            "max_upload_slots": -1,
+            "max_upload_speed": -1,
+            "prioritize_first_last_pieces": False,
+            "seed_mode": False,
+            "super_seeding": False
         }
 
-        resp = deluge.post('/json', json=req)
-
-        if not resp['result'][0]:
-            raise PluginError("Failed to add torrent")
+    def close(self) -> None:
+        if self.session:
+            try:
+                self.session.post('/json', json={"method": "auth.delete_session", "params": [],
+                                                 "id": random.randint(1, 1000000)})
+            except PluginError:
+                pass
+            self.session = None
 
     def _get_session(self) -> DelugeSession:
         """Returns a DelugeSession singleton"""
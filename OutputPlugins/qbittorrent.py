@@ -1,3 +1,6 @@
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
 import qbittorrentapi
 
 from OutputPlugins.base_output import OutputPlugin
@@ -8,6 +11,10 @@ from pluginmixin import PluginOutput
 class QBittorrent(OutputPlugin):
     title = "qBittorrent"
 
+    def __init__(self, config=None):
+        self.client = None
+        super().__init__(config)
+
     def validate_config(self):
         """
         Validate plugin-specific configuration, raise
@@ -24,18 +31,7 @@ class QBittorrent(OutputPlugin):
         Ensure that a connection to the external program can be made
         :raises PluginError if a connection cannot be established
         """
-        qbt_client = qbittorrentapi.Client(host=self.config['host'],
-                                           port=self._get_port(),
-                                           username=self.config['username'],
-                                           password=self.config['password'])
-
-        try:
-            qbt_client.auth_log_in()
-        except qbittorrentapi.LoginFailed as e:
-            raise PluginError(f"Failed to connect to {self.title}: login failed")
-        except (qbittorrentapi.APIConnectionError, qbittorrentapi.APIError) as e:
-            raise PluginError(f"Failed to connect to {self.title}") from e
-        qbt_client.auth_log_out()
+        self._get_client()
 
     def handle(self, plugin_output: PluginOutput, path: str):
         """
@@ -44,15 +40,62 @@ class QBittorrent(OutputPlugin):
         :param path: the path being hashed
         :raises PluginError if the torrent cannot be processed
         """
-        with qbittorrentapi.Client(host=self.config['host'],
-                                   port=self._get_port(),
-                                   username=self.config['username'],
-                                   password=self.config['password']) as client:
-            result = client.torrents_add(torrent_files=plugin_output.torrent_data,
-                                         save_path=path,
-                                         is_paused=self._get_add_paused(),
-                                         use_auto_torrent_management=False)
-            if result != 'Ok.':
-                raise PluginError('client rejected the torrent')
-
-        return
+        error = self.handle_batch([(plugin_output, path)])[0]
+        if error:
+            raise error
+
+    def handle_batch(self, items: List[Tuple[PluginOutput, str]]) -> List[Optional[PluginError]]:
+        """
+        Send several torrent files to an external program, in one call per save path
+        :param items: (plugin_output, path) of each torrent
+        :return: for each torrent, the error it failed with, or None if it was added
+        """
+        client = self._get_client()
+
+        by_path = OrderedDict()
+        for i, (plugin_output, path) in enumerate(items):
+            by_path.setdefault(path, []).append(i)
+
+        errors = [None] * len(items)
+        for path, indices in by_path.items():
+            try:
+                # the session is logged in again by the client if it has expired
+                result = client.torrents_add(torrent_files=[items[i][0].torrent_data for i in indices],
+                                             save_path=path,
+                                             is_paused=self._get_add_paused(),
+                                             use_auto_torrent_management=False)
+                error = None if result == 'Ok.' else PluginError('client rejected the torrent')
+            except qbittorrentapi.LoginFailed:
+                error = PluginError(f"Failed to connect to {self.title}: login failed")
+            except (qbittorrentapi.APIConnectionError, qbittorrentapi.APIError) as e:
+                error = PluginError(f"Failed to connect to {self.title}: {e}")
+
+            for i in indices:
+                errors[i] = error
+
+        return errors
+
+    def close(self) -> None:
+        if self.client:
+            try:
+                self.client.auth_log_out()
+            except (qbittorrentapi.APIConnectionError, qbittorrentapi.APIError):
+                pass
+            self.client = None
+
+    def _get_client(self) -> qbittorrentapi.Client:
+        """Returns a logged in qbittorrentapi client singleton"""
+        if not self.client:
+            client = qbittorrentapi.Client(host=self.config['host'],
+                                           port=self._get_port(),
+                                           username=self.config['username'],
+                                           password=self.config['password'])
+            try:
+                client.auth_log_in()
+            except qbittorrentapi.LoginFailed as e:
+                raise PluginError(f"Failed to connect to {self.title}: login failed")
+            except (qbittorrentapi.APIConnectionError, qbittorrentapi.APIError) as e:
+                raise PluginError(f"Failed to connect to {self.title}") from e
+            self.client = client
+
+        return self.client
@@ -41,8 +41,13 @@ class Transmission(OutputPlugin):
         """
         client = self._get_client()
 
+        # the client keeps its connection and session id between torrents, renewing the session id when it expires
         try:
             client.add_torrent(torrent=plugin_output.torrent_data, download_dir=path, paused=self._get_add_paused())
+        except TransmissionAuthError as e:
+            raise PluginError("Authentication error") from e
+        except (TransmissionConnectError, TransmissionTimeoutError) as e:
+            raise PluginError("Could not connect") from e
         except TransmissionError as e:
             raise PluginError(e.message)
 
@@ -53,7 +58,7 @@ class Transmission(OutputPlugin):
                 self.client = transmission_rpc.Client(host=self.config['host'],
                                                       port=self._get_port(),
                                                       username=self.config['username'],
-                                                      password='abcd')
+                                                      password=self.config['password'])
             except TransmissionAuthError as e:
                 raise PluginError("Authentication error") from e
             except (TransmissionConnectError, TransmissionTimeoutError) as e:
@@ -1,4 +1,5 @@
 import re
+from typing import List, Optional, Tuple
 
 import requests
 from requests.auth import HTTPBasicAuth
@@ -8,6 +9,11 @@ from functions import PluginError
 from pluginmixin import PluginOutput
 
 
+class TokenExpired(PluginError):
+    def __init__(self):
+        super().__init__("uTorrent token expired")
+
+
 class UtorrentSession:
     def __init__(self, host: str, port: int, username: str, password: str):
         self.base_url = f"http://{host}:{port}/gui"
@@ -16,6 +22,10 @@ class UtorrentSession:
         self.session = requests.Session()
 
         self.get('/')  # sanity check
+        self.refresh_token()
+
+    def refresh_token(self) -> None:
+        self.token = None
         http_resp = self.get('/token.html')
         self.token = re.findall(r"[\w=_-]{60,64}", http_resp.text)[0]
 
@@ -28,17 +38,24 @@ class UtorrentSession:
         return self._make_request(self.session.post, location, **kwargs)
 
     def _make_request(self, session_func, location: str, **kwargs) -> requests.Response:
-        """Call requests Session.get, Session.post and handle errors"""
-        kwargs_new = kwargs
+        """Call requests Session.get, Session.post and handle errors. An expired token is renewed once"""
+        try:
+            return self._make_request_once(session_func, location, **kwargs)
+        except TokenExpired:
+            self.refresh_token()
+            return self._make_request_once(session_func, location, **kwargs)
+
+    def _make_request_once(self, session_func, location: str, **kwargs) -> requests.Response:
+        kwargs_new = dict(kwargs)
         kwargs_new['auth'] = self.auth  # inject HTTP basic auth token
 
         if self.token:
             if 'params' not in kwargs_new:
                 kwargs_new['params'] = {}
             if type(kwargs_new['params']) == dict:
-                kwargs_new['params']['token'] = self.token  # inject uTorrent token
+                kwargs_new['params'] = dict(kwargs_new['params'], token=self.token)  # inject uTorrent token
             elif type(kwargs_new['params']) == list:  # handle params type of list
-                kwargs_new['params'].insert(0, ('token', self.token))
+                kwargs_new['params'] = [('token', self.token)] + kwargs_new['params']
 
         try:
             http_resp = session_func(f"{self.base_url}{location}", **kwargs_new)
@@ -47,6 +64,8 @@ class UtorrentSession:
 
         if http_resp.status_code == 401:
             raise PluginError(f"login failed, verify your username/password")
+        elif http_resp.status_code == 400 and http_resp.text.strip() == "invalid request" and self.token:
+            raise TokenExpired()
         elif http_resp.status_code == 400 and http_resp.text.strip() == "invalid request":
             raise PluginError("webUI is not enabled, OR INVALID REQUEST")
         elif "WebUI does not seem to be installed" in http_resp.text:
@@ -91,47 +110,73 @@ class UTorrent(OutputPlugin):
         :param path: the path being hashed
         :raises PluginError if the torrent cannot be processed
         """
-        utorrent = self._get_session()
-
-        # Get existing settings
-        http_resp = self.session.get('/', params={'action': 'getsettings'})
-        existing_settings = {x[0]: x[2] for x in http_resp.json()['settings']
-                             if x[0] in ['dir_active_download_flag', 'dir_active_download', 'torrents_start_stopped']}
-
-        # remap strings
-        remaps = {'false': 0, 'true': 1}
-        for key in existing_settings.keys():
-            if existing_settings[key] in remaps.keys():
-                existing_settings[key] = remaps[existing_settings[key]]
-
-        # Set the download directory
-        utorrent.get('/', params=[
-            ('action', 'setsetting'),
-            ('s', 'dir_active_download_flag'),
-            ('v', '1'),
-            ('s', 'dir_active_download'),
-            ('v', path),
-            ('s', 'dir_completed_download_flag'),
-            ('v', '0'),
-            ('s', 'torrents_start_stopped'),
-            ('v', int(self._get_add_paused()))
-        ])
+        error = self.handle_batch([(plugin_output, path)])[0]
+        if error:
+            raise error
 
+    def handle_batch(self, items: List[Tuple[PluginOutput, str]]) -> List[Optional[PluginError]]:
+        """
+        Send several torrent files to an external program, changing the download directory setting once per path
+        :param items: (plugin_output, path) of each torrent
+        :return: for each torrent, the error it failed with, or None if it was added
+        """
+        errors = [None] * len(items)
+        added = [False] * len(items)
         try:
-            # Upload the torrent
-            utorrent.post('/', params={'action': 'add-file'}, files={'torrent_file': plugin_output.torrent_data})
-
-        finally:
-            # Restore original settings
-            utorrent.get('/', params=[
-                ('action', 'setsetting'),
-                ('s', 'dir_active_download_flag'),
-                ('v', int(existing_settings['dir_active_download_flag'])),
-                ('s', 'dir_active_download'),
-                ('v', existing_settings['dir_active_download']),
-                ('s', 'torrents_start_stopped'),
-                ('v', int(existing_settings['torrents_start_stopped']))
-            ])
+            utorrent = self._get_session()
+
+            # Get existing settings
+            http_resp = utorrent.get('/', params={'action': 'getsettings'})
+            existing_settings = {x[0]: x[2] for x in http_resp.json()['settings']
+                                 if x[0] in ['dir_active_download_flag', 'dir_active_download',
+                                             'torrents_start_stopped']}
+
+            # remap strings
+            remaps = {'false': 0, 'true': 1}
+            for key in existing_settings.keys():
+                if existing_settings[key] in remaps.keys():
+                    existing_settings[key] = remaps[existing_settings[key]]
+
+            try:
+                for i, (plugin_output, path) in enumerate(items):
+                    # Set the download directory
+                    if i == 0 or path != items[i - 1][1]:
+                        utorrent.get('/', params=[
+                            ('action', 'setsetting'),
+                            ('s', 'dir_active_download_flag'),
+                            ('v', '1'),
+                            ('s', 'dir_active_download'),
+                            ('v', path),
+                            ('s', 'dir_completed_download_flag'),
+                            ('v', '0'),
+                            ('s', 'torrents_start_stopped'),
+                            ('v', int(self._get_add_paused()))
+                        ])
+
+                    # Upload the torrent
+                    try:
+                        utorrent.post('/', params={'action': 'add-file'},
+                                      files={'torrent_file': plugin_output.torrent_data})
+                        added[i] = True
+                    except PluginError as e:
+                        errors[i] = e
+
+            finally:
+                # Restore original settings
+                utorrent.get('/', params=[
+                    ('action', 'setsetting'),
+                    ('s', 'dir_active_download_flag'),
+                    ('v', int(existing_settings['dir_active_download_flag'])),
+                    ('s', 'dir_active_download'),
+                    ('v', existing_settings['dir_active_download']),
+                    ('s', 'torrents_start_stopped'),
+                    ('v', int(existing_settings['torrents_start_stopped']))
+                ])
+
+        except PluginError as e:
+            errors = [error or (None if added[i] else e) for i, error in enumerate(errors)]
+
+        return errors
 
     def _get_session(self) -> UtorrentSession:
         """Returns a UTorrentSession singleton"""
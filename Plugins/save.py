@@ -45,6 +45,12 @@ class SmarthashPlugin(BasePlugin):
 						file.write(image)
 					i += 1
 
+		sfv_lines = [f"{os.path.relpath(path, data['title'])} {digests['crc32']}"
+					 for path, digests in data.get('file_digests', {}).items() if 'crc32' in digests]
+		if sfv_lines:
+			with open(os.path.join(meta_folder, data['title'])+".sfv", "w") as file:
+				file.write("\n".join(sfv_lines) + "\n")
+
 		with open(torrent_file_path, 'wb') as handle:
 			handle.write(data['torrent_file'])
 
@@ -0,0 +1,129 @@
+"""Compare bencoding large generated torrents with the previous implementation
+
+Previously BTEncoder recursed through an isinstance chain for every value, formatting each integer and length with
+str.format and joining a list of small bytes objects, and BencodedFile.write built the whole torrent in memory before
+writing it. Now values are dispatched on their exact type through a table, containers are walked with an explicit
+stack, and the encoding is appended to a bytearray that is flushed to the file every megabyte.
+
+Usage: python -m benchmarks.bench_bencode [--files 50000] [--info-size 1000] [--repeat 3]
+"""
+import argparse
+import collections.abc
+import os
+import tempfile
+import time
+import tracemalloc
+
+from BitTornado.Meta.bencode import bencode, Bencached, BENCACHED_MARKER
+from BitTornado.Meta.Info import Info, MetaInfo
+
+
+class LegacyEncoder(object):
+    def __call__(self, data):
+        ctext = []
+        self.encode(data, ctext)
+        return b''.join(ctext)
+
+    def encode(self, data, ctext):
+        if isinstance(data, int):
+            ctext.append('i{:d}e'.format(data).encode('utf-8'))
+        elif isinstance(data, (str, bytes)):
+            if isinstance(data, str):
+                data = data.encode('utf-8')
+            ctext.extend((str(len(data)).encode('utf-8'), b':', data))
+        elif isinstance(data, Bencached):
+            assert data.marker == BENCACHED_MARKER
+            ctext.append(data.bencoded)
+        elif isinstance(data, collections.abc.Sequence):
+            ctext.append(b'l')
+            for element in data:
+                self.encode(element, ctext)
+            ctext.append(b'e')
+        elif isinstance(data, collections.abc.Mapping):
+            ctext.append(b'd')
+            ilist = data.items()
+            for key, data in sorted(ilist):
+                if not isinstance(key, (str, bytes)):
+                    raise TypeError("Dictionary keys must be (byte)strings")
+                self.encode(key, ctext)
+                self.encode(data, ctext)
+            ctext.append(b'e')
+        else:
+            raise TypeError('Unknown type for bencode: ' + str(type(data)))
+
+
+legacy_bencode = LegacyEncoder()
+
+
+def legacy_write(metainfo, fname: str):
+    with open(fname, 'wb') as handle:
+        handle.write(legacy_bencode(metainfo))
+
+
+def generated_torrents(files: int, info_size: int) -> dict:
+    """A plain dict torrent and a MetaInfo, each with files files and a smarthash_info of info_size bytes per file"""
+    paths = [['Season {:02}'.format(i // 1000), 'Disc {}'.format(i // 100 % 10), 'Track {:05}.flac'.format(i)]
+             for i in range(files)]
+    smarthash_info = 'x' * info_size
+    pieces = [i.to_bytes(20, 'big') for i in range(files)]
+
+    plain = {'announce': 'http://tracker.example/announce', 'creation date': 1600000000,
+             'info': {'name': 'generated', 'piece length': 2 ** 22, 'pieces': b''.join(pieces),
+                      'files': [{'length': i * 1000, 'path': path, 'smarthash_info': smarthash_info}
+                                for i, path in enumerate(paths)]}}
+
+    info = Info('generated', 2 ** 40, piece_length=2 ** 22)
+    for i, path in enumerate(paths):
+        info.add_file_info(i * 1000, path, trusted=True)
+        info['files'][-1]['smarthash_info'] = smarthash_info
+    info.check_files()
+    info.hasher.pieces = pieces
+    metainfo = MetaInfo(announce='http://tracker.example/announce', info=info)
+    return {'dict': plain, 'MetaInfo': metainfo}
+
+
+def best(func, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def peak_memory(func) -> int:
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def main():
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument("--files", type=int, default=50000)
+    argparser.add_argument("--info-size", type=int, default=1000, help="bytes of smarthash_info per file")
+    argparser.add_argument("--repeat", type=int, default=3)
+    args = argparser.parse_args()
+
+    for name, torrent in generated_torrents(args.files, args.info_size).items():
+        assert bencode(torrent) == legacy_bencode(torrent)
+        legacy_time = best(lambda: legacy_bencode(torrent), args.repeat)
+        elapsed = best(lambda: bencode(torrent), args.repeat)
+        size = len(bencode(torrent))
+        print(f"{name:8} ({size / 2 ** 20:.1f} MiB): legacy {legacy_time:.3f}s, encoder {elapsed:.3f}s "
+              f"({legacy_time / elapsed:.1f}x)")
+
+    metainfo = torrent
+    with tempfile.TemporaryDirectory() as tmpdir:
+        fname = os.path.join(tmpdir, 'generated.torrent')
+        legacy_time = best(lambda: legacy_write(metainfo, fname), args.repeat)
+        legacy_peak = peak_memory(lambda: legacy_write(metainfo, fname))
+        elapsed = best(lambda: metainfo.write(fname), args.repeat)
+        peak = peak_memory(lambda: metainfo.write(fname))
+    print(f"write    : legacy {legacy_time:.3f}s, peak {legacy_peak / 2 ** 20:.1f} MiB; "
+          f"streamed {elapsed:.3f}s, peak {peak / 2 ** 20:.1f} MiB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""Time blacklist filtering of a scene release split into many archive volumes, compared with the previous
+implementation
+
+Previously the whole tree was built and each blacklisted file was then removed by searching from the root, following
+every archive volume (.r00, .r01, ...) with another search, which is quadratic in the number of volumes. Now a
+compiled FileFilter drops files as each directory is listed.
+
+Usage: python -m benchmarks.bench_blacklist [--releases 5] [--volumes 300]
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+from BitTornado.Meta.BTTree import BTTree
+from BitTornado.Meta.FileFilter import FileFilter, next_in_file_sequence
+from BitTornado.Meta.FileTable import FileTable
+
+PATH_MATCHES = ['sample', 'proof']
+EXTENSIONS = ['.sfv', '.nfo', '.rar']
+
+
+def is_file_valid(path):
+    """The previous per-file check"""
+    path = [segment.lower() for segment in path]
+    for match in PATH_MATCHES:
+        if match in path or os.path.splitext(path[-1])[0].endswith(match):
+            return False
+    return not path[-1].endswith(tuple(EXTENSIONS))
+
+
+def remove_invalid_file(node, path):
+    """The previous removal, searching from the root"""
+    for sub in node.subs:
+        if not sub.subs and path == sub.path:
+            node.subs = [x for x in node.subs if x != sub]
+            return True
+        if path[0:len(sub.path)] == sub.path and remove_invalid_file(sub, path):
+            if not sub.subs:
+                node.subs = [x for x in node.subs if x != sub]
+            return True
+    return False
+
+
+def leaves(node):
+    if not node.subs:
+        yield node
+    for sub in node.subs:
+        yield from leaves(sub)
+
+
+def legacy(root):
+    tree = BTTree(root, [])
+    for path in [leaf.path for leaf in leaves(tree) if not is_file_valid(leaf.path)]:
+        did_remove = remove_invalid_file(tree, path)
+        name = next_in_file_sequence(path[-1])
+        while did_remove and name:
+            did_remove = remove_invalid_file(tree, path[:-1] + [name])
+            name = next_in_file_sequence(name)
+    return sorted(leaf.path for leaf in leaves(tree))
+
+
+def current(root):
+    tree = BTTree(root, [], FileTable(root, [], FileFilter(PATH_MATCHES, EXTENSIONS)))
+    return sorted(leaf.path for leaf in leaves(tree))
+
+
+def create_tree(root, releases, volumes):
+    for i in range(releases):
+        release = os.path.join(root, f"release.{i:02}")
+        for folder in ('', 'sample', 'proof'):
+            os.makedirs(os.path.join(release, folder), exist_ok=True)
+        names = [f"release.{i:02}.rar", f"release.{i:02}.sfv", f"release.{i:02}.nfo", f"release.{i:02}.mkv",
+                 os.path.join('sample', 'release-sample.mkv'), os.path.join('proof', 'release-proof.jpg')]
+        names += [f"release.{i:02}.r{j:02}" for j in range(min(volumes, 99))]
+        names += [f"release.{i:02}.{j:03}" for j in range(max(0, volumes - 99))]
+        for name in names:
+            open(os.path.join(release, name), 'wb').close()
+
+
+def run(func, root):
+    start = time.perf_counter()
+    result = func(root)
+    return time.perf_counter() - start, result
+
+
+def main():
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument("--releases", type=int, default=5)
+    argparser.add_argument("--volumes", type=int, default=300)
+    args = argparser.parse_args()
+
+    root = tempfile.mkdtemp()
+    try:
+        create_tree(root, args.releases, args.volumes)
+        legacy_time, expected = run(legacy, root)
+        current_time, actual = run(current, root)
+        assert expected == actual, "filtered trees differ"
+
+        print(f"post-pruning:       {legacy_time * 1000:9.1f} ms")
+        print(f"filter during walk: {current_time * 1000:9.1f} ms ({legacy_time / current_time:.0f}x)")
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""Compare bulk mode with the upload and client add run in line, against handing them off to a background queue
+
+Previously each item was uploaded and added to the client before the next item was hashed. Now those network calls
+run on a background thread while the next item is analysed. Analysis is simulated with CPU work and the network
+calls with a fixed latency.
+
+Usage: python -m benchmarks.bench_handoff [--items 20] [--analyse-ms 100] [--latency-ms 80] [--queue 2]
+"""
+import argparse
+import hashlib
+import time
+
+from tools.handoff_queue import HandoffQueue
+
+
+def analyse(milliseconds: float) -> bytes:
+    digest = b''
+    deadline = time.perf_counter() + milliseconds / 1000
+    while time.perf_counter() < deadline:
+        digest = hashlib.sha1(digest + bytes(2**16)).digest()
+    return digest
+
+
+def submit(milliseconds: float) -> None:
+    # tracker upload, then the client add
+    time.sleep(milliseconds / 2000)
+    time.sleep(milliseconds / 2000)
+
+
+def run_inline(items: int, analyse_ms: float, latency_ms: float) -> float:
+    start = time.perf_counter()
+    for _ in range(items):
+        analyse(analyse_ms)
+        submit(latency_ms)
+    return time.perf_counter() - start
+
+
+def run_handoff(items: int, analyse_ms: float, latency_ms: float, size: int) -> float:
+    start = time.perf_counter()
+    handoff = HandoffQueue(size)
+    for _ in range(items):
+        analyse(analyse_ms)
+        handoff.submit('item', lambda: submit(latency_ms))
+    handoff.close()
+    return time.perf_counter() - start
+
+
+def main():
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument("--items", type=int, default=20)
+    argparser.add_argument("--analyse-ms", type=float, default=100, help="analysis time per item")
+    argparser.add_argument("--latency-ms", type=float, default=80, help="network time per item")
+    argparser.add_argument("--queue", type=int, default=2, help="hand-off queue size")
+    args = argparser.parse_args()
+
+    inline_time = run_inline(args.items, args.analyse_ms, args.latency_ms)
+    print(f"in line:          {args.items / inline_time:6.1f} items/s")
+    elapsed = run_handoff(args.items, args.analyse_ms, args.latency_ms, args.queue)
+    print(f"handed off ({args.queue:2}): {args.items / elapsed:6.1f} items/s ({inline_time / elapsed:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
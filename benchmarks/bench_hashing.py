@@ -0,0 +1,54 @@
+"""Compare serial and threaded piece hashing in make_meta_file
+
+Usage: python -m benchmarks.bench_hashing [--size-mb 512] [--files 8] [--threads 4]
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+from BitTornado.Application.makemetafile import make_meta_file
+
+
+def create_tree(root: str, num_files: int, size_mb: int) -> None:
+    file_size = size_mb * 2 ** 20 // num_files
+    for i in range(num_files):
+        with open(os.path.join(root, f"file_{i:03}.bin"), 'wb') as f:
+            # odd-sized files ensure pieces span file boundaries
+            f.write(os.urandom(file_size + i * 7919))
+
+
+def run(path: str, threads: int):
+    params = {'blacklist_file_extensions': [], 'blacklist_path_matches': [], 'hash_threads': threads}
+    start = time.perf_counter()
+    metainfo = make_meta_file(path, None, params=params)
+    return time.perf_counter() - start, metainfo['info']['pieces']
+
+
+def main():
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument("--size-mb", type=int, default=512)
+    argparser.add_argument("--files", type=int, default=8)
+    argparser.add_argument("--threads", type=int, default=os.cpu_count())
+    args = argparser.parse_args()
+
+    root = tempfile.mkdtemp()
+    try:
+        path = os.path.join(root, 'release')
+        os.mkdir(path)
+        create_tree(path, args.files, args.size_mb)
+
+        serial_time, serial_pieces = run(path, 1)
+        threaded_time, threaded_pieces = run(path, args.threads)
+        assert serial_pieces == threaded_pieces, "threaded pieces differ from serial pieces"
+
+        print(f"serial:       {args.size_mb / serial_time:8.1f} MB/s")
+        print(f"{args.threads:2} threads:   {args.size_mb / threaded_time:8.1f} MB/s "
+              f"({serial_time / threaded_time:.2f}x)")
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == '__main__':
+    main()
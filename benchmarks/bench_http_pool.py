@@ -0,0 +1,51 @@
+"""Compare the requests_retriable_* helpers with the previous implementation, against a local HTTP stand-in
+
+Previously each call went through requests.post, which opens a new connection for every request. Now requests are
+sent through a shared session per host, reusing kept-alive connections. Without TLS the saving is the TCP handshake
+and connection setup only, a lower bound of what is saved against a remote tracker.
+
+Usage: python -m benchmarks.bench_http_pool [--requests 500] [--size 65536] [--threads 4]
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from functions import http_pool, import_requests, requests_retriable_post
+from tests.fake_clients import FakeTracker
+
+
+def legacy_post(url: str, **kwargs):
+    return import_requests().post(url, **kwargs)
+
+
+def run(tracker: FakeTracker, func, count: int, size: int, threads: int) -> float:
+    tracker.connections = 0
+    url = f"http://127.0.0.1:{tracker.port}/upload"
+    body = bytes(size)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        responses = list(executor.map(lambda _: func(url, data=body), range(count)))
+    elapsed = time.perf_counter() - start
+    assert all(response.status_code == 200 for response in responses)
+    return elapsed
+
+
+def main():
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument("--requests", type=int, default=500)
+    argparser.add_argument("--size", type=int, default=65536, help="bytes posted per request")
+    argparser.add_argument("--threads", type=int, default=4)
+    args = argparser.parse_args()
+
+    tracker = FakeTracker()
+    legacy_time = run(tracker, legacy_post, args.requests, args.size, args.threads)
+    print(f"connection per request: {args.requests / legacy_time:8.1f} requests/s, {tracker.connections} connections")
+    elapsed = run(tracker, requests_retriable_post, args.requests, args.size, args.threads)
+    print(f"pooled session:         {args.requests / elapsed:8.1f} requests/s, {tracker.connections} connections "
+          f"({legacy_time / elapsed:.1f}x)")
+    print(http_pool.summary())
+    tracker.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""Compare building the info dict of a large torrent with the previous implementation
+
+Previously every file added by BTTree was normalized as it was appended: a File dict with its own set of valid keys,
+each value coerced through the typemap and each path name matched against VALID_NAME. Now entries from the walk are
+appended as they are and checked in a single pass once the tree has been added. The concatenated piece digests, which
+were joined again each time 'pieces' was read (bencoding, info hash), are also kept until the hasher changes.
+
+Usage: python -m benchmarks.bench_info_build [--files 50000] [--pieces 50000] [--reads 3]
+"""
+import argparse
+import time
+
+from BitTornado.Meta.Info import Info
+
+
+class LegacyFile(Info.Files.File):
+    valid_keys = None
+
+
+class LegacyFiles(Info.Files):
+    valtype = LegacyFile
+
+
+def tree(count: int) -> list:
+    """(size, path) of each file, as BTTree walks them"""
+    return [(i * 1000, ['Season {:02}'.format(i // 1000), 'Disc {}'.format(i // 100 % 10),
+                        'Track {:05}.flac'.format(i)]) for i in range(count)]
+
+
+def new_info(pieces: int) -> Info:
+    info = Info('benchmark', 2 ** 40, piece_length=2 ** 22)
+    info.hasher.pieces = [i.to_bytes(20, 'big') for i in range(pieces)]
+    return info
+
+
+def legacy_build(files: list, pieces: int) -> Info:
+    info = new_info(pieces)
+    info['files'] = LegacyFiles()
+    for size, path in files:
+        info._get('files').append({'length': size, 'path': path})
+    return info
+
+
+def trusted_build(files: list, pieces: int) -> Info:
+    info = new_info(pieces)
+    for size, path in files:
+        info.add_file_info(size, path, trusted=True)
+    info.check_files()
+    return info
+
+
+def main():
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument("--files", type=int, default=50000)
+    argparser.add_argument("--pieces", type=int, default=50000)
+    argparser.add_argument("--reads", type=int, default=3, help="times 'pieces' is read once hashing is done")
+    args = argparser.parse_args()
+
+    files = tree(args.files)
+    timings = {}
+    for name, build, read_pieces in [('legacy', legacy_build, lambda info: bytes(info.hasher)),
+                                     ('trusted', trusted_build, lambda info: info['pieces'])]:
+        start = time.perf_counter()
+        info = build(files, args.pieces)
+        build_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for _ in range(args.reads):
+            read_pieces(info)
+        read_time = time.perf_counter() - start
+        timings[name] = (build_time, read_time, info)
+
+    legacy_build_time, legacy_read_time, legacy_info = timings['legacy']
+    build_time, read_time, info = timings['trusted']
+    assert info['files'] == legacy_info['files'] and info['pieces'] == bytes(legacy_info.hasher)
+
+    print(f"legacy:  built in {legacy_build_time:.3f}s, pieces read {args.reads}x in {legacy_read_time * 1000:.2f}ms")
+    print(f"trusted: built in {build_time:.3f}s, pieces read {args.reads}x in {read_time * 1000:.2f}ms "
+          f"({legacy_build_time / build_time:.1f}x, {legacy_read_time / read_time:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""Compare the size of a discography torrent's metadata, and the time to bencode it, with each --info-encoding
+
+The audio fixture's metadata is repeated for every track, with per-track names and tags, as extracted metadata
+would be for a large discography.
+
+Usage: python -m benchmarks.bench_info_codec [--tracks 3000]
+"""
+import argparse
+import json
+import os
+import time
+from collections import OrderedDict
+
+from BitTornado.Meta.bencode import bencode
+from functions import extract_metadata
+from tests.test_smarthash import PATHS
+from tools import info_codec
+
+
+def discography(tracks: int) -> OrderedDict:
+    fixture = next(iter(extract_metadata(PATHS['audio_1'])[2].values()))
+    infos = OrderedDict()
+    for i in range(tracks):
+        album, track = divmod(i, 12)
+        name = f"Album {album:03}/{track + 1:02} - Track {i}.mp3"
+        info = json.loads(json.dumps(fixture), object_pairs_hook=OrderedDict)
+        info['mediainfo'][0]['complete_name'] = name
+        info['mediainfo'][0]['folder_name'] = os.path.dirname(name)
+        info['mediainfo'][0]['file_name'] = f"{track + 1:02} - Track {i}"
+        info['mediainfo'][0]['file_name_extension'] = f"{track + 1:02} - Track {i}.mp3"
+        info['tags'] = OrderedDict([('TALB', [f"Album {album:03}"]), ('TIT2', [f"Track {i}"]),
+                                    ('TPE1', ['Example Artist']), ('TRCK', [str(track + 1)])])
+        infos[name] = info
+    return infos
+
+
+def torrent_info(infos: OrderedDict, encoding: str) -> dict:
+    info = {'name': 'discography', 'piece length': 2 ** 22, 'pieces': bytes(20 * 1000),
+            'files': [{'length': 5000000, 'path': name.split('/')} for name in infos]}
+    if encoding == 'json':
+        for file in info['files']:
+            file['smarthash_info'] = json.dumps(infos['/'.join(file['path'])])
+    else:
+        info_codec.encode_files(info, infos, lambda file: '/'.join(file['path']), encoding == 'compact-zlib')
+    return info
+
+
+def main():
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument("--tracks", type=int, default=3000)
+    args = argparser.parse_args()
+
+    infos = discography(args.tracks)
+    baseline = None
+    for encoding in ['json', 'compact', 'compact-zlib']:
+        start = time.perf_counter()
+        info = torrent_info(infos, encoding)
+        encode_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        size = len(bencode({'info': info}))
+        bencode_time = time.perf_counter() - start
+
+        baseline = baseline or size
+        print(f"{encoding:12}: {size / 2**20:6.2f} MiB ({size / baseline:5.1%}), "
+              f"encoded in {encode_time:.2f}s, bencoded in {bencode_time:.2f}s")
+
+        if encoding != 'json':
+            start = time.perf_counter()
+            info_codec.decode_files(info)
+            print(f"{'':12}  decoded in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+"""Compare per-file MediaInfo.parse with the batched MediaInfoReader on the audio fixtures
+
+Usage: python -m benchmarks.bench_mediainfo [--repeat 50] [--threads 4]
+"""
+import argparse
+import os
+import time
+
+from pymediainfo import MediaInfo
+
+from functions import list_files
+from tools.mediainfo_reader import MediaInfoReader
+
+FIXTURES_AUDIO = os.path.join(os.path.dirname(__file__), '..', 'fixtures', 'audio')
+
+
+def main():
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument("--repeat", type=int, default=50, help="number of times each fixture is parsed")
+    argparser.add_argument("--threads", type=int, default=os.cpu_count())
+    args = argparser.parse_args()
+
+    root = os.path.abspath(FIXTURES_AUDIO)
+    paths = [os.path.join(os.path.dirname(root), file) for file in list_files(root) if file.lower().endswith('.mp3')]
+    paths *= args.repeat
+
+    start = time.perf_counter()
+    expected = [[track.to_data() for track in MediaInfo.parse(path).tracks] for path in paths]
+    per_file_time = time.perf_counter() - start
+
+    reader = MediaInfoReader(args.threads)
+    start = time.perf_counter()
+    actual = [[track.to_data() for track in media_info.tracks] for media_info in reader.parse_many(paths)]
+    batched_time = time.perf_counter() - start
+    reader.close()
+
+    assert expected == actual, "batched output differs from MediaInfo.parse"
+
+    print(f"per file:            {len(paths) / per_file_time:8.1f} files/s")
+    print(f"batched, {args.threads:2} threads: {len(paths) / batched_time:8.1f} files/s "
+          f"({per_file_time / batched_time:.2f}x)")
+
+
+if __name__ == '__main__':
+    main()
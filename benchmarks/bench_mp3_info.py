@@ -0,0 +1,62 @@
+"""Measure mp3_info throughput across many CBR files without Xing/Info/VBRI headers, the worst case for a
+full-file scan. If bitstring is installed, the previous full-file search is timed for comparison
+
+Usage: python -m benchmarks.bench_mp3_info [--files 50] [--size-mb 10]
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+from functions import mp3_info
+
+# MPEG-1 layer III, 128 kbit/s, 44.1 kHz: 417 byte frames
+FRAME = b"\xFF\xFB\x90\x00" + b"\x00" * 413
+
+
+def bitstring_scan(path: str) -> None:
+    """The search performed by the previous implementation when no header is present"""
+    import bitstring
+
+    stream = bitstring.ConstBitStream(filename=path)
+    for marker in ["0x58696E67", "0x496E666F", "0x56425249"]:
+        stream.find(marker, bytealigned=True)
+
+
+def run(paths, func) -> float:
+    start = time.perf_counter()
+    for path in paths:
+        func(path)
+    return time.perf_counter() - start
+
+
+def main():
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument("--files", type=int, default=50)
+    argparser.add_argument("--size-mb", type=int, default=10)
+    args = argparser.parse_args()
+
+    root = tempfile.mkdtemp()
+    try:
+        paths = []
+        frames = FRAME * (args.size_mb * 2 ** 20 // len(FRAME))
+        for i in range(args.files):
+            paths.append(os.path.join(root, f"track_{i:03}.mp3"))
+            with open(paths[-1], 'wb') as f:
+                f.write(frames)
+
+        parser_time = run(paths, mp3_info)
+        print(f"frame header parser: {args.files / parser_time:10.1f} files/s")
+
+        try:
+            scan_time = run(paths[:max(1, args.files // 10)], bitstring_scan) * args.files / max(1, args.files // 10)
+            print(f"bitstring scan:      {args.files / scan_time:10.1f} files/s ({scan_time / parser_time:.0f}x)")
+        except ImportError:
+            print("bitstring is not installed, skipping the full-file scan")
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""Compare handing torrents to qBittorrent with the previous implementation, against a local stand-in for its Web API
+
+Previously the output plugin created a new client, and logged in, for every torrent. Now the session is kept for the
+whole run and torrents are submitted in batches, one call per save path.
+
+Usage: python -m benchmarks.bench_output_plugins [--torrents 200] [--batch-size 20]
+"""
+import argparse
+import time
+
+import qbittorrentapi
+
+from OutputPlugins.qbittorrent import QBittorrent
+from pluginmixin import PluginOutput
+from tests.fake_clients import FakeQBittorrent
+
+
+def legacy_handle(config: dict, plugin_output: PluginOutput, path: str) -> None:
+    """The output plugin before sessions were kept: a new client, and a login, for every torrent"""
+    client = qbittorrentapi.Client(host=config['host'], port=config['port'], username=config['username'],
+                                   password=config['password'])
+    client.auth_log_in()
+    client.torrents_add(torrent_files=plugin_output.torrent_data, save_path=path, is_paused=False,
+                        use_auto_torrent_management=False)
+
+
+def run(fake: FakeQBittorrent, func) -> float:
+    fake.logins = fake.calls = 0
+    fake.added.clear()
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def main():
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument("--torrents", type=int, default=200)
+    argparser.add_argument("--batch-size", type=int, default=20, help="torrents per batch for the pooled session")
+    args = argparser.parse_args()
+
+    fake = FakeQBittorrent()
+    config = {'host': '127.0.0.1', 'port': str(fake.port), 'username': fake.username, 'password': fake.password,
+              'add paused': 'False'}
+    items = [(PluginOutput(b'd4:infod4:name%d:%see' % (len(str(i)), str(i).encode())), '/downloads')
+             for i in range(args.torrents)]
+
+    def legacy():
+        for plugin_output, path in items:
+            legacy_handle(config, plugin_output, path)
+
+    legacy_time = run(fake, legacy)
+    print(f"login per torrent: {args.torrents / legacy_time:8.1f} torrents/s, "
+          f"{fake.logins} logins, {fake.calls} requests")
+
+    plugins = []
+
+    def pooled():
+        plugins.append(QBittorrent(config))
+        plugin = plugins[0]
+        for i in range(0, len(items), args.batch_size):
+            errors = plugin.handle_batch(items[i:i + args.batch_size])
+            assert not any(errors), errors
+
+    elapsed = run(fake, pooled)
+    plugins[0].close()
+    print(f"pooled, batches of {args.batch_size}: {args.torrents / elapsed:8.1f} torrents/s, "
+          f"{fake.logins} logins, {fake.calls} requests ({legacy_time / elapsed:.1f}x)")
+    fake.close()
+
+
+if __name__ == '__main__':
+    main()
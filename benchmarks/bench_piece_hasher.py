@@ -0,0 +1,95 @@
+"""Measure piece hashing throughput and transient allocations, compared with the previous implementation
+
+Previously each block was read into a new bytes object (file.read), which PieceHasher.update copied again while
+slicing it into pieces. Now FanoutReader reads into one reused buffer (file.readinto) and PieceHasher hashes it
+through a memoryview. Allocations are measured with tracemalloc as the sum of the peak memory allocated while
+reading and hashing each block, scaled to MB per GB hashed.
+
+Usage: python -m benchmarks.bench_piece_hasher [--size-mb 1024] [--piece-kb 2048] [--block-kb 2048]
+"""
+import argparse
+import os
+import time
+import tracemalloc
+
+from BitTornado.Meta.Info import PieceHasher
+
+
+class SlicingPieceHasher(PieceHasher):
+    """The previous implementation, which copies each buffer while splitting it into pieces"""
+    def update(self, data, progress=lambda x: None):
+        tofinish = self.pieceLength - self.done
+        init, remainder = data[:tofinish], data[tofinish:]
+
+        self._hash.update(init)
+        progress(len(init))
+        self.done += len(init)
+
+        if remainder:
+            to_hash = len(remainder)
+            hashes = [self._hashtype(remainder[i:i + self.pieceLength])
+                      for i in range(0, to_hash, self.pieceLength)]
+            progress(to_hash)
+
+            self.done = to_hash % self.pieceLength
+
+            self.pieces.append(self._hash.digest())
+            self._hash = hashes[-1]
+            self.pieces.extend(piece.digest() for piece in hashes[:-1])
+
+        if self.done == self.pieceLength:
+            self.pieces.append(self._hash.digest())
+            self.resetHash()
+
+
+def run(hasher_class, read, piece_length: int, block_size: int, size: int):
+    """Hash size bytes in blocks returned by read(). A short first block misaligns blocks and pieces, so that
+    every block completes a piece"""
+    hasher = hasher_class(piece_length)
+    hasher.update(read()[:4096])
+    blocks = size // block_size
+
+    start = time.perf_counter()
+    for _ in range(blocks):
+        hasher.update(read())
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    allocated = 0
+    for _ in range(blocks):
+        tracemalloc.reset_peak()
+        current = tracemalloc.get_traced_memory()[0]
+        hasher.update(read())
+        allocated += tracemalloc.get_traced_memory()[1] - current
+    tracemalloc.stop()
+
+    return elapsed, allocated, bytes(hasher)
+
+
+def main():
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument("--size-mb", type=int, default=1024)
+    argparser.add_argument("--piece-kb", type=int, default=2048)
+    argparser.add_argument("--block-kb", type=int, default=2048)
+    args = argparser.parse_args()
+
+    size = args.size_mb * 2 ** 20
+    block_size = args.block_kb * 2 ** 10
+    buffer = memoryview(bytearray(os.urandom(block_size)))
+    results = {}
+
+    tests = [
+        ("read + slicing", SlicingPieceHasher, lambda: bytes(buffer)),
+        ("readinto + memoryview", PieceHasher, lambda: buffer),
+    ]
+    for name, hasher_class, read in tests:
+        elapsed, allocated, digests = run(hasher_class, read, args.piece_kb * 2 ** 10, block_size, size)
+        results[name] = digests
+        print(f"{name:22} {size / elapsed / 2 ** 20:8.1f} MB/s "
+              f"{allocated * 2 ** 30 / size / 2 ** 20:10.2f} MB allocated per GB")
+
+    assert len(set(results.values())) == 1, "piece digests differ"
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""Compare torrent hashing read modes: one piece per read, large reads and mmap
+
+A file is created on local disk (the temp dir) and on tmpfs (/dev/shm, where available). Before each run the file
+is dropped from the page cache where the platform allows it, so local runs read from disk.
+
+Usage: python -m benchmarks.bench_read [--size-mb 1024] [--piece-kb 32] [--read-sizes-mb 16 64]
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+from BitTornado.Meta.FanoutReader import FanoutReader, advise
+from BitTornado.Meta.Info import PieceHasher
+
+
+def create_file(root: str, size_mb: int) -> str:
+    path = os.path.join(root, 'bench_read.bin')
+    with open(path, 'wb') as f:
+        for _ in range(size_mb):
+            f.write(os.urandom(2 ** 20))
+        f.flush()
+        os.fsync(f.fileno())
+    return path
+
+
+def run(path: str, piece_length: int, **kwargs):
+    with open(path, 'rb') as f:
+        advise(f.fileno(), 0, os.path.getsize(path), 'POSIX_FADV_DONTNEED')
+
+    hasher = PieceHasher(piece_length)
+    reader = FanoutReader(piece_length, **kwargs)
+    start = time.perf_counter()
+    reader.read(path, os.path.getsize(path), [hasher.update])
+    return time.perf_counter() - start, bytes(hasher)
+
+
+def main():
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument("--size-mb", type=int, default=1024)
+    argparser.add_argument("--piece-kb", type=int, default=32)
+    argparser.add_argument("--read-sizes-mb", type=int, nargs='+', default=[16, 64])
+    args = argparser.parse_args()
+
+    piece_length = args.piece_kb * 2 ** 10
+    modes = [("one piece per read", {})]
+    for read_size in args.read_sizes_mb:
+        modes.append((f"{read_size} MiB reads", {'read_size': read_size * 2 ** 20}))
+        modes.append((f"{read_size} MiB mmap", {'read_size': read_size * 2 ** 20, 'use_mmap': True}))
+    modes.append((f"{args.read_sizes_mb[-1]} MiB reads, drop cache",
+                  {'read_size': args.read_sizes_mb[-1] * 2 ** 20, 'drop_cache': True}))
+
+    roots = [("local", tempfile.gettempdir())]
+    if os.path.isdir('/dev/shm'):
+        roots.append(("tmpfs", '/dev/shm'))
+
+    for location, parent in roots:
+        root = tempfile.mkdtemp(dir=parent)
+        try:
+            path = create_file(root, args.size_mb)
+            expected = None
+            for name, kwargs in modes:
+                elapsed, pieces = run(path, piece_length, **kwargs)
+                expected = expected or pieces
+                assert pieces == expected, "piece digests differ"
+                print(f"{location:6} {name:28} {args.size_mb / elapsed:8.1f} MB/s")
+        finally:
+            shutil.rmtree(root)
+
+
+if __name__ == '__main__':
+    main()
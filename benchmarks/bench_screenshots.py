@@ -0,0 +1,72 @@
+"""Compare screenshot extraction with the previous implementation on the video fixture
+
+Previously each candidate frame was reached with a frame-accurate seek, which decodes from the previous keyframe,
+scored at full resolution and JPEG-encoded, although most candidates are discarded. Now candidates are keyframes
+found by timestamp, scored on a downscaled grayscale copy, only the chosen frames are encoded and several files are
+processed concurrently.
+
+Usage: python -m benchmarks.bench_screenshots [--files 8] [--count 4] [--threads 4]
+"""
+import argparse
+import math
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# noinspection PyPackageRequirements
+import cv2
+
+from tools.screenshots import extract_screenshots
+
+FIXTURE_VIDEO = os.path.join(os.path.dirname(__file__), '..', 'fixtures', 'video', 'video_1',
+                             'example-mp4-file-small.mp4')
+
+
+def legacy_extract_screenshots(path: str, count: int, candidates: int):
+    """The previous implementation"""
+    vidcap = cv2.VideoCapture(path)
+    frame_count = vidcap.get(cv2.CAP_PROP_FRAME_COUNT)
+    frame_count_10 = math.floor(frame_count / 10)
+    interval = math.floor((frame_count - frame_count_10 * 2) / (candidates + 1))
+
+    scored = []
+    for i in range(candidates):
+        vidcap.set(cv2.CAP_PROP_POS_FRAMES, frame_count_10 + i * interval)
+        success, image = vidcap.read()
+        if success:
+            success, buf = cv2.imencode(".jpeg", image)
+            scored.append((i, cv2.Laplacian(image, cv2.CV_64F).var(), buf.tobytes()))
+
+    scored = sorted(scored, key=lambda x: x[1], reverse=True)[0:count]
+    return [image for _, _, image in sorted(scored)]
+
+
+def run(func, paths, threads: int, count: int, candidates: int) -> float:
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        images = list(executor.map(lambda path: func(path, count, candidates), paths))
+    elapsed = time.perf_counter() - start
+    assert all(len(file_images) == count for file_images in images), "screenshots are missing"
+    return elapsed
+
+
+def main():
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument("--files", type=int, default=8, help="number of times the fixture is processed")
+    argparser.add_argument("--count", type=int, default=4, help="screenshots per file")
+    argparser.add_argument("--threads", type=int, default=4)
+    args = argparser.parse_args()
+
+    paths = [os.path.abspath(FIXTURE_VIDEO)] * args.files
+    candidates = max(10, args.count * 2 + 10)
+
+    legacy_time = run(legacy_extract_screenshots, paths, 1, args.count, candidates)
+    print(f"frame-accurate, one file at a time: {args.files / legacy_time:8.1f} files/s")
+    for threads in sorted({1, args.threads}):
+        elapsed = run(extract_screenshots, paths, threads, args.count, candidates)
+        print(f"keyframes, {threads:2} threads:              {args.files / elapsed:8.1f} files/s "
+              f"({legacy_time / elapsed:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
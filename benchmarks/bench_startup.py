@@ -0,0 +1,56 @@
+"""Compare the startup of `smarthash.py --version` with the previous implementation
+
+Previously smarthash.py, functions.py and the plugins imported every dependency at module level, so that even
+--version or --help loaded OpenCV, numpy, libmagic, mutagen, pymediainfo, requests and the torrent client libraries.
+Now they are imported by the functions that use them. The previous startup is reproduced by importing those modules
+before running smarthash.py. Startup is measured as the time spent importing modules, excluding the interpreter's own
+startup, and compared with a budget: about 0.1s is expected with dependencies loaded lazily, against 0.5s before.
+
+Usage: python -m benchmarks.bench_startup [--repeat 5] [--budget 0.25]
+"""
+import argparse
+import importlib.util
+from typing import List
+
+from tests.test_startup import LAZY_MODULES, run_import_times
+
+LEGACY_STARTUP = """
+import runpy
+import sys
+{imports}
+sys.argv = ['smarthash.py', '--version']
+runpy.run_path('smarthash.py', run_name='__main__')
+"""
+
+
+def legacy_args() -> List[str]:
+    """Interpreter arguments that import the lazily loaded modules that are installed, then run smarthash.py"""
+    imports = "\n".join(f"import {name}" for name in LAZY_MODULES if importlib.util.find_spec(name) is not None)
+    return ['-c', LEGACY_STARTUP.format(imports=imports)]
+
+
+def startup_time(args: List[str], repeat: int) -> float:
+    """Best time spent importing top level modules, excluding those imported by the interpreter at startup"""
+    timings = []
+    for _ in range(repeat):
+        times = run_import_times(args)
+        timings.append(sum(seconds for name, depth, seconds in times if depth == 0 and name not in ('site', 'runpy')))
+    return min(timings)
+
+
+def main():
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument("--repeat", type=int, default=5)
+    argparser.add_argument("--budget", type=float, default=0.25, help="seconds the startup imports may take")
+    args = argparser.parse_args()
+
+    legacy_time = startup_time(legacy_args(), args.repeat)
+    elapsed = startup_time(['smarthash.py', '--version'], args.repeat)
+
+    print(f"eager imports: {legacy_time:.3f}s")
+    print(f"lazy imports:  {elapsed:.3f}s ({legacy_time / elapsed:.1f}x), "
+          f"{'within' if elapsed < args.budget else 'over'} the {args.budget:.2f}s budget")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+"""Count filesystem metadata calls and time walking a folder, compared with the previous implementation
+
+Previously the torrent tree checked each entry with isfile/isdir/getsize and listed each directory with listdir,
+then list_files walked the folder again with scandir for metadata extraction, which stat'ed each media file again.
+Now the folder is walked once with scandir into a FileTable shared by both. Calls to os.stat, os.lstat, os.listdir,
+os.scandir and DirEntry.stat are counted, since each of these is a round trip on network filesystems.
+
+Usage: python -m benchmarks.bench_walk [--dirs 50] [--files 100]
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+from collections import Counter
+
+from BitTornado.Meta.BTTree import BTTree
+from BitTornado.Meta.FileTable import FileTable
+from functions import list_files
+
+calls = Counter()
+
+
+class CountingEntries(object):
+    """Wraps a scandir iterator, counting calls to DirEntry.stat"""
+    class Entry(object):
+        def __init__(self, entry):
+            self._entry = entry
+
+        def __getattr__(self, name):
+            return getattr(self._entry, name)
+
+        def stat(self, **kwargs):
+            calls['DirEntry.stat'] += 1
+            return self._entry.stat(**kwargs)
+
+    def __init__(self, entries):
+        self._entries = entries
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self._entries.close()
+
+    def __iter__(self):
+        return (self.Entry(entry) for entry in self._entries)
+
+
+def counting(name, func):
+    def wrapper(*args, **kwargs):
+        calls[name] += 1
+        result = func(*args, **kwargs)
+        return CountingEntries(result) if name == 'scandir' else result
+    return wrapper
+
+
+class LegacyTree(object):
+    """The previous BTTree walk"""
+    def __init__(self, loc, path):
+        self.path = path
+        self.subs = []
+        if os.path.isfile(loc):
+            self.size = os.path.getsize(loc)
+        elif os.path.isdir(loc):
+            for sub in sorted(os.listdir(loc)):
+                if sub[0] != '.':
+                    self.subs.append(LegacyTree(os.path.join(loc, sub), path + [sub]))
+            self.size = sum(sub.size for sub in self.subs)
+        else:
+            raise IOError("File not found")
+
+
+def legacy_list_files(parent, path, file_list):
+    """The previous list_files walk"""
+    joined_path = os.path.join(parent, path) if path else parent
+    for curr in os.scandir(joined_path):
+        if curr.is_file():
+            file_list.append(os.path.relpath(curr.path, parent))
+        elif curr.is_dir():
+            legacy_list_files(parent, curr.path, file_list)
+
+
+def legacy(root):
+    LegacyTree(root, [])
+    file_list = []
+    legacy_list_files(root, None, file_list)
+    for file in file_list:
+        # previously each file was stat'ed again for its MIME type cache key
+        os.stat(os.path.join(root, file))
+
+
+def current(root):
+    table = FileTable(root)
+    BTTree(root, [], table)
+    list_files(root, table)
+
+
+def create_tree(root, dirs, files):
+    for i in range(dirs):
+        path = os.path.join(root, f"disc_{i:03}")
+        os.mkdir(path)
+        for j in range(files):
+            with open(os.path.join(path, f"track_{j:03}.flac"), 'wb') as f:
+                f.write(b"\x00" * 16)
+
+
+def run(func, root):
+    saved = {name: getattr(os, name) for name in ('stat', 'lstat', 'listdir', 'scandir')}
+    calls.clear()
+    for name, original in saved.items():
+        setattr(os, name, counting(name, original))
+    try:
+        func(root)
+    finally:
+        for name, original in saved.items():
+            setattr(os, name, original)
+    counted = dict(calls)
+
+    start = time.perf_counter()
+    func(root)
+    return time.perf_counter() - start, counted
+
+
+def main():
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument("--dirs", type=int, default=50)
+    argparser.add_argument("--files", type=int, default=100)
+    args = argparser.parse_args()
+
+    root = tempfile.mkdtemp()
+    try:
+        create_tree(root, args.dirs, args.files)
+        total = args.dirs * args.files
+        for name, func in (("previous", legacy), ("file table", current)):
+            elapsed, counted = run(func, root)
+            summary = ", ".join(f"{call} {count}" for call, count in sorted(counted.items()))
+            print(f"{name:10} {sum(counted.values()) / total:5.2f} calls per file ({summary}), {elapsed * 1000:7.1f} ms")
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == '__main__':
+    main()
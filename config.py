@@ -4,7 +4,20 @@ blacklist_path_matches = ["proof", "sample"]  # ignore subfolders and filenames
 blacklist_media_extensions = [".sub"]  # do not extract metainfo from these file extensions
 whitelist_video_extensions = [".mkv", ".avi", ".mp4"]  # always extract metainfo from these file extensions
 whitelist_audio_extensions = [".mp3", ".flac"]  # always extract metainfo from these file extensions
+# skip content detection for these extensions. Containers that may hold audio only, such as .mp4, are detected
+mime_type_extensions = {".mkv": "video/x-matroska", ".avi": "video/x-msvideo", ".mp3": "audio/mpeg",
+                        ".flac": "audio/flac"}
 
-requests_retry_interval = 5  # seconds
+requests_retry_interval = 5  # seconds, doubled after each failed attempt up to requests_retry_max_interval
+requests_retry_max_interval = 120  # seconds
+requests_max_connections = 4  # concurrent requests per host, over kept-alive connections
+watch_retry_max_interval = 3600  # seconds, longest wait before a failed watch mode item is retried
+
+hash_cache_max_size = 256 * 2**20  # bytes, least recently used entries are evicted beyond this
+imdb_cache_ttl = 30 * 24 * 3600  # seconds IMDb lookups are reused for, 0 to always look IDs up
+imdb_cache_negative_ttl = 24 * 3600  # seconds IDs that IMDb reported as not found are remembered for
+mediainfo_threads = 4  # files parsed concurrently by libmediainfo
+screenshot_threads = 4  # video files screenshotted concurrently
+job_queue_stages = {'analyse': 1, 'submit': 1}  # jobs in each stage at once, across all smarthash invocations
 
 config_filename = "smarthash.ini"
@@ -7,23 +7,23 @@ import sys
 import time
 from collections import OrderedDict
 from enum import Enum
+from functools import lru_cache
 from pathlib import Path
-from typing import List, Tuple, Dict, Optional
-
-import bitstring
-import imdb  # noqa
-import magic
-import mutagen
-import requests
-from imdb import IMDbDataAccessError
-from mutagen.flac import VCFLACDict  # noqa
-from mutagen.id3 import ID3
-from pymediainfo import MediaInfo
-from requests import Response
+from typing import List, Tuple, Dict, Optional, TYPE_CHECKING
+
 from termcolor import cprint
 
 from config import whitelist_video_extensions, blacklist_media_extensions, whitelist_audio_extensions, \
-    requests_retry_interval
+    requests_retry_interval, requests_retry_max_interval, requests_max_connections, mime_type_extensions
+from BitTornado.Meta.FileTable import FileTable, FileEntry
+from tools.http_pool import HttpPool
+from tools.imdb_cache import ImdbCache
+from tools.mediainfo_reader import MediaInfoReader
+
+# imdb, magic, mutagen and requests are imported by the functions that use them, so that they are only loaded by
+# runs that need them
+if TYPE_CHECKING:
+    from requests import Response
 
 
 class SmartHashError(Exception):
@@ -33,33 +33,46 @@ class SmartHashError(Exception):
 class ValidationError(SmartHashError):
     """Raised by plugins when incomplete or invalid files or metadata is passed in"""
     def __init__(self, errors: List[str]):
+        super().__init__(errors)
         self.errors = errors
 
 
 class ConflictError(SmartHashError):
     """Raised by plugins when the operation was skipped (e.g. during a duplicate upload attempt)"""
     def __init__(self, message: str, params: Dict[str, str] = None):
+        super().__init__(message, params)
         self.message = message
         self.params = params
 
 
 class PluginError(SmartHashError):
     def __init__(self, err: str):
+        super().__init__(err)
         self.error = err
 
 
 class ServerError(SmartHashError):
     def __init__(self, err: str):
+        super().__init__(err)
         self.error = err
 
 
 class UpdateError(SmartHashError):
     def __init__(self, err: str):
+        super().__init__(err)
         self.error = err
 
 
 class MagicError(SmartHashError):
     def __init__(self, err: str):
+        super().__init__(err)
+        self.error = err
+
+
+class AnalysisError(SmartHashError):
+    """Raised when a folder could not be analysed by a bulk mode worker process"""
+    def __init__(self, err: str):
+        super().__init__(err)
         self.error = err
 
 
@@ -68,14 +81,12 @@ class BulkMode(Enum):
     MUSIC = 2
 
 
-class Screenshot:
-    def __init__(self, index: int, variance: float, image: str):
-        self.index = index
-        self.variance = variance
-        self.image = image
+folder_default = 'Select a folder to hash'
 
+# User-Agent sent through the requests library, see import_requests
+user_agent = None
 
-folder_default = 'Select a folder to hash'
+media_info_reader = MediaInfoReader()
 
 
 def error(msg):
@@ -95,120 +106,174 @@ def error(msg):
     sys.exit(1)
 
 
-def requests_retriable_post(url: str, **kwargs) -> Response:
-    while True:
-        try:
-            response = requests.post(url, **kwargs)
-            break
-        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
-            cprint("Connection error, retrying...", 'red')
-            time.sleep(requests_retry_interval)
-        except requests.exceptions.RequestException as e:
-            if e.response.status_code in [504]:
-                cprint(f"HTTP error {e.response.status_code}, retrying...", 'red')
-                time.sleep(requests_retry_interval)
-            raise e
-
-    return response
-
-
-def requests_retriable_put(url: str, **kwargs) -> Response:
-    while True:
-        try:
-            response = requests.put(url, **kwargs)
-            break
-        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
-            cprint("Connection error, retrying...", 'red')
-            time.sleep(requests_retry_interval)
-        except requests.exceptions.RequestException as e:
-            if e.response.status_code in [504]:
-                cprint(f"HTTP error {e.response.status_code}, retrying...", 'red')
-                time.sleep(requests_retry_interval)
-            raise e
+def import_requests():
+    """Import requests on first use, applying user_agent"""
+    import requests.utils
+    if user_agent:
+        requests.utils.default_user_agent = lambda: user_agent
+    return requests
 
-    return response
 
+# requests are sent through one session per host, reusing connections
+http_pool = HttpPool(requests_max_connections, requests_retry_interval, requests_retry_max_interval, import_requests)
 
-def requests_retriable_get(url: str, **kwargs) -> Response:
-    new_kwargs = kwargs
-    max_attempts = kwargs['max_attempts'] if 'max_attempts' in kwargs else 0
-    new_kwargs.pop('max_attempts', None)
-    attempts = 0
 
-    while True:
-        attempts += 1
+def requests_retriable_post(url: str, **kwargs) -> "Response":
+    return http_pool.request('POST', url, **kwargs)
 
-        try:
-            response = requests.get(url, **new_kwargs)
-            break
-        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
-            if attempts == max_attempts:
-                raise PluginError('Max connection attempts exceeded')
 
-            cprint("Connection error, retrying...", 'red')
-            time.sleep(requests_retry_interval)
-        except requests.exceptions.RequestException as e:
-            if e.response.status_code in [504]:
-                cprint(f"HTTP error {e.response.status_code}, retrying...", 'red')
-                time.sleep(requests_retry_interval)
-            raise e
+def requests_retriable_put(url: str, **kwargs) -> "Response":
+    return http_pool.request('PUT', url, **kwargs)
+
+
+def requests_retriable_get(url: str, max_attempts: int = 0, **kwargs) -> "Response":
+    requests = import_requests()
+    try:
+        return http_pool.request('GET', url, max_attempts=max_attempts, **kwargs)
+    except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+        raise PluginError('Max connection attempts exceeded')
+
 
-    return response
+def list_files(parent_dir, table: FileTable = None) -> List[str]:
+    """List the files below a folder, sorted, as paths starting with the folder's name"""
+    return list(list_file_entries(parent_dir, table))
 
 
-def list_files(parent_dir):
-    file_list = []
-    list_files_inner(parent_dir, None, file_list)
+def list_file_entries(parent_dir, table: FileTable = None) -> Dict[str, FileEntry]:
+    """Map the files below a folder, sorted, from paths starting with the folder's name to their FileEntry"""
+    if table is None:
+        table = FileTable(parent_dir)
 
-    file_list = [os.path.join(os.path.split(parent_dir)[-1], f) for f in file_list]
+    root_name = os.path.split(parent_dir)[-1]
+    return OrderedDict((os.path.join(root_name, *entry.path), entry) for entry in table.iter_files())
 
-    return file_list
 
+MIME_HEADER_SIZE = 8192  # bytes read to detect most file types
+MIME_FULL_SIZE = 1048576  # bytes read when the header alone is inconclusive
 
-def list_files_inner(parent, path, file_list):
-    joined_path = os.path.join(parent, path) if path else parent
-    for curr in os.scandir(joined_path):
-        if curr.is_file():
-            file_list.append(os.path.relpath(curr.path, parent))
-        elif curr.is_dir():
-            list_files_inner(parent, curr.path, file_list)
 
+def get_mime_type(path, entry: FileEntry = None):
+    ext = os.path.splitext(path)[1].lower()
+    if ext in mime_type_extensions:
+        return mime_type_extensions[ext]
 
-def get_mime_type(path):
     try:
-        with open(path, 'rb') as infile:
-            return magic.from_buffer(infile.read(1048576), mime=True)
+        if entry is None:
+            stat = os.stat(path)
+            entry = FileEntry(None, stat.st_size, stat.st_mtime_ns, stat.st_ino)
+        return get_mime_type_cached(os.path.abspath(path), entry.size, entry.mtime, entry.inode)
     except Exception as e:
         raise MagicError("Metadata error, check your 'magic' installation: {0}".format(str(e)))
 
 
+@lru_cache(maxsize=65536)
+def get_mime_type_cached(path: str, size: int, mtime: int, inode: int) -> str:
+    """Detect a file's MIME type from its contents, memoized by its stat signature"""
+    import magic
+
+    with open(path, 'rb') as infile:
+        header = infile.read(MIME_HEADER_SIZE)
+        mime_type = magic.from_buffer(header, mime=True)
+
+        # e.g. large ID3 tags hide mp3 audio, and truncated JSON or XML is reported as plain text
+        if size > MIME_HEADER_SIZE and (mime_type == 'application/octet-stream' or mime_type.startswith('text/')):
+            mime_type = magic.from_buffer(header + infile.read(MIME_FULL_SIZE - MIME_HEADER_SIZE), mime=True)
+
+    return mime_type
+
+
+MP3_FRAME_SEARCH_LIMIT = 64 * 1024  # bytes after the ID3v2 tag searched for the first MPEG frame
+MP3_BITRATES = {  # kbit/s by MPEG version 1 or 2 (incl. 2.5), then layer
+    1: {1: [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+        2: [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+        3: [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320]},
+    2: {1: [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+        2: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+        3: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160]},
+}
+MP3_SAMPLE_RATES = {3: [44100, 48000, 32000], 2: [22050, 24000, 16000], 0: [11025, 12000, 8000]}
+
+
+def mp3_frame_length(header: bytes) -> int:
+    """
+    Parse a 4 byte MPEG audio frame header
+    :return: the length of the frame in bytes, or 0 if the header is invalid or uses a free format bitrate
+    """
+    if header[0] != 0xFF or header[1] & 0xE0 != 0xE0:
+        return 0
+
+    version_bits = (header[1] >> 3) & 3
+    layer = 4 - ((header[1] >> 1) & 3)
+    bitrate_index = header[2] >> 4
+    sample_rate_index = (header[2] >> 2) & 3
+    padding = (header[2] >> 1) & 1
+    if version_bits == 1 or layer == 4 or bitrate_index in [0, 15] or sample_rate_index == 3:
+        return 0
+
+    version = 1 if version_bits == 3 else 2
+    bitrate = MP3_BITRATES[version][layer][bitrate_index] * 1000
+    sample_rate = MP3_SAMPLE_RATES[version_bits][sample_rate_index]
+
+    if layer == 1:
+        return (12 * bitrate // sample_rate + padding) * 4
+    if layer == 3 and version == 2:
+        return 72 * bitrate // sample_rate + padding
+    return 144 * bitrate // sample_rate + padding
+
+
+def mp3_first_frame(path: str) -> bytes:
+    """Read the first MPEG audio frame following any ID3v2 tag. Returns an empty string if none is found"""
+    with open(path, 'rb') as f:
+        header = f.read(10)
+        if len(header) == 10 and header[:3] == b"ID3":
+            tag_size = (header[6] & 0x7F) << 21 | (header[7] & 0x7F) << 14 | (header[8] & 0x7F) << 7 | header[9] & 0x7F
+            f.seek(10 + tag_size + (10 if header[5] & 0x10 else 0))
+        else:
+            f.seek(0)
+        data = f.read(MP3_FRAME_SEARCH_LIMIT)
+
+    pos = data.find(b"\xFF")
+    while pos != -1:
+        length = mp3_frame_length(data[pos:pos + 4])
+        # require the next frame to follow on, unless this one runs past the end of the data
+        if length and (pos + length + 4 > len(data) or mp3_frame_length(data[pos + length:pos + length + 4])):
+            return data[pos:pos + length]
+        pos = data.find(b"\xFF", pos + 1)
+
+    return b""
+
+
 def mp3_info(path):
 
     results = {}
 
-    stream = bitstring.ConstBitStream(filename=path)
+    # Xing, Info and VBRI headers are stored in place of audio data in the first frame
+    frame = mp3_first_frame(path)
 
     # look for Xing
-    xing_header = stream.find("0x58696E67", bytealigned=True)
+    xing_header = frame.find(b"Xing")
 
-    if xing_header:
+    if xing_header != -1:
         results['xing_header'] = "XING"
         results['method'] = "VBR"
-        stream.bytepos += 4
-        xing_flags = stream.read("uint:32")
+        pos = xing_header + 4
+        xing_flags = int.from_bytes(frame[pos:pos + 4], 'big')
+        pos += 4
         if xing_flags & 1:					# skip frames field
-            stream.bytepos += 4
+            pos += 4
         if xing_flags & 2:					# skip bytes field
-            stream.bytepos += 4
+            pos += 4
         if xing_flags & 4:					# skip TOC
-            stream.bytepos += 100
+            pos += 100
         if xing_flags & 8:
-            xing_vbr_quality = stream.read("uint:32")
+            xing_vbr_quality = int.from_bytes(frame[pos:pos + 4], 'big')
+            pos += 4
             results['xing_vbr_v'] = 10 - math.ceil(xing_vbr_quality/10)
             results['xing_vbr_q'] = 10 - xing_vbr_quality % 10
 
         # LAME versions < 3.90 do not contain encoder info, and will not be picked up by this. Treat as VBR
-        lame_version = stream.read("bytes:9")
+        lame_version = frame[pos:pos + 9]
+        pos += 9
         if lame_version[0:4] == b"LAME":
             results['xing_header'] = "LAME"
 
@@ -216,13 +281,13 @@ def mp3_info(path):
             try:
                 # allow for broken/hacked LAME versions, treat as regular VBR
                 results['lame_version'] = lame_version[4:].decode().strip()
-                results['lame_tag_revision'] = stream.read("uint:4")
-                results['lame_vbr_method'] = stream.read("uint:4")
-                stream.bytepos += 9
-                results['lame_nspsytune'] = stream.read("bool")
-                results['lame_nssafejoint'] = stream.read("bool")
-                results['lame_nogap_next'] = stream.read("bool")
-                results['lame_nogap_previous'] = stream.read("bool")
+                results['lame_tag_revision'] = frame[pos] >> 4
+                results['lame_vbr_method'] = frame[pos] & 0xF
+                pos += 10
+                results['lame_nspsytune'] = bool(frame[pos] & 0x80)
+                results['lame_nssafejoint'] = bool(frame[pos] & 0x40)
+                results['lame_nogap_next'] = bool(frame[pos] & 0x20)
+                results['lame_nogap_previous'] = bool(frame[pos] & 0x10)
 
                 if results['lame_version'][-1] == ".":
                     results['lame_version'] = results['lame_version'][:-1]
@@ -231,14 +296,14 @@ def mp3_info(path):
 
         return results
 
-    info_header = stream.find("0x496E666F", bytealigned=True)
-    if info_header:
+    info_header = frame.find(b"Info")
+    if info_header != -1:
         results['xing_header'] = "INFO"
         results['method'] = "CBR"
         return results
 
-    vbri_header = stream.find("0x56425249", bytealigned=True)
-    if vbri_header:
+    vbri_header = frame.find(b"VBRI")
+    if vbri_header != -1:
         results['xing_header'] = "VBRI"
         results['method'] = "VBR"
         return results
@@ -263,24 +328,64 @@ def imdb_url_to_id(imdb_url: str) -> str:
         return imdb_id_match[0]
 
 
-def verify_imdb(imdb_id: str) -> None:
-    # imdb._logging.setLevel("error")
-    logging.info('IMDb querying...'),
-    imdb_site = imdb.Cinemagoer()
+@lru_cache(maxsize=None)
+def cinemagoer():
+    """The Cinemagoer instance shared by every IMDb lookup in this process"""
+    import imdb
+    return imdb.Cinemagoer()
 
-    try:
-        imdb_movie = imdb_site.get_movie(imdb_id)
-    except IMDbDataAccessError:
-        logging.error("Invalid IMDb ID: {0}".format(imdb_id))
+
+@lru_cache(maxsize=None)
+def imdb_lookup_cache() -> ImdbCache:
+    return ImdbCache()
+
+
+def verify_imdb(imdb_id: str) -> str:
+    """
+    Check that an IMDb ID exists, reusing the result of a recent lookup of the same ID, see ImdbCache
+    :return: the canonical ID, which differs from imdb_id if IMDb redirects it
+    :raises ValidationError if the ID is invalid
+    """
+    cache = imdb_lookup_cache()
+    hit, result = cache.get(imdb_id)
+
+    if not hit:
+        from imdb import IMDbDataAccessError
+
+        # imdb._logging.setLevel("error")
+        logging.info('IMDb querying...'),
+        try:
+            imdb_movie = cinemagoer().get_movie(imdb_id)
+        except IMDbDataAccessError as e:
+            if ImdbCache.is_not_found(e):
+                cache.put(imdb_id, None, None)
+            logging.error("Invalid IMDb ID: {0}".format(imdb_id))
+            raise ValidationError(["Invalid IMDb ID: {0}".format(imdb_id)])
+        result = (imdb_movie.data['imdbID'], str(imdb_movie))
+        cache.put(imdb_id, *result)
+
+    elif result is None:
+        logging.error("Invalid IMDb ID: {0} (cached)".format(imdb_id))
         raise ValidationError(["Invalid IMDb ID: {0}".format(imdb_id)])
-    logging.info("IMDb verified: \"{0}\"".format(imdb_movie))
 
-    if imdb_id != imdb_movie.data['imdbID']:
-        logging.info(f"IMDb ID redirect [{imdb_id} -> {imdb_movie.data['imdbID']}]")
+    canonical_id, title = result
+    logging.info("IMDb verified: \"{0}\"".format(title))
+
+    if imdb_id != canonical_id:
+        logging.info(f"IMDb ID redirect [{imdb_id} -> {canonical_id}]")
+    return canonical_id
 
 
-def extract_metadata(path: str) -> Tuple[int, int, Dict]:
-    file_list = list_files(path)
+def extract_metadata(path: str, cache=None, table: FileTable = None) -> Tuple[int, int, Dict]:
+    """Extract metadata from each media file in a folder. cache optionally provides a HashCache, allowing unchanged
+    files to be skipped. table optionally provides the FileTable of path, if it has already been walked, in which case
+    files dropped by its filter are skipped"""
+    import mutagen
+    from mutagen.flac import VCFLACDict
+    from mutagen.id3 import ID3
+
+    file_entries = list_file_entries(path, table)
+    file_list = list(file_entries)
 
     parent_dir = os.path.abspath(os.path.join(path, os.pardir)) + os.path.sep
     total_duration = 0
@@ -288,7 +393,9 @@ def extract_metadata(path: str) -> Tuple[int, int, Dict]:
     num_video_files = 0
     total_media_size = 0
 
-    # extract metadata into a path -> json-metadata map
+    # find the media files, so that they can be passed to MediaInfo in a single batch
+    cached_info = {}
+    media_files = OrderedDict()
     for file in file_list:
         ext = os.path.splitext(file)[1].lower()
         # ignore extensions blacklist
@@ -296,19 +403,50 @@ def extract_metadata(path: str) -> Tuple[int, int, Dict]:
             continue
 
         file_path = os.path.join(parent_dir, file)
-        mime_type = get_mime_type(file_path)
+
+        if cache is not None:
+            hit, smarthash_info = cache.get_metadata(file_path, parent_dir, file_entries[file])
+            if hit:
+                if smarthash_info is not None:
+                    cached_info[file] = smarthash_info
+                continue
+
+        mime_type = get_mime_type(file_path, file_entries[file])
         mime_prefix = mime_type.split("/")[0]
 
         if mime_prefix in ["audio", "video"] or ext in whitelist_video_extensions \
                 or ext in whitelist_audio_extensions:
+            media_files[file] = mime_type
+        elif cache is not None:
+            cache.put_metadata(file_path, parent_dir, None, file_entries[file])
+
+    media_infos = dict(zip(media_files, media_info_reader.parse_many(
+        [os.path.join(parent_dir, file) for file in media_files])))
+
+    # extract metadata into a path -> json-metadata map
+    for file in file_list:
+        ext = os.path.splitext(file)[1].lower()
+        file_path = os.path.join(parent_dir, file)
+
+        if file in cached_info:
+            smarthash_info = cached_info[file]
+            total_media_size += file_entries[file].size
+            total_duration += sum(track['duration'] for track in smarthash_info['mediainfo']
+                                  if track['track_type'] == "General" and 'duration' in track)
+            smarthash_path_info[file] = smarthash_info
+
+        elif file in media_files:
+            mime_type = media_files[file]
+            mime_prefix = mime_type.split("/")[0]
+
             # TODO split calculation into audio and video
-            total_media_size += os.path.getsize(file_path)
+            total_media_size += file_entries[file].size
             smarthash_info = OrderedDict()
             smarthash_info['mediainfo'] = []
             if mime_type:
                 smarthash_info['mime_type'] = mime_type
 
-            media_info = MediaInfo.parse(file_path)
+            media_info = media_infos[file]
             for track in media_info.tracks:
                 track_map = track.to_data()
 
@@ -359,6 +497,8 @@ def extract_metadata(path: str) -> Tuple[int, int, Dict]:
                 num_video_files += 1
 
             smarthash_path_info[file] = smarthash_info
+            if cache is not None:
+                cache.put_metadata(file_path, parent_dir, smarthash_info, file_entries[file])
 
     return total_media_size, total_duration, smarthash_path_info
 
@@ -1,3 +1,4 @@
+import argparse
 import importlib
 import os
 import threading
@@ -10,6 +11,7 @@ from termcolor import cprint
 from baseplugin import ParamType, BasePlugin, HookCommandType, HookCommand, UIMode
 from functions import PluginError, ServerError, ValidationError, folder_default
 from smarthash import smarthash_version, SmartHash, MagicError
+from tools.job_queue import JobQueue
 
 
 def collapsible(layout: List[List], key: str, visible: bool = True) -> sg.pin:
@@ -17,6 +19,10 @@ def collapsible(layout: List[List], key: str, visible: bool = True) -> sg.pin:
 
 
 class Args(object):
+    def __init__(self, defaults: argparse.Namespace = None):
+        if defaults is not None:
+            self.__dict__.update(vars(defaults))
+
     def __getitem__(self, key: str):
         return getattr(self, key)
 
@@ -32,6 +38,7 @@ class SmartHashGui(SmartHash):
     MAIN_WIDTH = 80
 
     def __init__(self):
+        self.init_state()
         self.load_config()
 
         if 'Smarthash GUI' not in self.config:
@@ -39,14 +46,13 @@ class SmartHashGui(SmartHash):
 
         plugin_filenames = SmartHash.plugin_find()
         self.window = None
-        self.plugins = {}
         self.curr_plugin = None
         self.folder_browsers = []
         self.curr_progress = 0
         self.is_hashing = False
         self.hooks = {}
 
-        self.args = None
+        self.job_queue = JobQueue()
 
         for x in plugin_filenames:
             self.plugins[x] = importlib.import_module("Plugins." + x).SmarthashPlugin()
@@ -66,6 +72,7 @@ class SmartHashGui(SmartHash):
                     self.hooks[hook.element_name] = []
                 self.hooks[hook.element_name].append(hook)
 
+        self.apply_user_agent()
         self.early_return = False
         self.init_errors = []
 
@@ -293,8 +300,9 @@ class SmartHashGui(SmartHash):
 
             if event == "create_button":
 
-                self.args = Args()
-                self.args['path'] = values['path_to_hash']
+                # options without a GUI control keep their command line defaults
+                self.args = Args(SmartHash.base_argparser(SmartHash.plugin_find()).parse_args(
+                    ['--', values['path_to_hash']]))
                 self.args['skip_video_rehash'] = values['skip_video_rehash']
 
                 for param in self.curr_plugin.parameters:
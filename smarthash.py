@@ -1,18 +1,16 @@
+import collections
 import importlib
-
-# noinspection PyPackageRequirements
-import cv2
-import requests.utils
+import queue
+import threading
+from contextlib import contextmanager
+from typing import Callable, Deque
+from concurrent.futures import Future, ThreadPoolExecutor, wait
 
 from OutputPlugins.base_output import OutputPlugin
-from OutputPlugins.deluge import Deluge
-from OutputPlugins.qbittorrent import QBittorrent
-from OutputPlugins.transmission import Transmission
-from OutputPlugins.utorrent import UTorrent
-from libprick import Pricker, PrickError
 from release_dir_scanner import get_release_dirs
 
 from BitTornado.Application.makemetafile import make_meta_file
+from BitTornado.Meta.FileFilter import FileFilter
 
 import argparse
 import colorama
@@ -20,15 +18,31 @@ import colorama
 import configparser
 
 import MIFormat
+import functions
 from functions import *
 from config import *
 from baseplugin import BasePlugin, PluginOutput
 from pluginmixin import UIMode, ParamType
-from tools.process_lock import ProcessLock
+from tools import info_codec
+from tools.folder_watcher import FolderWatcher
+from tools.handoff_queue import HandoffQueue
+from tools.hash_cache import HashCache
+from tools.job_queue import JobQueue
+from tools.run_journal import ItemState, RunJournal
 from tools.skip_cache import SkipCache
+from tools.stage_timer import StageTimer
 
 smarthash_version = "3.0.0"
-requests.utils.default_user_agent = lambda: f"SmartHash/{smarthash_version}"
+
+# output plugins, their class and config section, by the value of the 'output to' setting. Heavy dependencies such as
+# the output plugins' client libraries, the pricker and the screenshot decoder are imported by the stages that use
+# them, so that e.g. --version or a save-only run does not load them
+output_plugins = {
+    'deluge': ('OutputPlugins.deluge', 'Deluge', 'deluge'),
+    'qbittorrent': ('OutputPlugins.qbittorrent', 'QBittorrent', 'qBittorrent'),
+    'transmission': ('OutputPlugins.transmission', 'Transmission', 'Transmission'),
+    'utorrent': ('OutputPlugins.utorrent', 'UTorrent', 'uTorrent'),
+}
 
 
 class PluginUIInterface:
@@ -40,28 +54,39 @@ class PluginUIInterface:
     def progress_callback(self, message: str, incremental: bool = True) -> None:
         self.smarthash_obj.plugin_progress_callback(f"[{self.plugin.get_title()}] {message}", incremental)
 
+    @staticmethod
+    def request(method: str, url: str, **kwargs) -> "Response":
+        """Send a request through the shared session for the url's host, see functions.http_pool"""
+        return functions.http_pool.request(method, url, **kwargs)
+
 
 class SmartHash:
 
     def __init__(self):
+        self.init_state()
+        self.init()
+
+    def init_state(self) -> None:
+        """Set the initial attributes, before arguments are parsed. Also used by subclasses that do not parse them"""
         self.early_return = False
         self.total_media_size = None
         self.config = None
         self.args = None
         self.plugins = {}
         self.output_plugin = None
-        self.skip_cache = SkipCache()
-        self.lock = ProcessLock()
-        self.init()
+        self.skip_cache = None
+        self.hash_cache = None
+        self.job_queue = None
+        self.journal = None
+        self.output_batch = []
+        self.handoff = None
+        self.handoff_job_queue = None
+        self.failed = []
 
-    def init(self):
-        self.load_config()
-        colorama.init()
-
-        plugin_filenames = SmartHash.plugin_find()
-
-        # basic parameters
-        argparser = argparse.ArgumentParser()
+    @staticmethod
+    def base_argparser(plugin_filenames: List[str]) -> argparse.ArgumentParser:
+        """The basic parameters, without those of the plugins. Help is added once they are registered"""
+        argparser = argparse.ArgumentParser(add_help=False)
         argparser.add_argument("path")
         argparser.add_argument('--version', action='version', version="SmartHash {0}".format(smarthash_version))
         argparser.add_argument("--plugin", help="specify a manual output script: " + ", ".join(plugin_filenames),
@@ -71,13 +96,76 @@ class SmartHash:
         argparser.add_argument("--disable-skip-cache", action="store_true",
                                help="Disables caching of content rejected by a plugin")
         argparser.add_argument("--bulk", action='store_true', help="process every item in the path individually")
-
+        argparser.add_argument("--hash-threads", type=int, default=1,
+                               help="Number of threads used to hash torrent pieces")
+        argparser.add_argument("--read-size", type=int, default=0,
+                               help="MiB read per call while hashing, e.g. 16-64 for network filesystems "
+                                    "(default: one piece)")
+        argparser.add_argument("--read-mmap", action="store_true", help="Read files through mmap while hashing")
+        argparser.add_argument("--drop-page-cache", action="store_true",
+                               help="Drop hashed data from the page cache, so that hashing large sets does not evict "
+                                    "other data. Files are read again from disk for audio/video rehashing")
+        argparser.add_argument("--extra-digests", nargs='+', choices=['crc32', 'md5', 'sha1', 'sha256'], default=[],
+                               help="Per-file checksums to compute while hashing, e.g. crc32 for an SFV")
+        argparser.add_argument("--info-encoding", choices=['json', 'compact', 'compact-zlib'], default='json',
+                               help="Encoding of each media file's metadata in the torrent. compact keeps the main "
+                                    "MediaInfo fields and stores repeated keys and values once per torrent, see "
+                                    "tools/info_codec.py for the decoder")
+        argparser.add_argument("--stage-timings", action="store_true",
+                               help="Print the time spent in each processing stage")
+        argparser.add_argument("--no-hash-cache", action="store_true",
+                               help="Do not reuse piece hashes and metadata from previous runs")
+
+        argparser.add_argument("--jobs", type=int, default=1,
+                               help="Number of bulk mode items to hash in parallel, using separate processes. Each "
+                                    "one takes the analyse stage, so at most the analyse concurrency of "
+                                    "config.job_queue_stages run at once, across all smarthash invocations")
+        argparser.add_argument("--resume", action="store_true",
+                               help="Resume the previous bulk mode run of the same path and plugin, continuing each "
+                                    "item from its last completed stage")
+        argparser.add_argument("--output-batch-size", type=int, default=1,
+                               help="Number of bulk mode torrents handed to the output plugin together, added in one "
+                                    "call where the client supports it")
+        argparser.add_argument("--handoff-queue", type=int, default=0,
+                               help="Number of analysed bulk mode items that may wait to be uploaded and handed to the "
+                                    "output plugin in the background while the next item is analysed (default: 0, "
+                                    "one item at a time)")
         argparser.add_argument("--bulk-sleep-interval", type=int, choices=range(1, 60), default=0,
                                help="Sleep interval (in minutes) between successful bulk mode items")
+        argparser.add_argument("--priority", type=int, default=0,
+                               help="Queue priority relative to other smarthash invocations, higher is sooner")
+        argparser.add_argument("--watch", action="store_true",
+                               help="Keep running, processing each new item in the path as in bulk mode once its "
+                                    "files have stopped changing")
+        argparser.add_argument("--watch-settle-time", type=int, default=60,
+                               help="Seconds an item's files must stay unchanged before it is processed in watch mode")
+        argparser.add_argument("--watch-interval", type=int, default=5,
+                               help="Seconds between checks for new and settled items in watch mode")
+        argparser.add_argument("--watch-retry-interval", type=int, default=300,
+                               help="Seconds before an item that failed in watch mode is retried, doubled after each "
+                                    "failure")
+        return argparser
+
+    def init(self):
+        self.load_config()
+        colorama.init()
+
+        plugin_filenames = SmartHash.plugin_find()
+
+        argparser = SmartHash.base_argparser(plugin_filenames)
+
+        # only the selected plugin is imported, unless help is requested. --version exits here
+        if {'-h', '--help'} & set(sys.argv[1:]):
+            selected_plugins = plugin_filenames
+        else:
+            selected_plugins = [argparser.parse_known_args()[0].plugin]
+            if selected_plugins[0] not in plugin_filenames:
+                logging.error("Invalid plugin: {0}".format(selected_plugins[0]))
+                sys.exit(1)
 
         unique_params = {}
 
-        for x in plugin_filenames:
+        for x in selected_plugins:
             try:
                 self.plugins[x] = importlib.import_module("Plugins." + x).SmarthashPlugin()
 
@@ -120,14 +208,24 @@ class SmartHash:
 
             argparser.add_argument(arg_name, **kwargs)
 
+        argparser.add_argument('-h', '--help', action='help', help="show this help message and exit")
         self.args = argparser.parse_args()
+        if self.args.resume and not self.args.bulk:
+            argparser.error("--resume requires --bulk")
 
         if self.args.plugin not in self.plugins:
             logging.error("Invalid plugin: {0}".format(self.args.plugin))
             sys.exit(1)
 
-        if self.args.disable_skip_cache:
-            self.skip_cache.disable()
+        self.apply_user_agent()
+
+        self.job_queue = JobQueue(self.args.priority)
+
+        if not self.args.disable_skip_cache:
+            self.skip_cache = SkipCache()
+
+        if not self.args.no_hash_cache:
+            self.hash_cache = HashCache()
 
         # update the selected plugin
         if self.args.plugin:
@@ -140,20 +238,26 @@ class SmartHash:
         try:
             if output_plugin in ['', 'none']:
                 self.output_plugin = OutputPlugin()
-            elif output_plugin == 'deluge':
-                self.output_plugin = Deluge(self.config['deluge'])
-            elif output_plugin == 'qbittorrent':
-                self.output_plugin = QBittorrent(self.config['qBittorrent'])
-            elif output_plugin == 'transmission':
-                self.output_plugin = Transmission(self.config['Transmission'])
-            elif output_plugin == 'utorrent':
-                self.output_plugin = UTorrent(self.config['uTorrent'])
+            elif output_plugin in output_plugins:
+                module_name, class_name, section = output_plugins[output_plugin]
+                self.output_plugin = getattr(importlib.import_module(module_name), class_name)(self.config[section])
             else:
                 raise PluginError(f"invalid option '{output_plugin}'")
         except PluginError as e:
             cprint(f"Output plugin '{output_plugin}' failed: {e.error}", 'red')
             sys.exit(1)
 
+        # the output plugin may have imported requests
+        self.apply_user_agent()
+
+    @staticmethod
+    def apply_user_agent() -> None:
+        """Send the SmartHash User-Agent through requests, if a plugin has imported it. Otherwise it is applied by
+        import_requests, if requests is imported later"""
+        functions.user_agent = f"SmartHash/{smarthash_version}"
+        if 'requests' in sys.modules:
+            import_requests()
+
     def load_config(self) -> None:
         self.config = configparser.ConfigParser()
         self.config.read(os.path.join(os.path.dirname(os.path.abspath(__file__)), config_filename))
@@ -189,7 +293,7 @@ class SmartHash:
                 new_plugin_src = plugin.get_update(smarthash_version)
                 self.clear_error()
                 break
-            except (requests.exceptions.ConnectionError, ServerError):
+            except (import_requests().exceptions.ConnectionError, ServerError):
                 self.init_error("Connection error: plugin could not check for updates. retrying...")
                 if self.early_return:
                     return
@@ -237,63 +341,308 @@ class SmartHash:
             cprint("Path does not exist, or is not a directory", 'red')
             sys.exit(1)
 
-        if self.args.bulk:
-            bulk_mode = self.plugins[self.args.plugin].get_bulk_mode(self.args)
-            if bulk_mode == BulkMode.STANDARD:
-                for item in sorted(os.listdir(path)):
-                    curr = os.path.join(path, item)
-                    if os.path.isdir(curr):
-                        self.process_folder_wrapper(curr)
+        if self.args.watch:
+            self.process_watch(path)
 
-            elif bulk_mode == BulkMode.MUSIC:
-                for release_dir in get_release_dirs(path):
-                    self.process_folder_wrapper(release_dir)
-
-            else:
-                raise PluginError('Selected plugin does not handle bulk mode correctly')
+        elif self.args.bulk:
+            self.process_bulk(path)
 
         else:
             self.process_folder_wrapper(path)
 
-        self.skip_cache.save()
+        self.flush_output()
+        self.output_plugin.close()
+
+        http_summary = functions.http_pool.summary()
+        if http_summary:
+            logging.info(f"HTTP requests: {http_summary}")
+            if self.args.stage_timings:
+                print(f"HTTP requests: {http_summary}")
+        functions.http_pool.close()
+        functions.media_info_reader.close()
+
+        if self.skip_cache:
+            self.skip_cache.save()
+        if self.hash_cache:
+            self.hash_cache.evict()
+        if functions.imdb_lookup_cache.cache_info().currsize:
+            functions.imdb_lookup_cache().evict()
+
+    def list_bulk_items(self, path: str) -> List[str]:
+        """List the items below a folder that are processed individually in bulk mode"""
+        bulk_mode = self.plugins[self.args.plugin].get_bulk_mode(self.args)
+        if bulk_mode == BulkMode.STANDARD:
+            with os.scandir(path) as entries:
+                return sorted(entry.path for entry in entries if entry.is_dir())
+
+        elif bulk_mode == BulkMode.MUSIC:
+            return list(get_release_dirs(path))
+
+        raise PluginError('Selected plugin does not handle bulk mode correctly')
+
+    def process_bulk(self, path: str) -> None:
+        """Process every item in a folder, recording the progress of each one in the run journal"""
+        items = self.list_bulk_items(path)
+        self.journal = RunJournal(RunJournal.run_id(path, self.args.plugin))
+        self.journal.start(items, self.args.resume)
+        if self.args.resume:
+            summary = self.journal.summary()
+            print(f"Resuming: {summary.get(ItemState.DONE, 0)} of {len(items)} items done, "
+                  f"{len(items) - summary.get(ItemState.DONE, 0) - summary.get(ItemState.QUEUED, 0)} in progress")
 
-    def process_folder_wrapper(self, path: str):
-        if self.skip_cache.in_cache(self.args.plugin, path):
-            cprint(f"Skipped [cache]: {path}", 'yellow')
+        try:
+            self.process_items(items)
+        finally:
+            failures = self.journal.failures()
+            if failures:
+                cprint(f"{len(failures)} items failed, run again with --resume to retry them", 'yellow')
+
+    def process_items(self, items: List[str]) -> List[str]:
+        """Process items in order, returning those that failed"""
+        self.failed = []
+        if self.args.handoff_queue > 0:
+            self.start_handoff()
+        try:
+            if self.args.jobs > 1:
+                self.process_parallel(items)
+            else:
+                for item in items:
+                    self.process_folder_wrapper(item)
+        finally:
+            self.stop_handoff()
+        self.flush_output()
+        return self.failed
+
+    def start_handoff(self) -> None:
+        """
+        Upload and hand items to the output plugin on a background thread, while the next item is analysed. The
+        thread waits for the submit stage on its own job queue connection, as a connection holds one stage at a time
+        """
+        def on_error(path: str, e: BaseException) -> None:
+            self.record_failure(path, f"Failed: {e!r}")
+            cprint(f"Failed [{os.path.basename(path)}]: {e!r}", 'red')
+
+        self.handoff = HandoffQueue(self.args.handoff_queue, on_error)
+        self.handoff_job_queue = JobQueue(self.args.priority)
+
+    def stop_handoff(self) -> None:
+        """Wait for the items already handed off"""
+        if self.handoff is None:
             return
+        if self.handoff.queue.qsize():
+            print(f"Waiting for {self.handoff.queue.qsize()} queued items...")
+        self.handoff.close()
+        self.handoff_job_queue.close()
+        logging.info(f"Analysis waited {self.handoff.blocked:.1f}s for queued items")
+        self.handoff = self.handoff_job_queue = None
+
+    def process_watch(self, path: str) -> None:
+        """
+        Process the items in a folder as in bulk mode, then each new item as it appears, until interrupted. Items are
+        processed once their files have stopped changing, and items that fail are retried after a delay. Plugins and
+        the output plugin stay loaded between items
+        """
+        watcher = FolderWatcher(path, self.args.watch_settle_time, self.args.watch_interval,
+                                retry_interval=self.args.watch_retry_interval)
+        print(f"Watching {path} ({watcher.mode}), press Ctrl+C to stop")
+
+        try:
+            for dirs in watcher.watch():
+                # the folder each item was found in, which is watched again if the item fails
+                if self.plugins[self.args.plugin].get_bulk_mode(self.args) == BulkMode.MUSIC:
+                    folders = {item: folder for folder in dirs for item in self.list_bulk_items(folder)}
+                else:
+                    folders = {folder: folder for folder in dirs}
+                failed = self.process_items(list(folders))
+
+                # items added to the skip cache despite failing, e.g. by the output plugin, would only be skipped
+                retry = {folders[item] for item in failed
+                         if not (self.skip_cache and self.skip_cache.in_cache(self.args.plugin, item))}
+                for folder in sorted(retry):
+                    cprint(f"Retrying {folder} in {watcher.retry(folder)} seconds", 'yellow')
+                for folder in set(folders.values()) - retry:
+                    watcher.succeeded(folder)
+
+                if self.skip_cache:
+                    self.skip_cache.save()
+                if self.hash_cache:
+                    self.hash_cache.evict()
+                print(f"Watching {path}...")
+        except KeyboardInterrupt:
+            print("Stopped watching")
+        except FileNotFoundError as e:
+            cprint(f"Stopped watching: {e.strerror}", 'red')
+        finally:
+            watcher.close()
+
+    def process_parallel(self, paths: List[str]) -> None:
+        """
+        Analyse bulk mode items in a pool of worker processes. Items are handed to the plugin and output plugin one
+        at a time, in their original order, as soon as they and every item before them have been analysed
+        """
+        from concurrent.futures import ProcessPoolExecutor
+        from concurrent.futures.process import BrokenProcessPool
+
+        plugin = self.plugins[self.args.plugin]
+        paths = iter(paths)
+        pending = collections.deque()
+
+        def start_executor() -> ProcessPoolExecutor:
+            return ProcessPoolExecutor(max_workers=self.args.jobs, initializer=init_bulk_worker,
+                                       initargs=(self.args, self.args.plugin, dict(plugin.config),
+                                                 self.journal.run if self.journal else None))
+
+        def fill() -> None:
+            # keep a bounded number of analysed items waiting, as each one holds its screenshots in memory
+            while len(pending) < self.args.jobs * 2:
+                path = next(paths, None)
+                if path is None:
+                    return
+                if self.is_skipped(path):
+                    continue
+
+                data = self.journal.load_analysis(path) if self.journal else None
+                if data is None:
+                    pending.append((path, executor.submit(analyse_folder_job, path)))
+                else:
+                    future = Future()
+                    future.set_result((data, StageTimer()))
+                    pending.append((path, future))
 
+        executor = start_executor()
         try:
-            self.process_folder(path, self.plugins[self.args.plugin])
+            fill()
+            while pending:
+                path, future = pending.popleft()
+                if isinstance(future.exception(), BrokenProcessPool):
+                    # a worker died, taking every queued item with it. Requeue all but the oldest item
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    executor = start_executor()
+                    pending = requeue_unfinished(pending, lambda item: executor.submit(analyse_folder_job, item))
+                self.process_folder_wrapper(path, future)
+                fill()
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def is_skipped(self, path: str) -> bool:
+        """Check whether a folder was done earlier in a resumed run, or is in the skip cache"""
+        state = self.journal.state(path) if self.journal else ItemState.QUEUED
+        if state == ItemState.DONE:
+            cprint(f"Skipped [journal]: {path}", 'yellow')
+            return True
+        # items partway through a resumed run are continued, even if they were added to the skip cache
+        if state == ItemState.QUEUED and self.skip_cache and self.skip_cache.in_cache(self.args.plugin, path):
+            cprint(f"Skipped [cache]: {path}", 'yellow')
+            return True
+        return False
+
+    def record_failure(self, path: str, error: str) -> None:
+        self.failed.append(path)
+        if self.journal:
+            self.journal.fail(path, error)
+
+    def process_folder_wrapper(self, path: str, analysis: Future = None):
+        """Process a folder, reporting errors. analysis optionally provides the result of analyse_folder_job"""
+        if analysis is None and self.is_skipped(path):
+            return
+
+        with self.report_errors(path):
+            if analysis is None:
+                self.process_folder(path, self.plugins[self.args.plugin])
+            else:
+                self.submit_analysed_folder(path, self.plugins[self.args.plugin], analysis)
+            if self.handoff is None:
+                self.folder_done(path)
+
+    def folder_done(self, path: str) -> None:
+        if self.skip_cache:
             self.skip_cache.add(self.args.plugin, path)
-            cprint("Done{0}".format(" " * 40), 'green')
+        cprint("Done{0}".format(" " * 40), 'green')
+
+        if self.args.bulk and self.args.bulk_sleep_interval:
+            print(f"Sleeping for {self.args.bulk_sleep_interval} minutes...")
+            time.sleep(self.args.bulk_sleep_interval * 60)
 
-            if self.args.bulk and self.args.bulk_sleep_interval:
-                print(f"Sleeping for {self.args.bulk_sleep_interval} minutes...")
-                time.sleep(self.args.bulk_sleep_interval * 60)
+    @contextmanager
+    def report_errors(self, path: str):
+        """Report and record the errors a folder fails with"""
+        try:
+            yield
 
         except ConflictError as e:
-            self.skip_cache.add(self.args.plugin, path)
+            if self.skip_cache:
+                self.skip_cache.add(self.args.plugin, path)
+            if self.journal:
+                self.journal.advance(path, ItemState.DONE)
             cprint(f"Skipped: {e.message}", 'yellow')
         except ValidationError as e:
+            self.record_failure(path, "\n".join(e.errors))
             for err in e.errors:
                 if len(err) > 400:
                     err = "<error message is too long to display>"
                 cprint("Error: {0}".format(err), 'red')
 
         except (MagicError, PluginError) as e:
+            self.record_failure(path, e.error)
             cprint(e.error, 'red')
 
         except ServerError as e:
-            cprint(f"Server error [{e.error}], retrying in {requests_retry_interval} seconds...", "red")
+            self.record_failure(path, f"Server error [{e.error}]")
+            cprint(f"Server error [{e.error}]", "red")
+
+        except AnalysisError as e:
+            self.record_failure(path, e.error)
+            logging.error(f"Analysis failed: {path}", exc_info=e.__cause__)
+            cprint(e.error, 'red')
 
     def process_folder(self, path: str, plugin: BasePlugin):
 
         logging.info("----------------------------\n{0}".format(path))
         print("\n{0}".format(path))
 
-        self.lock.acquire()
+        # only one job analyses and one submits at a time by default, see config.job_queue_stages
+        timer = StageTimer()
+        data = self.journal.load_analysis(path) if self.journal else None
+        if data is None:
+            with self.job_queue.stage('analyse', path, timer):
+                data = self.analyse_folder(path, plugin, timer)
+        self.submit(path, data, plugin, timer)
+
+    def submit_analysed_folder(self, path: str, plugin: BasePlugin, analysis: Future) -> None:
+        """Hand a folder analysed by a worker process to the plugin. The worker held the analyse stage"""
+        logging.info("----------------------------\n{0}".format(path))
+        print("\n{0}".format(path))
+
+        try:
+            data, timer = analysis.result()
+        except SmartHashError:
+            raise
+        except Exception as e:
+            raise AnalysisError(f"Failed: {e!r}") from e
+
+        self.submit(path, data, plugin, timer)
+
+    def submit(self, path: str, data: Dict, plugin: BasePlugin, timer: StageTimer) -> None:
+        """Submit an analysed folder, or queue it to be submitted in the background if --handoff-queue is set"""
+        data['args'] = self.args
+
+        if self.handoff is None:
+            with self.job_queue.stage('submit', path, timer):
+                self.submit_folder(data, plugin, timer)
+            return
+
+        def submit_job() -> None:
+            with self.report_errors(path):
+                with self.handoff_job_queue.stage('submit', path, timer):
+                    self.submit_folder(data, plugin, timer)
+                self.folder_done(path)
 
-        self.total_media_size, total_duration, smarthash_path_info = extract_metadata(path)
+        with timer.stage('handoff'):
+            self.handoff.submit(path, submit_job)
+
+    def analyse_folder(self, path: str, plugin: BasePlugin, timer: StageTimer) -> Dict:
+        """Extract metadata, hash and take screenshots of a folder, returning the dataset for the plugin"""
+        from libprick import Pricker, PrickError
 
         blacklist_path_matches_enabled = [] if self.args.disable_blacklist else blacklist_path_matches
 
@@ -304,45 +653,99 @@ class SmartHash:
             'blacklist_path_matches': [x.lower() for x in blacklist_path_matches_enabled],
             'comment': "Generated with SmartHash {0}".format(smarthash_version),
             'smarthash_version': smarthash_version,
+            'hash_threads': self.args.hash_threads,
+            'read_size': self.args.read_size * 2**20,
+            'read_mmap': self.args.read_mmap,
+            'read_drop_cache': self.args.drop_page_cache,
         }
 
-        try:
-            plugin.early_validation(path, {
-                'args': self.args,
-                'smarthash_info': smarthash_path_info,
-                'title': os.path.basename(path),
-                'params': params
-            })
-        except SmartHashError as e:
-            self.lock.release()
-            raise e
+        # Pipeline: the folder is hashed in the background while metadata is extracted. Each file is rehashed by the
+        # pricker as soon as the torrent hasher has finished with it, while its contents are still in the page cache
+        abort_hashing = threading.Event()
+        hashed_files = queue.Queue()
+
+        # walk the folder once for both hashing and metadata extraction, dropping blacklisted files as it is walked
+        with timer.stage('walk'):
+            table = FileTable(path, file_filter=FileFilter.from_params(params))
+
+        def hash_stage():
+            try:
+                with timer.stage('hashing'):
+                    return make_meta_file(path, None, params=dict(params), flag=abort_hashing,
+                                          progress=self.hash_progress_callback,
+                                          filedone=lambda *hashed_file: hashed_files.put(hashed_file),
+                                          digests=self.args.extra_digests, cache=self.hash_cache, table=table)
+            finally:
+                hashed_files.put(None)
 
-        # hash the folder
-        metainfo = make_meta_file(path, None, params=params, progress=self.hash_progress_callback)
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            hash_future = executor.submit(hash_stage)
 
-        pricker = Pricker(self.pricker_progress_callback)
+            try:
+                # metadata extracted before a resumed run was interrupted is reused
+                metadata = self.journal.load_metadata(path) if self.journal else None
+                with timer.stage('metadata'):
+                    if metadata is None:
+                        metadata = extract_metadata(path, self.hash_cache, table)
+                        if self.journal:
+                            self.journal.save_metadata(path, *metadata)
+                    self.total_media_size, total_duration, smarthash_path_info = metadata
+
+                plugin.early_validation(path, {
+                    'args': self.args,
+                    'smarthash_info': smarthash_path_info,
+                    'title': os.path.basename(path),
+                    'params': params
+                })
+            except BaseException:
+                abort_hashing.set()
+                raise
+
+            pricker = Pricker(self.pricker_progress_callback)
+            pricker_digests = {}
+            file_digests = {}
+
+            with timer.stage('pricker'):
+                for file_path_parts, digests in iter(hashed_files.get, None):
+                    file_path = os.path.join(os.path.basename(path), *file_path_parts)
+                    if digests:
+                        file_digests[file_path] = digests
+
+                    if file_path in smarthash_path_info:
+                        # calculate a pricker hash for audio files
+                        ext = os.path.splitext(file_path)[1].lower()
+                        mime_prefix = smarthash_path_info[file_path]['mime_type'].split('/')[0]
+
+                        if mime_prefix == 'audio' or ext in whitelist_audio_extensions or \
+                                (not self.args.skip_video_rehash and
+                                 (mime_prefix == 'video' or ext in whitelist_audio_extensions)):
+
+                            try:
+                                pricker.open(os.path.join(path, *file_path_parts))
+                                pricker_digests[file_path] = pricker.hexdigest()
+                            except PrickError:
+                                pass
+
+            metainfo = hash_future.result()
 
         # lookup gathered metadata and insert into the torrent file metainfo
+        compact_info = self.args.info_encoding != 'json'
         for file in metainfo['info']['files']:
             file_path = os.path.join(os.path.basename(path), *file['path'])
 
-            if file_path in smarthash_path_info:
+            if file_path in smarthash_path_info and not compact_info:
                 file['smarthash_info'] = json.dumps(smarthash_path_info[file_path])
 
-                # calculate a pricker hash for audio files
-                ext = os.path.splitext(file_path)[1].lower()
-                mime_prefix = smarthash_path_info[file_path]['mime_type'].split('/')[0]
-
-                if mime_prefix == 'audio' or ext in whitelist_audio_extensions or \
-                        (not self.args.skip_video_rehash and
-                         (mime_prefix == 'video' or ext in whitelist_audio_extensions)):
+            if file_path in pricker_digests:
+                file['pricker'] = pricker_digests[file_path]
+                metainfo['pricker_version'] = pricker.version()
 
-                    try:
-                        pricker.open(os.path.join(path, *file['path']))
-                        file['pricker'] = pricker.hexdigest()
-                        metainfo['pricker_version'] = pricker.version()
-                    except PrickError:
-                        pass
+        if compact_info and smarthash_path_info:
+            plain, encoded = info_codec.encode_files(
+                metainfo['info'], smarthash_path_info, lambda file: os.path.join(os.path.basename(path), *file['path']),
+                compress=self.args.info_encoding == 'compact-zlib')
+            logging.info(f"Compact metadata: {encoded} bytes instead of {plain}")
+            print(f"\rCompact metadata: saved {plain - encoded} bytes ({plain} -> {encoded})")
 
         formatted_mediainfo = ""
         extracted_images = []
@@ -368,46 +771,77 @@ class SmartHash:
                 screenshot_files.append(file_path)
 
         if "video-screenshots" in plugin.options:
-            extracted_images = self.extract_images(screenshot_files)
+            with timer.stage('screenshots'):
+                extracted_images = self.extract_images(screenshot_files)
 
         # collect the dataset for the plugin
         data = {
             'smarthash_version': smarthash_version,
-            'ui_interface': PluginUIInterface(self, plugin),
             'args': self.args,
             'path': path,
             'title': os.path.split(path)[-1],
             'smarthash_info': smarthash_path_info,
+            'file_digests': file_digests,
             'total_duration': total_duration,
             'mediainfo': formatted_mediainfo,
             'extracted_images': extracted_images,
             'torrent_file': metainfo.gettorrent(),
         }
+        if self.journal:
+            self.journal.save_analysis(path, data)
+        return data
 
-        print("\rCalling plugin '{0}'...".format(plugin.get_title()))
+    def submit_folder(self, data: Dict, plugin: BasePlugin, timer: StageTimer) -> None:
+        """Hand an analysed folder to the plugin, then the output plugin"""
+        data['ui_interface'] = PluginUIInterface(self, plugin)
 
-        try:
-            plugin_output = plugin.handle(data)
-        except SmartHashError as e:
-            self.lock.release()
-            raise e
+        # a resumed item that was already handed to the plugin continues with its output
+        plugin_output = self.journal.load_output(data['path']) if self.journal else None
+        if plugin_output is None:
+            print("\rCalling plugin '{0}'...".format(plugin.get_title()))
 
-        assert isinstance(plugin_output, PluginOutput)
+            with timer.stage('plugin'):
+                plugin_output = plugin.handle(data)
 
-        if not isinstance(self.output_plugin, OutputPlugin):
-            print(f"Calling {self.output_plugin.title}...")
-        try:
-            self.output_plugin.handle(plugin_output, os.path.dirname(path))
-        except PluginError as e:
-            cprint(f"Output plugin '{self.output_plugin.title}' failed: {e.error}", 'red')
+            assert isinstance(plugin_output, PluginOutput)
+            if self.journal:
+                self.journal.save_output(data['path'], plugin_output)
+
+        # torrents are handed to the output plugin in batches of --output-batch-size, the rest once processing ends
+        self.output_batch.append((plugin_output, data['path']))
+        if len(self.output_batch) >= self.args.output_batch_size:
+            with timer.stage('output'):
+                self.flush_output()
+
+        logging.info(f"Stage timings: {timer.summary()}")
+        if self.args.stage_timings:
+            print(f"\rStage timings: {timer.summary()}")
 
         # if an operation succeeded, write out the config
         self.save_config()
 
-        self.lock.release()
+    def flush_output(self) -> None:
+        """Hand the torrents waiting in the output batch to the output plugin, in as few calls as it supports"""
+        batch, self.output_batch = self.output_batch, []
+        if not batch:
+            return
+
+        if not isinstance(self.output_plugin, OutputPlugin):
+            print(f"Calling {self.output_plugin.title}...")
+        errors = self.output_plugin.handle_batch([(plugin_output, os.path.dirname(path))
+                                                  for plugin_output, path in batch])
+
+        for (_, path), e in zip(batch, errors):
+            if e is None:
+                if self.journal:
+                    self.journal.advance(path, ItemState.DONE)
+            else:
+                self.record_failure(path, f"Output plugin '{self.output_plugin.title}' failed: {e.error}")
+                item = f" [{os.path.basename(path)}]" if len(batch) > 1 else ""
+                cprint(f"Output plugin '{self.output_plugin.title}' failed{item}: {e.error}", 'red')
 
     def extract_images(self, screenshot_files: List[str]) -> List:
-        count = 0
+        from tools.screenshots import extract_screenshots
 
         images_per_video_file = 4
         if len(screenshot_files) in [2, 3]:
@@ -421,41 +855,26 @@ class SmartHash:
         if n2 < 10:
             n2 = 10
 
-        images = []
-
-        for path in screenshot_files:
-            vidcap = cv2.VideoCapture(path)
-
-            # take frames at regular intervals from a range excluding the first and last 10% of the file
-            frame_count = vidcap.get(cv2.CAP_PROP_FRAME_COUNT)
-            frame_count_10 = math.floor(frame_count / 10)
-            interval = math.floor((frame_count - frame_count_10 * 2) / (n2 + 1))
-
-            tmp_images = []
-
-            for i in range(0, n2):
-                vidcap.set(cv2.CAP_PROP_POS_FRAMES, (frame_count_10 + i * interval))  # added this line
-                success, image = vidcap.read()
-
-                if success:
-                    success, buf = cv2.imencode(".jpeg", image)
-
-                    variance = cv2.Laplacian(image, cv2.CV_64F).var()
-                    tmp_images.append(Screenshot(i, variance, buf.tobytes()))
-                else:
-                    logging.error(f"Screenshot extraction failed ({i+1} of {n2})")
-
-                count += 1
-                self.image_extaction_progress_callback(count, n2*len(screenshot_files))
+        # files are processed concurrently, each counting its own candidates, while progress is reported from here
+        taken = [0] * len(screenshot_files)
 
-            # select the N candidates with the highest variance, preserving order
-            num_images = min(images_per_video_file, len(tmp_images))
-            tmp_images = sorted(tmp_images, key=lambda x: x.variance, reverse=True)[0:num_images]
-            tmp_images = sorted(tmp_images, key=lambda x: x.index)
+        def progress(index: int):
+            def inner() -> None:
+                taken[index] += 1
+            return inner
 
-            images.append([x.image for x in tmp_images])
+        with ThreadPoolExecutor(max_workers=screenshot_threads) as executor:
+            futures = [executor.submit(extract_screenshots, path, images_per_video_file, n2, progress(i))
+                       for i, path in enumerate(screenshot_files)]
+            count = 0
+            done = False
+            while not done:
+                done = not wait(futures, timeout=0.1).not_done
+                if sum(taken) > count:
+                    count = sum(taken)
+                    self.image_extaction_progress_callback(count, n2 * len(screenshot_files))
 
-        return images
+            return [future.result() for future in futures]
 
     def hash_progress_callback(self, amount) -> None:
         print('\rHashing: %.1f%% complete' % (amount * 100), end='')
@@ -481,6 +900,56 @@ class SmartHash:
         self.early_return = True
 
 
+class BulkWorker(SmartHash):
+    """Analyses folders in a --jobs worker process. Arguments are passed in from the main process rather than
+    parsed, plugins are not updated and progress is not displayed"""
+    def __init__(self, args, plugin_name: str, plugin_config: Dict, journal_run: Optional[str]):
+        self.init_state()
+        self.args = args
+        self.job_queue = JobQueue(args.priority)
+        self.hash_cache = None if args.no_hash_cache else HashCache()
+        self.journal = RunJournal(journal_run) if journal_run else None
+        self.plugin = importlib.import_module("Plugins." + plugin_name).SmarthashPlugin()
+        self.plugin.set_config(plugin_config)
+
+    def hash_progress_callback(self, amount) -> None:
+        pass
+
+    def pricker_progress_callback(self, num_bytes) -> None:
+        pass
+
+    def image_extaction_progress_callback(self, x: int, total_images: int) -> None:
+        pass
+
+
+bulk_worker = None
+
+
+def init_bulk_worker(args, plugin_name: str, plugin_config: Dict, journal_run: Optional[str]) -> None:
+    global bulk_worker
+    bulk_worker = BulkWorker(args, plugin_name, plugin_config, journal_run)
+
+
+def analyse_folder_job(path: str) -> Tuple[Dict, StageTimer]:
+    timer = StageTimer()
+    # queued with other invocations and the other workers, as in process_folder
+    with bulk_worker.job_queue.stage('analyse', path, timer):
+        return bulk_worker.analyse_folder(path, bulk_worker.plugin, timer), timer
+
+
+def requeue_unfinished(pending: Deque[Tuple[str, Future]],
+                       submit: Callable[[str], Future]) -> Deque[Tuple[str, Future]]:
+    """
+    Resubmit the pending items whose analysis was lost when a worker process died. Items already analysed keep their
+    result, so that they are not hashed again
+    :param pending: (path, future) of each item, in order
+    :param submit: submits the analysis of a path to the new pool
+    :return: the pending items, in the same order
+    """
+    return collections.deque((path, future if future.done() and future.exception() is None else submit(path))
+                             for path, future in pending)
+
+
 if __name__ == "__main__":
 
     smarthash = SmartHash()
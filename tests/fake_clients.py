@@ -0,0 +1,245 @@
+import base64
+import email.parser
+import email.policy
+import json
+import secrets
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+
+def parse_multipart(content_type: str, body: bytes) -> List[Tuple[str, bytes]]:
+    """(field name, content) of each file in a multipart/form-data body"""
+    message = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(
+        f"Content-Type: {content_type}\r\n\r\n".encode() + body)
+    return [(part.get_param('name', header='content-disposition'), part.get_payload(decode=True))
+            for part in message.iter_parts() if part.get_filename() is not None]
+
+
+class FakeClient:
+    """
+    Minimal local stand-in for a torrent client's web API, for testing and benchmarking output plugins. Counts logins,
+    API calls and TCP connections, and records the torrents added by each call. expire_sessions() invalidates every
+    login, as if it had timed out. latency delays every response
+    """
+    def __init__(self, latency: float = 0):
+        self.latency = latency
+        self.logins = 0
+        self.calls = 0
+        self.connections = 0
+        self.added: List[List[bytes]] = []  # torrents added, by call
+        self.sessions = set()
+        self.lock = threading.Lock()
+        self.closed = False
+
+        client = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # keep-alive
+            disable_nagle_algorithm = True  # headers and content are written separately
+
+            def setup(self):
+                super().setup()
+                with client.lock:
+                    client.connections += 1
+
+            def do_GET(self):
+                self.handle_request(b'')
+
+            def do_POST(self):
+                self.handle_request(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+
+            def do_PUT(self):
+                self.do_POST()
+
+            def handle_request(self, body: bytes):
+                if client.closed:
+                    # drop kept-alive connections too
+                    self.close_connection = True
+                    return
+
+                with client.lock:
+                    client.calls += 1
+                    status, headers, content = client.respond(self, body)
+                if status is None:
+                    # drop the connection without a response
+                    self.close_connection = True
+                    return
+                if client.latency:
+                    time.sleep(client.latency)
+
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header('Content-Length', str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever, args=(0.05,), daemon=True)
+        self.thread.start()
+
+    def respond(self, request: BaseHTTPRequestHandler, body: bytes) -> Tuple[Optional[int], Dict[str, str], bytes]:
+        """:return: (status, headers, content), or a status of None to close the connection without a response"""
+        raise NotImplementedError
+
+    def new_session(self) -> str:
+        self.logins += 1
+        session = secrets.token_hex(8)
+        self.sessions.add(session)
+        return session
+
+    def expire_sessions(self) -> None:
+        with self.lock:
+            self.sessions.clear()
+
+    def close(self) -> None:
+        self.closed = True
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class FakeQBittorrent(FakeClient):
+    """qBittorrent Web API v2: a login sets the SID cookie, and other calls without it fail with 403"""
+    username = 'admin'
+    password = 'adminadmin'
+
+    def respond(self, request, body):
+        path = urlparse(request.path).path
+        if path == '/api/v2/auth/login':
+            form = parse_qs(body.decode())
+            if form.get('username') != [self.username] or form.get('password') != [self.password]:
+                return 200, {}, b'Fails.'
+            return 200, {'Set-Cookie': f"SID={self.new_session()}; HttpOnly; path=/"}, b'Ok.'
+
+        cookie = request.headers.get('Cookie', '')
+        if not any(f"SID={session}" in cookie for session in self.sessions):
+            return 403, {}, b'Forbidden'
+
+        if path == '/api/v2/auth/logout':
+            self.sessions.discard(cookie.split('SID=')[1].split(';')[0])
+            return 200, {}, b''
+        if path == '/api/v2/app/version':
+            return 200, {}, b'v4.6.0'
+        if path == '/api/v2/app/webapiVersion':
+            return 200, {}, b'2.9.3'
+        if path == '/api/v2/torrents/add':
+            self.added.append([content for _, content in parse_multipart(request.headers['Content-Type'], body)])
+            return 200, {}, b'Ok.'
+        return 404, {}, b'Not Found'
+
+
+class FakeDeluge(FakeClient):
+    """deluge web UI JSON-RPC: auth.login sets the _session_id cookie, and other calls without it fail with error
+    code 1. Torrents are uploaded to /upload, then added by the path it returns"""
+    password = 'deluge'
+
+    def __init__(self):
+        super().__init__()
+        self.uploads: Dict[str, bytes] = {}
+
+    def respond(self, request, body):
+        path = urlparse(request.path).path
+        cookie = request.headers.get('Cookie', '')
+        authenticated = any(f"_session_id={session}" in cookie for session in self.sessions)
+
+        # uploads are not authenticated, as the session cookie is only set for /json
+        if path == '/upload':
+            files = []
+            for _, content in parse_multipart(request.headers['Content-Type'], body):
+                files.append(f"/tmp/delugeweb-{len(self.uploads)}.torrent")
+                self.uploads[files[-1]] = content
+            return 200, {'Content-Type': 'application/json'}, json.dumps({'success': True, 'files': files}).encode()
+
+        if path != '/json':
+            return 404, {}, b'Not Found'
+
+        req = json.loads(body)
+        headers = {'Content-Type': 'application/json'}
+        result = None
+        error = None
+
+        if req['method'] == 'auth.login':
+            result = req['params'] == [self.password]
+            if result:
+                headers['Set-Cookie'] = f"_session_id={self.new_session()}; Path=/json"
+        elif not authenticated:
+            error = {'message': 'Not authenticated', 'code': 1}
+        elif req['method'] == 'auth.delete_session':
+            result = True
+        elif req['method'] == 'web.update_ui':
+            result = {'torrents': {}}
+        elif req['method'] == 'web.add_torrents':
+            self.added.append([self.uploads[torrent['path']] for torrent in req['params'][0]])
+            result = [True] * len(req['params'][0])
+        else:
+            error = {'message': f"Unknown method {req['method']}", 'code': 2}
+
+        return 200, headers, json.dumps({'id': req['id'], 'result': result, 'error': error}).encode()
+
+
+class FakeTransmission(FakeClient):
+    """Transmission RPC: requests need basic auth and the current X-Transmission-Session-Id, or fail with 401 and 409.
+    Sessions are counted as logins"""
+    username = 'transmission'
+    password = 'transmission'
+
+    def respond(self, request, body):
+        if urlparse(request.path).path != '/transmission/rpc':
+            return 404, {}, b'Not Found'
+
+        expected = 'Basic ' + base64.b64encode(f"{self.username}:{self.password}".encode()).decode()
+        if request.headers.get('Authorization') != expected:
+            return 401, {}, b'Unauthorized'
+
+        if request.headers.get('X-Transmission-Session-Id') not in self.sessions:
+            return 409, {'X-Transmission-Session-Id': self.new_session()}, b'Conflict'
+
+        req = json.loads(body)
+        arguments = {}
+        if req['method'] == 'session-get':
+            arguments = {'rpc-version': 17, 'rpc-version-semver': '5.3.0', 'version': '4.0.0'}
+        elif req['method'] == 'torrent-add':
+            self.added.append([base64.b64decode(req['arguments']['metainfo'])])
+            arguments = {'torrent-added': {'id': len(self.added), 'name': 'torrent', 'hashString': '0' * 40}}
+
+        headers = {'Content-Type': 'application/json',
+                   'X-Transmission-Session-Id': request.headers['X-Transmission-Session-Id']}
+        return 200, headers, json.dumps({'arguments': arguments, 'result': 'success', 'tag': req.get('tag')}).encode()
+
+
+class FakeTracker(FakeClient):
+    """
+    Generic HTTP API, e.g. a tracker's upload endpoint: every request is answered with a JSON echo of its method, path
+    and body size, and its cookies if any. Requests to /login set a cookie. drop(n) closes the connection of the next n requests
+    without a response
+    """
+    def __init__(self, latency: float = 0):
+        super().__init__(latency)
+        self.to_drop = 0
+        self.requests: List[Tuple[str, str]] = []
+
+    def drop(self, count: int) -> None:
+        with self.lock:
+            self.to_drop = count
+
+    def respond(self, request, body):
+        if self.to_drop:
+            self.to_drop -= 1
+            return None, {}, b''
+
+        self.requests.append((request.command, request.path))
+        echo = {'method': request.command, 'path': request.path, 'size': len(body)}
+        if request.headers.get('Cookie'):
+            echo['cookie'] = request.headers['Cookie']
+        content = json.dumps(echo).encode()
+        headers = {'Content-Type': 'application/json'}
+        if request.path == '/login':
+            headers['Set-Cookie'] = f"session={self.new_session()}; path=/"
+        return 200, headers, content
@@ -11,13 +11,14 @@ from functions import PluginError
 from smarthash import SmartHash
 from tests.MockFile import MockFile
 from tests.compare_torrents import compare_torrents
-from tests.test_smarthash import FIXTURES_ROOT, PATHS
+from tests.test_smarthash import FIXTURES_ROOT, PATHS, use_temp_stores
 
 
 class DefaultPluginTests(unittest.TestCase):
 
     def setUp(self) -> None:
         del sys.argv[1:]
+        use_temp_stores(self)
 
     def tearDown(self) -> None:
         MockFile.reset()
@@ -0,0 +1,96 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from tools.folder_watcher import InotifyWatcher, PollingWatcher, StableFileDetector
+
+
+class FolderWatcherTests(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.root)
+
+    def write(self, *path: str, data: bytes = b'data') -> None:
+        os.makedirs(os.path.join(self.root, *path[:-1]), exist_ok=True)
+        with open(os.path.join(self.root, *path), 'ab') as file:
+            file.write(data)
+
+    def check_watcher(self, watcher) -> None:
+        os.mkdir(os.path.join(self.root, 'existing'))
+        try:
+            watcher = watcher()
+        except OSError:
+            self.skipTest("inotify is not available")
+
+        try:
+            assert watcher.existing() == {os.path.join(self.root, 'existing')}
+            self.write('release', 'file.mkv')
+            self.write('ignored.mkv')
+
+            created = set()
+            for _ in range(20):
+                created |= watcher.poll(0.05)
+                if created:
+                    break
+            assert created == {os.path.join(self.root, 'release')}
+        finally:
+            watcher.close()
+
+    def test_inotify_watcher(self):
+        self.check_watcher(lambda: InotifyWatcher(self.root))
+
+    def test_polling_watcher(self):
+        self.check_watcher(lambda: PollingWatcher(self.root, 0.05))
+
+    def test_stable_file_detector(self):
+        now = [0.0]
+        detector = StableFileDetector(10, clock=lambda: now[0])
+        release = os.path.join(self.root, 'release')
+        empty = os.path.join(self.root, 'empty')
+        removed = os.path.join(self.root, 'removed')
+        self.write('release', 'file.mkv')
+        os.mkdir(empty)
+        os.mkdir(removed)
+
+        for path in (release, empty, removed):
+            detector.track(path)
+        assert detector.ready() == []
+
+        # a change restarts the settle time
+        now[0] = 5
+        self.write('release', 'file.mkv')
+        os.rmdir(removed)
+        assert detector.ready() == []
+        now[0] = 14
+        assert detector.ready() == []
+
+        now[0] = 15
+        assert detector.ready() == [release]
+        assert list(detector.pending) == [empty]
+
+    def test_stable_file_detector_retry(self):
+        now = [0.0]
+        detector = StableFileDetector(10, clock=lambda: now[0], retry_interval=60, retry_max_interval=100)
+        release = os.path.join(self.root, 'release')
+        self.write('release', 'file.mkv')
+
+        # a failed directory is held until the retry delay has passed, then settles again
+        assert detector.retry(release) == 60
+        now[0] = 59
+        assert detector.ready() == []
+        now[0] = 60
+        assert detector.ready() == []
+        now[0] = 70
+        assert detector.ready() == [release]
+
+        # the delay doubles after each failure, up to the maximum
+        assert detector.retry(release) == 100
+
+        # and starts over once the directory has been processed
+        detector.succeeded(release)
+        assert detector.failures == {}
+        assert detector.retry(release) == 60
@@ -1,18 +1,51 @@
 import json
 import os
+import shutil
+import tempfile
 import unittest
+from typing import Dict
 
-import requests
-from mockito import when, ANY, verify
+from mockito import when, ANY, unstub
 
+import functions
 from functions import error, requests_retriable_post, requests_retriable_put, requests_retriable_get, \
-    list_files, get_mime_type, MagicError, mp3_info, imdb_id_to_url, imdb_url_to_id, \
-    ValidationError, verify_imdb, extract_metadata, filter_screenshot_paths
+    list_files, get_mime_type, get_mime_type_cached, MagicError, mp3_info, imdb_id_to_url, imdb_url_to_id, \
+    ValidationError, verify_imdb, extract_metadata, filter_screenshot_paths, PluginError, http_pool
+from tests.fake_clients import FakeTracker
 from tests.test_smarthash import FIXTURES_ROOT, PATHS
+from tools.imdb_cache import ImdbCache
+
+
+class StubCinemagoer:
+    """Offline stand-in for imdb.Cinemagoer, resolving IMDb IDs to their canonical ID. 5555555 fails as if IMDb could
+    not be reached, and unknown IDs as not found"""
+    class Movie:
+        def __init__(self, imdb_id: str):
+            self.data = {'imdbID': imdb_id, 'title': f"Movie {imdb_id}"}
+
+        def __str__(self):
+            return self.data['title']
+
+    def __init__(self, ids: Dict[str, str]):
+        self.ids = ids
+        self.lookups = []
+
+    def get_movie(self, imdb_id: str) -> "StubCinemagoer.Movie":
+        from imdb import IMDbDataAccessError
+
+        self.lookups.append(imdb_id)
+        if imdb_id == '5555555':
+            raise IMDbDataAccessError({'errcode': None, 'errmsg': 'timed out'})
+        if imdb_id not in self.ids:
+            raise IMDbDataAccessError({'errcode': 404, 'errmsg': 'Not Found'})
+        return StubCinemagoer.Movie(self.ids[imdb_id])
 
 
 class FunctionTests(unittest.TestCase):
 
+    def tearDown(self) -> None:
+        unstub()
+
     def test_error(self):
         with self.assertRaises(SystemExit):
             error('Not valid json')
@@ -22,19 +55,31 @@ class FunctionTests(unittest.TestCase):
             error('["First error", "Second error"]')
 
     def test_requests_retriable_post(self):
-        when(requests).post(ANY).thenReturn(None)
-        requests_retriable_post('http://test')
-        verify(requests, times=1).post(ANY)
+        tracker = FakeTracker()
+        response = requests_retriable_post(f"http://127.0.0.1:{tracker.port}/upload", data=b'torrent')
+        assert response.json() == {'method': 'POST', 'path': '/upload', 'size': 7}
+        tracker.close()
 
     def test_requests_retriable_put(self):
-        when(requests).put(ANY).thenReturn(None)
-        requests_retriable_put('http://test')
-        verify(requests, times=1).put(ANY)
-
-    def requests_retriable_get(self):
-        when(requests).get(ANY).thenReturn(None)
-        requests_retriable_get('http://test')
-        verify(requests, times=1).get(ANY)
+        tracker = FakeTracker()
+        response = requests_retriable_put(f"http://127.0.0.1:{tracker.port}/upload", data=b'torrent')
+        assert response.json() == {'method': 'PUT', 'path': '/upload', 'size': 7}
+        tracker.close()
+
+    def test_requests_retriable_get(self):
+        tracker = FakeTracker()
+        url = f"http://127.0.0.1:{tracker.port}"
+        for _ in range(3):
+            assert requests_retriable_get(url + '/status').json()['path'] == '/status'
+
+        # connections to the same host are kept alive
+        assert tracker.connections == 1
+
+        when(http_pool).backoff(ANY).thenReturn(0)
+        tracker.drop(2)
+        with self.assertRaises(PluginError):
+            requests_retriable_get(url + '/status', max_attempts=2)
+        tracker.close()
 
     def test_list_files(self):
         list_path = os.path.join(FIXTURES_ROOT, 'audio')
@@ -53,10 +98,66 @@ class FunctionTests(unittest.TestCase):
         with self.assertRaises(MagicError):
             get_mime_type('nonexistent_path')
 
+    def test_get_mime_type_detection(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            # JSON longer than the header is only recognised once the whole document is read
+            path = os.path.join(temp_dir, 'data')
+            with open(path, 'w') as f:
+                json.dump({'key': 'x' * 20000}, f)
+            assert get_mime_type(path) == 'application/json'
+
+            # results are reused until the file changes
+            hits = get_mime_type_cached.cache_info().hits
+            assert get_mime_type(path) == 'application/json'
+            assert get_mime_type_cached.cache_info().hits == hits + 1
+
+            with open(path, 'w') as f:
+                f.write('plain text')
+            os.utime(path, ns=(0, 0))
+            assert get_mime_type(path) == 'text/plain'
+
+            # .mp4 files may be audio only, so their type is detected rather than taken from the extension
+            path = os.path.join(temp_dir, 'audio.mp4')
+            with open(path, 'wb') as f:
+                f.write(b'\x00\x00\x00\x18ftypM4A \x00\x00\x00\x00M4A isom\x00\x00\x00\x08free')
+            assert get_mime_type(path) == 'audio/x-m4a'
+
     def test_mp3_info(self):
         mp3_info_output = mp3_info(PATHS['audio_1_file'])
         assert mp3_info_output == {'xing_header': 'INFO', 'method': 'CBR'}
 
+    def test_mp3_info_headers(self):
+        # MPEG-1 layer III, 128 kbit/s, 44.1 kHz, stereo: 417 byte frames with 32 bytes of side info
+        frame_header = b"\xFF\xFB\x90\x00"
+        side_info = b"\x00" * 32
+        lame = b"Xing" + (15).to_bytes(4, 'big') + b"\x00" * 108 + (57).to_bytes(4, 'big') + \
+            b"LAME3.99r" + b"\x23" + b"\x00" * 9 + b"\xA0"
+        id3_tag = b"ID3\x03\x00\x00\x00\x00\x00\x14" + b"\x00" * 20
+
+        tests = [
+            (lame, {'xing_header': 'LAME', 'method': 'VBR', 'xing_vbr_v': 4, 'xing_vbr_q': 3,
+                    'lame_version': '3.99r', 'lame_tag_revision': 2, 'lame_vbr_method': 3, 'lame_nspsytune': True,
+                    'lame_nssafejoint': False, 'lame_nogap_next': True, 'lame_nogap_previous': False}),
+            (b"Xing" + b"\x00" * 4, {'xing_header': 'XING', 'method': 'VBR'}),
+            (b"Info" + b"\x00" * 4, {'xing_header': 'INFO', 'method': 'CBR'}),
+            (b"VBRI", {'xing_header': 'VBRI', 'method': 'VBR'}),
+            (b"", {'method': 'CBR'}),
+        ]
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, 'test.mp3')
+            for payload, expected in tests:
+                first_frame = frame_header + side_info + payload
+                first_frame += b"\x00" * (417 - len(first_frame))
+                audio_frames = (frame_header + b"\x00" * 413) * 3
+                # markers outside of the first frame are audio data, not headers
+                audio_frames += b"Xing" * 10
+
+                for tag in [b"", id3_tag]:
+                    with open(path, 'wb') as f:
+                        f.write(tag + first_frame + audio_frames)
+                    assert mp3_info(path) == expected
+
     def test_imdb_id_to_url(self):
         assert imdb_id_to_url('1234567') == 'https://www.imdb.com/title/tt1234567/'
 
@@ -69,10 +170,28 @@ class FunctionTests(unittest.TestCase):
             imdb_url_to_id('https://www.imdb.com/title/tt123456')
 
     def test_verify_imdb(self):
+        temp_dir = tempfile.mkdtemp()
+        cache = ImdbCache(os.path.join(temp_dir, 'imdb_cache.db'))
+        site = StubCinemagoer({'1234567': '1234567', '7654321': '1234567'})
+        when(functions).imdb_lookup_cache().thenReturn(cache)
+        when(functions).cinemagoer().thenReturn(site)
+
+        for _ in range(2):
+            with self.assertRaises(ValidationError):
+                verify_imdb('0000000')
+            assert verify_imdb('1234567') == '1234567'
+            assert verify_imdb('7654321') == '1234567'
+
+        # each ID is only looked up once, and invalid IDs are remembered too
+        assert site.lookups == ['0000000', '1234567', '7654321']
+
+        # IMDb being unreachable does not make an ID invalid
         with self.assertRaises(ValidationError):
-            verify_imdb('0000000')
+            verify_imdb('5555555')
+        assert cache.get('5555555') == (False, None)
 
-        verify_imdb('1234567')
+        cache.close()
+        shutil.rmtree(temp_dir)
 
     def test_extract_metadata(self):
         with open(os.path.join(FIXTURES_ROOT, 'metadata', 'example-mp4-file-small.json')) as f:
@@ -0,0 +1,65 @@
+import threading
+import time
+import unittest
+
+from tools.handoff_queue import HandoffQueue
+
+
+class HandoffQueueTests(unittest.TestCase):
+
+    def test_order(self):
+        done = []
+        handoff = HandoffQueue(2)
+        futures = [handoff.submit(str(i), lambda i=i: done.append(i) or i) for i in range(10)]
+        handoff.drain()
+
+        assert done == list(range(10))
+        assert [future.result() for future in futures] == list(range(10))
+        handoff.close()
+
+    def test_back_pressure(self):
+        release = threading.Event()
+        handoff = HandoffQueue(1)
+        handoff.submit('first', release.wait)  # running
+        handoff.submit('second', lambda: None)  # queued
+
+        submitted = threading.Event()
+        thread = threading.Thread(target=lambda: handoff.submit('third', lambda: None) and submitted.set())
+        thread.start()
+
+        # the queue is full until the first job finishes
+        assert not submitted.wait(0.2)
+        release.set()
+        assert submitted.wait(5)
+        thread.join()
+        handoff.close()
+        assert handoff.blocked >= 0.2
+
+    def test_errors(self):
+        errors = []
+        handoff = HandoffQueue(2, lambda name, e: errors.append((name, str(e))))
+
+        def fail():
+            raise ValueError("upload failed")
+
+        failed = handoff.submit('first', fail)
+        succeeded = handoff.submit('second', lambda: 'added')
+        handoff.drain()
+
+        # a failed job does not stop the ones after it
+        assert errors == [('first', "upload failed")]
+        assert isinstance(failed.exception(), ValueError)
+        assert succeeded.result() == 'added'
+        handoff.close()
+
+    def test_close_drains(self):
+        done = []
+        handoff = HandoffQueue(5)
+        for i in range(5):
+            handoff.submit(str(i), lambda i=i: time.sleep(0.01) or done.append(i))
+        handoff.close()
+
+        assert done == list(range(5))
+        assert not handoff.thread.is_alive()
+        with self.assertRaises(RuntimeError):
+            handoff.submit('late', lambda: None)
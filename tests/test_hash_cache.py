@@ -0,0 +1,103 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from BitTornado.Application.makemetafile import make_meta_file
+from functions import extract_metadata
+from tests.test_smarthash import PATHS
+from tools.hash_cache import HashCache
+
+
+class HashCacheTests(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.mkdtemp()
+        self.cache = HashCache(os.path.join(self.temp_dir, 'hash_cache.db'))
+
+    def tearDown(self) -> None:
+        self.cache.close()
+        shutil.rmtree(self.temp_dir)
+
+    def test_pieces(self):
+        path = os.path.join(self.temp_dir, 'file.bin')
+        with open(path, 'wb') as f:
+            f.write(b'a' * 100)
+
+        assert self.cache.get_pieces(path, 16, 0) is None
+        self.cache.put_pieces(path, 16, 0, b'x' * 20)
+        assert self.cache.get_pieces(path, 16, 0) == b'x' * 20
+        assert self.cache.get_pieces(path, 16, 4) is None
+
+        # a modified file no longer matches its signature
+        with open(path, 'ab') as f:
+            f.write(b'b')
+        assert self.cache.get_pieces(path, 16, 0) is None
+
+    def test_digests(self):
+        path = PATHS['video_file']
+        assert self.cache.get_digests(path, ['crc32']) is None
+        self.cache.put_digests(path, {'crc32': '01234567', 'md5': 'abc'})
+
+        assert self.cache.get_digests(path, ['md5', 'crc32']) == {'md5': 'abc', 'crc32': '01234567'}
+        assert self.cache.get_digests(path, ['crc32', 'sha1']) is None
+
+    def test_metadata(self):
+        path = PATHS['video_file']
+        parent_dir = os.path.dirname(PATHS['video'])
+
+        assert self.cache.get_metadata(path, parent_dir) == (False, None)
+        self.cache.put_metadata(path, parent_dir, None)
+        assert self.cache.get_metadata(path, parent_dir) == (True, None)
+        assert self.cache.get_metadata(path, PATHS['video']) == (False, None)
+
+    def test_evict(self):
+        path = PATHS['video_file']
+        self.cache.put_pieces(path, 16, 0, b'x' * 20)
+        self.cache.put_pieces(path, 16, 1, b'y' * 20)
+        self.cache.max_size = 30
+
+        self.cache.evict()
+
+        assert self.cache.get_pieces(path, 16, 0) is None
+        assert self.cache.get_pieces(path, 16, 1) == b'y' * 20
+
+    def test_make_meta_file(self):
+        params = {'piece_size_pow2': 15, 'blacklist_file_extensions': [], 'blacklist_path_matches': []}
+        for path in [PATHS['video'], PATHS['audio_bulk']]:
+            uncached = make_meta_file(path, None, params=dict(params))
+            first = make_meta_file(path, None, params=dict(params), cache=self.cache)
+            second = make_meta_file(path, None, params=dict(params), cache=self.cache)
+
+            assert uncached['info']['pieces'] == first['info']['pieces'] == second['info']['pieces']
+        assert self.cache.size() > 0
+
+    def test_make_meta_file_digests(self):
+        params = {'piece_size_pow2': 15, 'blacklist_file_extensions': [], 'blacklist_path_matches': []}
+        path = PATHS['video']
+
+        def hash_files(digests, cache=None):
+            done = {}
+            metainfo = make_meta_file(path, None, params=dict(params), digests=digests, cache=cache,
+                                      filedone=lambda file, file_digests: done.update({tuple(file): file_digests}))
+            return metainfo['info']['pieces'], done
+
+        uncached = hash_files(['crc32', 'md5'])
+        assert hash_files(['crc32', 'md5'], self.cache) == uncached
+
+        # cached digests are used rather than computed again
+        self.cache.put_digests(PATHS['video_file'], {'crc32': 'cached'})
+        pieces, done = hash_files(['crc32'], self.cache)
+        assert pieces == uncached[0]
+        assert done[('example-mp4-file-small.mp4',)] == {'crc32': 'cached'}
+        assert done[('video.nfo',)] == {'crc32': uncached[1][('video.nfo',)]['crc32']}
+
+        # a digest that is not cached yet is computed by reading the whole file again
+        assert hash_files(['sha1'], self.cache) == hash_files(['sha1'])
+
+    def test_extract_metadata(self):
+        expected = json.dumps(extract_metadata(PATHS['video']))
+
+        assert expected == json.dumps(extract_metadata(PATHS['video'], self.cache))
+        assert expected == json.dumps(extract_metadata(PATHS['video'], self.cache))
@@ -0,0 +1,76 @@
+import threading
+import unittest
+
+import requests
+from mockito import when, ANY, unstub
+
+from functions import import_requests
+from tests.fake_clients import FakeTracker
+from tools.http_pool import HttpPool
+
+
+class HttpPoolTests(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.tracker = FakeTracker()
+        self.url = f"http://127.0.0.1:{self.tracker.port}"
+        self.pool = HttpPool(2, 0.5, 4, import_requests)
+
+    def tearDown(self) -> None:
+        self.pool.close()
+        self.tracker.close()
+        unstub()
+
+    def test_keep_alive(self):
+        for i in range(5):
+            assert self.pool.request('POST', f"{self.url}/upload/{i}", data=b'x').status_code == 200
+
+        assert self.tracker.connections == 1
+        assert self.pool.session(self.url + '/other') is self.pool.session(self.url.upper())
+
+    def test_cookies(self):
+        self.pool.request('GET', f"{self.url}/login")
+
+        # a cookie set by one request is not sent with the next, as each used to be sent with its own session
+        assert 'cookie' not in self.pool.request('GET', f"{self.url}/upload").json()
+        assert self.pool.request('GET', f"{self.url}/upload", cookies={'key': 'value'}).json()['cookie'] == 'key=value'
+
+    def test_bounded_concurrency(self):
+        self.tracker.latency = 0.1
+        threads = [threading.Thread(target=self.pool.request, args=('GET', f"{self.url}/{i}")) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # no more connections are opened than requests allowed at once
+        assert len(self.tracker.requests) == 8
+        assert self.tracker.connections <= 2
+
+    def test_retry(self):
+        delays = []
+        when(self.pool).backoff(ANY).thenAnswer(lambda attempt: delays.append(attempt) or 0)
+        self.tracker.drop(2)
+
+        assert self.pool.request('GET', self.url + '/status').json()['path'] == '/status'
+        assert delays == [1, 2]
+        stats = self.pool.metrics[self.pool.host(self.url)].summary()
+        assert (stats['requests'], stats['failures'], stats['retries']) == (1, 2, 2)
+
+    def test_max_attempts(self):
+        when(self.pool).backoff(ANY).thenReturn(0)
+        self.tracker.drop(3)
+
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            self.pool.request('GET', self.url, max_attempts=3)
+        assert self.pool.metrics[self.pool.host(self.url)].summary()['retries'] == 2
+
+    def test_backoff(self):
+        for attempt, interval in [(1, 0.5), (2, 1), (3, 2), (4, 4), (10, 4)]:
+            delay = self.pool.backoff(attempt)
+            assert interval / 2 <= delay <= interval
+
+    def test_summary(self):
+        assert self.pool.summary() is None
+        self.pool.request('GET', self.url)
+        assert self.pool.summary().startswith(f"{self.url}: 1 requests, mean ")
@@ -0,0 +1,68 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from mockito import when, unstub
+
+from tools.imdb_cache import ImdbCache
+
+
+class ImdbCacheTests(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.temp_dir, 'imdb_cache.db')
+        self.cache = ImdbCache(self.path, ttl=100, negative_ttl=10)
+
+    def tearDown(self) -> None:
+        self.cache.close()
+        shutil.rmtree(self.temp_dir)
+        unstub()
+
+    def test_put(self):
+        assert self.cache.get('1234567') == (False, None)
+        self.cache.put('1234567', '1234567', 'Example')
+        self.cache.put('0000000', None, None)
+
+        assert self.cache.get('1234567') == (True, ('1234567', 'Example'))
+        assert self.cache.get('0000000') == (True, None)
+
+    def test_redirect(self):
+        self.cache.put('7654321', '1234567', 'Example')
+
+        assert self.cache.get('7654321') == (True, ('1234567', 'Example'))
+        assert self.cache.get('1234567') == (True, ('1234567', 'Example'))
+
+    def test_persistent(self):
+        self.cache.put('1234567', '1234567', 'Example')
+
+        other = ImdbCache(self.path, ttl=100, negative_ttl=10)
+        assert other.get('1234567') == (True, ('1234567', 'Example'))
+        other.close()
+
+    def test_ttl(self):
+        now = time.time()
+        self.cache.put('1234567', '1234567', 'Example')
+        self.cache.put('0000000', None, None)
+
+        # invalid IDs expire first
+        when(time).time().thenReturn(now + 50)
+        assert self.cache.get('1234567')[0]
+        assert not self.cache.get('0000000')[0]
+
+        when(time).time().thenReturn(now + 150)
+        assert not self.cache.get('1234567')[0]
+
+        self.cache.evict()
+        assert self.cache.execute("SELECT COUNT(*) FROM lookups")[0][0] == 0
+
+    def test_disabled(self):
+        cache = ImdbCache(self.path, ttl=0, negative_ttl=0)
+        cache.put('1234567', '1234567', 'Example')
+        cache.put('0000000', None, None)
+
+        assert cache.get('1234567') == (False, None)
+        assert cache.get('0000000') == (False, None)
+        cache.close()
@@ -0,0 +1,86 @@
+import json
+import os
+import unittest
+from collections import OrderedDict
+
+from tools import info_codec
+from tools.info_codec import Decoder, InfoCodecError
+from tests.test_smarthash import FIXTURES_ROOT
+
+
+def fixture_infos(count: int) -> OrderedDict:
+    """smarthash_info of count copies of the video fixture, as if they were files of one torrent"""
+    with open(os.path.join(FIXTURES_ROOT, 'metadata', 'example-mp4-file-small.json')) as f:
+        _, _, infos = json.load(f, object_pairs_hook=OrderedDict)
+    info = next(iter(infos.values()))
+    return OrderedDict((f"video_1\\episode {i}.mp4", json.loads(json.dumps(info), object_pairs_hook=OrderedDict))
+                       for i in range(count))
+
+
+def whitelisted(info: OrderedDict) -> OrderedDict:
+    info = OrderedDict(info)
+    info['mediainfo'] = [OrderedDict((key, value) for key, value in track.items()
+                                     if key in info_codec.MEDIAINFO_FIELDS) for track in info['mediainfo']]
+    return info
+
+
+class InfoCodecTests(unittest.TestCase):
+
+    def test_round_trip(self):
+        infos = fixture_infos(10)
+        for i, info in enumerate(infos.values()):
+            info['mediainfo'][0]['complete_name'] = f"episode {i}.mp4"
+
+        for compress in [False, True]:
+            header, payloads = info_codec.encode(infos, compress)
+            decoder = Decoder(header)
+            for file, info in infos.items():
+                assert decoder.decode(payloads[file]) == whitelisted(info)
+                assert info_codec.decode(header, payloads[file]) == whitelisted(info)
+
+    def test_smaller(self):
+        infos = fixture_infos(20)
+        plain = sum(len(json.dumps(info)) for info in infos.values())
+
+        header, payloads = info_codec.encode(infos)
+        compact = len(header) + sum(len(payload) for payload in payloads.values())
+        header, payloads = info_codec.encode(infos, compress=True)
+        compressed = len(header) + sum(len(payload) for payload in payloads.values())
+
+        assert compressed < compact < plain / 4
+
+    def test_mixed_values(self):
+        infos = OrderedDict([
+            ('a', OrderedDict([('mime_type', 'audio/mpeg'), ('tags', {'TIT2': ['Title'], '': ['empty key']}),
+                               ('nested', [[1, 2], [], {}]), ('length', 1.5), ('none', None)])),
+            ('b', OrderedDict([('mime_type', 'audio/mpeg'), ('tags', {'TIT2': ['Other']})])),
+        ])
+        header, payloads = info_codec.encode(infos)
+        assert Decoder(header).decode(payloads['a']) == infos['a']
+        assert Decoder(header).decode(payloads['b']) == infos['b']
+
+    def test_version(self):
+        header, payloads = info_codec.encode(fixture_infos(1))
+        newer = json.loads(header)
+        newer['version'] = info_codec.FORMAT_VERSION + 1
+
+        with self.assertRaises(InfoCodecError):
+            Decoder(json.dumps(newer))
+        with self.assertRaises(InfoCodecError):
+            Decoder('{')
+
+    def test_decode_files(self):
+        infos = fixture_infos(2)
+        info = {'files': [{'path': ['episode 0.mp4']}, {'path': ['episode 1.mp4']}, {'path': ['episode.nfo']}]}
+
+        # plain JSON is decoded as it is
+        for file in info['files'][:2]:
+            file['smarthash_info'] = json.dumps(infos[f"video_1\\{file['path'][0]}"])
+        assert list(info_codec.decode_files(info).values()) == list(infos.values())
+
+        plain, encoded = info_codec.encode_files(info, infos, lambda file: f"video_1\\{file['path'][0]}", True)
+        assert 'smarthash_info_format' in info
+        assert encoded < plain
+        decoded = info_codec.decode_files(info)
+        assert list(decoded) == [('episode 0.mp4',), ('episode 1.mp4',)]
+        assert list(decoded.values()) == [whitelisted(file_info) for file_info in infos.values()]
@@ -0,0 +1,121 @@
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import time
+import unittest
+
+from mockito import when, unstub
+
+from tools.job_queue import JobQueue, JobQueueServer
+from tools.process_lock import ProcessLock
+
+
+class JobQueueTests(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.root = tempfile.mkdtemp()
+        self.path = os.path.join(self.root, 'queue.sock')
+        self.server = JobQueueServer(self.path, {'analyse': 2, 'submit': 1})
+        assert self.server.bind()
+        self.thread = threading.Thread(target=self.server.serve)
+        self.thread.start()
+        self.granted = []
+
+    def tearDown(self) -> None:
+        self.server.stop()
+        self.thread.join()
+        shutil.rmtree(self.root)
+        unstub()
+
+    def client(self, priority: int = 0) -> JobQueue:
+        job_queue = JobQueue(priority, self.path)
+        assert job_queue.connect()
+        return job_queue
+
+    def acquire_later(self, job_queue: JobQueue, stage: str, name: str) -> threading.Thread:
+        """Acquire from another thread, waiting until the server has queued the job"""
+        def acquire() -> None:
+            job_queue.acquire(stage, name)
+            self.granted.append(name)
+
+        thread = threading.Thread(target=acquire)
+        thread.start()
+        while name not in JobQueue(path=self.path).status()[stage]['queued']:
+            time.sleep(0.01)
+        return thread
+
+    def test_fifo(self):
+        first = self.client()
+        first.acquire('submit', 'first')
+        clients = [self.client() for _ in range(3)]
+        threads = [self.acquire_later(job_queue, 'submit', name)
+                   for job_queue, name in zip(clients, ['second', 'third', 'fourth'])]
+
+        status = first.status()['submit']
+        assert status['running'] == ['first']
+        assert status['queued'] == ['second', 'third', 'fourth']
+
+        first.release()
+        for job_queue, thread in zip(clients, threads):
+            thread.join()
+            job_queue.release()
+        assert self.granted == ['second', 'third', 'fourth']
+        assert first.status()['submit']['granted'] == 4
+
+    def test_priority(self):
+        first = self.client()
+        first.acquire('submit', 'first')
+        low, high = self.client(), self.client(priority=5)
+        threads = [self.acquire_later(low, 'submit', 'low'), self.acquire_later(high, 'submit', 'high')]
+
+        first.release()
+        threads[1].join()
+        high.release()
+        threads[0].join()
+        assert self.granted == ['high', 'low']
+
+    def test_concurrency(self):
+        clients = [self.client() for _ in range(3)]
+        clients[0].acquire('analyse', 'first')
+        clients[1].acquire('analyse', 'second')
+        thread = self.acquire_later(clients[2], 'analyse', 'third')
+
+        status = clients[0].status()['analyse']
+        assert status['running'] == ['first', 'second']
+        assert status['queued'] == ['third']
+
+        # each stage is queued separately
+        self.client().acquire('submit', 'other')
+
+        clients[1].release()
+        thread.join()
+        assert self.granted == ['third']
+
+    def test_release_on_disconnect(self):
+        first, second = self.client(), self.client()
+        first.acquire('submit', 'first')
+        thread = self.acquire_later(second, 'submit', 'second')
+
+        first.close()
+        thread.join()
+        assert self.granted == ['second']
+        assert second.status()['submit']['max_wait'] > 0
+
+    def test_fallback(self):
+        job_queue = JobQueue(path=os.path.join(self.root, 'missing.sock'))
+        when(job_queue).connect().thenReturn(False)
+        when(ProcessLock).acquire().thenReturn(None)
+        when(ProcessLock).release().thenReturn(None)
+
+        with job_queue.stage('submit', 'job'):
+            assert isinstance(job_queue.fallback, ProcessLock)
+
+    def test_second_server(self):
+        server = JobQueueServer(self.path, {})
+        assert not server.bind()
+        # the running server is unaffected
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(self.path)
+        sock.close()
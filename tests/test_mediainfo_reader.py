@@ -0,0 +1,44 @@
+import unittest
+
+from mockito import when, unstub
+from pymediainfo import MediaInfo
+
+from tests.test_smarthash import PATHS
+from tools.mediainfo_reader import MediaInfoReader
+
+
+class MediaInfoReaderTests(unittest.TestCase):
+
+    def tearDown(self) -> None:
+        unstub()
+
+    def test_parse_many(self):
+        paths = [PATHS['video_file'], PATHS['audio_1_file'], PATHS['video_file']]
+        expected = [[track.to_data() for track in MediaInfo.parse(path).tracks] for path in paths]
+
+        reader = MediaInfoReader(threads=2)
+        try:
+            for _ in range(2):
+                actual = [[track.to_data() for track in media_info.tracks] for media_info in reader.parse_many(paths)]
+                assert expected == actual
+        finally:
+            reader.close()
+
+    def test_parse_missing_file(self):
+        reader = MediaInfoReader()
+        with self.assertRaises(FileNotFoundError):
+            reader.parse(PATHS['video_file'] + '.missing')
+        reader.close()
+
+    def test_parse_fallback(self):
+        media_info = MediaInfo.parse(PATHS['video_file'])
+
+        # other versions of pymediainfo return a different tuple from the private _get_library
+        when(MediaInfo)._get_library().thenReturn((None, None, '0.7'))
+        when(MediaInfo).parse(PATHS['video_file']).thenReturn(media_info)
+
+        reader = MediaInfoReader()
+        try:
+            assert reader.parse(PATHS['video_file']) is media_info
+        finally:
+            reader.close()
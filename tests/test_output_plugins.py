@@ -0,0 +1,65 @@
+import unittest
+from typing import List
+
+from BitTornado.Meta.bencode import bencode
+from OutputPlugins.deluge import Deluge
+from OutputPlugins.qbittorrent import QBittorrent
+from OutputPlugins.transmission import Transmission
+from pluginmixin import PluginOutput
+from tests.fake_clients import FakeDeluge, FakeQBittorrent, FakeTransmission
+
+
+def torrents(count: int) -> List[PluginOutput]:
+    return [PluginOutput(bencode({'info': {'name': f"item {i}", 'length': i, 'piece length': 16384,
+                                           'pieces': bytes(20)}})) for i in range(count)]
+
+
+class OutputPluginTests(unittest.TestCase):
+
+    def check_session(self, fake, plugin, batched: bool):
+        """Torrents are added through one login, which is renewed once it expires"""
+        items = torrents(4)
+        plugin.handle(items[0], '/data')
+        plugin.handle(items[1], '/data')
+        assert fake.logins == 1
+
+        fake.expire_sessions()
+        assert plugin.handle_batch([(items[2], '/data'), (items[3], '/data')]) == [None, None]
+        assert fake.logins == 2
+
+        expected = [[items[0]], [items[1]]] + ([items[2:]] if batched else [[items[2]], [items[3]]])
+        assert fake.added == [[output.torrent_data for output in call] for call in expected]
+
+    def test_qbittorrent(self):
+        fake = FakeQBittorrent()
+        plugin = QBittorrent({'host': '127.0.0.1', 'port': str(fake.port), 'username': fake.username,
+                              'password': fake.password})
+        self.check_session(fake, plugin, batched=True)
+
+        plugin.close()
+        assert not fake.sessions
+        fake.close()
+
+    def test_deluge(self):
+        fake = FakeDeluge()
+        plugin = Deluge({'host': '127.0.0.1', 'port': str(fake.port), 'password': fake.password})
+        self.check_session(fake, plugin, batched=True)
+
+        plugin.close()
+        fake.close()
+
+    def test_transmission(self):
+        fake = FakeTransmission()
+        plugin = Transmission({'host': '127.0.0.1', 'port': str(fake.port), 'username': fake.username,
+                               'password': fake.password})
+        # Transmission adds one torrent per call
+        self.check_session(fake, plugin, batched=False)
+        fake.close()
+
+    def test_batch_errors(self):
+        fake = FakeDeluge()
+        plugin = Deluge({'host': '127.0.0.1', 'port': str(fake.port), 'password': fake.password})
+        fake.close()
+
+        errors = plugin.handle_batch([(output, '/data') for output in torrents(2)])
+        assert [e.error for e in errors] == ["Failed to connect to deluge: ConnectionError"] * 2
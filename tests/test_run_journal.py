@@ -0,0 +1,78 @@
+import os
+import shutil
+import tempfile
+import unittest
+from collections import OrderedDict
+
+from pluginmixin import PluginOutput
+from tools.run_journal import ItemState, RunJournal
+
+
+class RunJournalTests(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.temp_dir, 'run_journal.db')
+        self.journal = RunJournal('default:/bulk', self.path)
+        self.journal.start(['/bulk/a', '/bulk/b'])
+
+    def tearDown(self) -> None:
+        self.journal.close()
+        shutil.rmtree(self.temp_dir)
+
+    def test_stages(self):
+        assert self.journal.state('/bulk/a') == ItemState.QUEUED
+        assert self.journal.load_metadata('/bulk/a') is None
+        assert self.journal.load_analysis('/bulk/a') is None
+
+        info = OrderedDict([('a/file.mkv', OrderedDict([('mime_type', 'video/x-matroska')]))])
+        self.journal.save_metadata('/bulk/a', 100, 2.5, info)
+        assert self.journal.load_metadata('/bulk/a') == (100, 2.5, info)
+
+        data = {
+            'args': object(),
+            'path': '/bulk/a',
+            'smarthash_info': info,
+            'extracted_images': [[b'1', b'2'], [], [b'3']],
+            'torrent_file': b'torrent',
+        }
+        self.journal.save_analysis('/bulk/a', data)
+        assert self.journal.state('/bulk/a') == ItemState.HASHED
+        assert self.journal.load_analysis('/bulk/a') == {key: value for key, value in data.items() if key != 'args'}
+        assert self.journal.load_output('/bulk/a') is None
+
+        self.journal.save_output('/bulk/a', PluginOutput(None))
+        assert self.journal.load_output('/bulk/a').torrent_data is None
+
+        self.journal.advance('/bulk/a', ItemState.DONE)
+        assert self.journal.execute("SELECT COUNT(*) FROM artifacts")[0][0] == 0
+        assert self.journal.summary() == {ItemState.QUEUED: 1, ItemState.DONE: 1}
+
+    def test_failures(self):
+        self.journal.save_output('/bulk/b', PluginOutput(b'torrent'))
+        self.journal.fail('/bulk/b', "client unavailable")
+        self.journal.fail('/bulk/a', "server error")
+
+        assert self.journal.state('/bulk/b') == ItemState.UPLOADED
+        assert self.journal.failures() == [('/bulk/a', "server error"), ('/bulk/b', "client unavailable")]
+
+        # completing a stage clears the error
+        self.journal.advance('/bulk/b', ItemState.DONE)
+        assert self.journal.failures() == [('/bulk/a', "server error")]
+
+    def test_resume(self):
+        self.journal.advance('/bulk/a', ItemState.DONE)
+        self.journal.save_output('/bulk/b', PluginOutput(b'torrent'))
+
+        resumed = RunJournal('default:/bulk', self.path)
+        resumed.start(['/bulk/a', '/bulk/b', '/bulk/c'], resume=True)
+        assert resumed.state('/bulk/a') == ItemState.DONE
+        assert resumed.load_output('/bulk/b').torrent_data == b'torrent'
+        assert resumed.state('/bulk/c') == ItemState.QUEUED
+
+        # other runs are kept separate, and a new run starts over
+        assert RunJournal('save:/bulk', self.path).state('/bulk/a') == ItemState.QUEUED
+        resumed.start(['/bulk/a', '/bulk/b'])
+        assert resumed.summary() == {ItemState.QUEUED: 2}
+        assert resumed.execute("SELECT COUNT(*) FROM artifacts")[0][0] == 0
+        resumed.close()
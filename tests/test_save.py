@@ -7,13 +7,14 @@ from mockito import unstub, when, ANY
 from smarthash import SmartHash
 from tests.MockFile import MockFile
 from tests.compare_torrents import compare_torrents
-from tests.test_smarthash import FIXTURES_ROOT, PATHS
+from tests.test_smarthash import FIXTURES_ROOT, PATHS, use_temp_stores
 
 
 class SavePluginTests(unittest.TestCase):
 
     def setUp(self) -> None:
         del sys.argv[1:]
+        use_temp_stores(self)
 
     def tearDown(self) -> None:
         MockFile.reset()
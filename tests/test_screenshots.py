@@ -0,0 +1,28 @@
+import unittest
+
+# noinspection PyPackageRequirements
+import cv2
+import numpy
+
+from tests.test_smarthash import PATHS
+from tools.screenshots import extract_screenshots
+
+
+class ScreenshotTests(unittest.TestCase):
+
+    def test_extract_screenshots(self):
+        progress = []
+        images = extract_screenshots(PATHS['video_file'], 4, 18, lambda: progress.append(None))
+
+        assert len(progress) == 18
+        assert len(images) == len(set(images)) == 4
+        for image in images:
+            frame = cv2.imdecode(numpy.frombuffer(image, numpy.uint8), cv2.IMREAD_COLOR)
+            assert frame.shape == (240, 320, 3)
+
+    def test_extract_screenshots_missing_file(self):
+        progress = []
+        images = extract_screenshots(PATHS['video_file'] + '.missing', 4, 18, lambda: progress.append(None))
+
+        assert images == []
+        assert len(progress) == 18
@@ -0,0 +1,73 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from tools.skip_cache import SkipCache
+
+
+class SkipCacheTests(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.temp_dir, 'skip_cache.db')
+        self.cache = SkipCache(self.path)
+
+    def tearDown(self) -> None:
+        self.cache.close()
+        shutil.rmtree(self.temp_dir)
+
+    def test_add(self):
+        assert not self.cache.in_cache('plugin', '/some/path')
+        self.cache.add('plugin', '/some/path')
+        self.cache.add('plugin', '/some/path')
+        assert self.cache.in_cache('plugin', '/some/path')
+        assert not self.cache.in_cache('other', '/some/path')
+        assert self.cache.execute("SELECT COUNT(*) FROM skipped")[0][0] == 1
+
+    def test_concurrent_instances(self):
+        other = SkipCache(self.path)
+        other.add('plugin', '/some/path')
+        assert self.cache.in_cache('plugin', '/some/path')
+        other.close()
+
+    def test_disable(self):
+        self.cache.add('plugin', '/some/path')
+        self.cache.disable()
+        self.cache.add('plugin', '/other/path')
+        assert not self.cache.in_cache('plugin', '/some/path')
+        self.cache.save()
+
+        self.cache.disabled = False
+        assert not self.cache.in_cache('plugin', '/other/path')
+
+    def test_migrate(self):
+        json_path = os.path.join(self.temp_dir, 'skip_cache.json')
+        with open(json_path, 'w') as f:
+            f.write(json.dumps({'plugin': ['/first', '/second'], 'other': ['/first']}))
+
+        cache = SkipCache(self.path)
+        assert cache.in_cache('plugin', '/first')
+        assert cache.in_cache('plugin', '/second')
+        assert cache.in_cache('other', '/first')
+        assert not cache.in_cache('other', '/second')
+        assert not os.path.exists(json_path)
+        assert os.path.exists(json_path + '.migrated')
+        cache.close()
+
+    def test_migrate_corrupt(self):
+        json_path = os.path.join(self.temp_dir, 'skip_cache.json')
+        with open(json_path, 'w') as f:
+            f.write('{')
+
+        SkipCache(self.path).close()
+        assert os.path.exists(json_path)
+
+    def test_save_compacts(self):
+        self.cache.execute_many("INSERT INTO skipped VALUES (?, ?)", [('plugin', f'/{i:05}' * 20) for i in range(5000)])
+        self.cache.execute("DELETE FROM skipped")
+        assert self.cache.execute("PRAGMA freelist_count")[0][0] > 0
+
+        self.cache.save()
+        assert self.cache.execute("PRAGMA freelist_count")[0][0] == 0
@@ -1,14 +1,30 @@
+import collections
 import os
+import shutil
 import sys
+import tempfile
+import threading
 import unittest
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
 
 from mockito import when, verify, ANY, unstub
 
 import baseplugin
+import config
+import smarthash as smarthash_module
 from Plugins.default import SmarthashPlugin as DefaultPlugin
-from functions import BulkMode
+from BitTornado.Meta.bencode import bdecode
+from functions import BulkMode, PluginError, ValidationError, extract_metadata
 from pluginmixin import PluginOutput
 from smarthash import SmartHash
+from tools import info_codec, job_queue
+from tools.hash_cache import HashCache
+from tools.imdb_cache import ImdbCache
+from tools.job_queue import JobQueue, JobQueueServer
+from tools.run_journal import ItemState, RunJournal
+from tools.skip_cache import SkipCache
+from tools.stage_timer import StageTimer
 
 FIXTURES_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'fixtures'))
 
@@ -24,10 +40,40 @@ PATHS = {
 }
 
 
+def use_temp_stores(test: unittest.TestCase) -> str:
+    """
+    Create the SQLite stores in a temporary directory for the duration of a test, rather than alongside config.py, so
+    that tests neither reuse the caches of earlier runs nor leave databases behind. The job queue socket is also in
+    the directory, so that tests do not queue behind real smarthash runs, and its server runs in a thread of the test
+    process, which is stopped afterwards, rather than as a background process. The stubs are removed by unstub()
+    :return: the directory
+    """
+    temp_dir = tempfile.mkdtemp()
+    test.addCleanup(shutil.rmtree, temp_dir, True)
+    for store in [HashCache, ImdbCache, RunJournal, SkipCache]:
+        when(store).default_path().thenReturn(os.path.join(temp_dir, store.filename))
+
+    socket_path = os.path.join(temp_dir, 'queue.sock')
+    when(job_queue).default_socket_path().thenReturn(socket_path)
+
+    def spawn() -> bool:
+        server = JobQueueServer(socket_path, config.job_queue_stages)
+        if server.bind():
+            thread = threading.Thread(target=server.serve)
+            thread.start()
+            test.addCleanup(thread.join)
+            test.addCleanup(server.stop)
+        return True
+
+    when(JobQueue).spawn().thenAnswer(spawn)
+    return temp_dir
+
+
 class SmartHashTests(unittest.TestCase):
 
     def setUp(self) -> None:
         del sys.argv[1:]
+        self.temp_dir = use_temp_stores(self)
 
     def tearDown(self) -> None:
         unstub()
@@ -40,6 +86,22 @@ class SmartHashTests(unittest.TestCase):
         assert smarthash.args.plugin == 'default'
         assert smarthash.args.path == PATHS['video']
 
+    def test_init_skip_cache(self):
+        skip_cache_path = os.path.join(self.temp_dir, SkipCache.filename)
+
+        sys.argv.append('--version')
+        with self.assertRaises(SystemExit):
+            SmartHash()
+        assert not os.path.exists(skip_cache_path)
+
+        sys.argv[1:] = [PATHS['video'], '--disable-skip-cache']
+        assert SmartHash().skip_cache is None
+        assert not os.path.exists(skip_cache_path)
+
+        sys.argv[1:] = [PATHS['video']]
+        assert SmartHash().skip_cache is not None
+        assert os.path.exists(skip_cache_path)
+
     def test_process_invalid_dir(self):
         params = [
             os.path.join(FIXTURES_ROOT, 'nonexistent_path'),
@@ -59,8 +121,10 @@ class SmartHashTests(unittest.TestCase):
         smarthash = SmartHash()
 
         when(smarthash).process_folder_wrapper(ANY).thenReturn(None)
+        when(smarthash_module.functions.media_info_reader).close().thenReturn(None)
         smarthash.process()
         verify(smarthash, times=1).process_folder_wrapper(params[0])
+        verify(smarthash_module.functions.media_info_reader, times=1).close()
 
     def test_process_bulk(self):
         params = [
@@ -95,6 +159,236 @@ class SmartHashTests(unittest.TestCase):
         verify(smarthash, times=1).process_folder_wrapper(PATHS['audio_2'])
         verify(smarthash, times=2).process_folder_wrapper(ANY)
 
+    def test_process_watch(self):
+        params = [
+            '--watch',
+            '--watch-settle-time',
+            '0',
+            '--watch-interval',
+            '1',
+            PATHS['video_bulk'],
+        ]
+        sys.argv.extend(params)
+
+        smarthash = SmartHash()
+
+        # existing items are processed once they are found to be stable, then the daemon is interrupted
+        when(smarthash).process_folder_wrapper(ANY).thenRaise(KeyboardInterrupt)
+
+        smarthash.process()
+        verify(smarthash, times=1).process_folder_wrapper(PATHS['video'])
+
+    def test_process_watch_retry(self):
+        params = [
+            '--watch',
+            '--watch-settle-time',
+            '0',
+            '--watch-interval',
+            '0',
+            '--watch-retry-interval',
+            '0',
+            PATHS['video_bulk'],
+        ]
+        sys.argv.extend(params)
+
+        smarthash = SmartHash()
+        attempts = []
+
+        def process_folder_wrapper(path: str) -> None:
+            attempts.append(path)
+            if len(attempts) == 1:
+                smarthash.record_failure(path, "Server error [503]")
+
+        # an item that fails is watched again, and processed once more when its retry delay has passed. The daemon is
+        # interrupted once it succeeds
+        when(smarthash).process_folder_wrapper(ANY).thenAnswer(process_folder_wrapper)
+        when(smarthash_module.FolderWatcher).succeeded(PATHS['video']).thenRaise(KeyboardInterrupt)
+
+        smarthash.process()
+        assert attempts == [PATHS['video'], PATHS['video']]
+
+    def test_process_watch_skip_cached(self):
+        params = [
+            '--watch',
+            '--watch-settle-time',
+            '0',
+            '--watch-interval',
+            '0',
+            '--watch-retry-interval',
+            '0',
+            PATHS['video_bulk'],
+        ]
+        sys.argv.extend(params)
+
+        smarthash = SmartHash()
+        attempts = []
+
+        def process_folder_wrapper(path: str) -> None:
+            attempts.append(path)
+            smarthash.skip_cache.add(smarthash.args.plugin, path)
+            smarthash.record_failure(path, "Failed: client unavailable")
+
+        # an item that failed after being added to the skip cache would only be skipped, so it is not retried
+        when(smarthash).process_folder_wrapper(ANY).thenAnswer(process_folder_wrapper)
+        when(smarthash_module.FolderWatcher).succeeded(PATHS['video']).thenRaise(KeyboardInterrupt)
+
+        smarthash.process()
+        assert attempts == [PATHS['video']]
+
+    def test_process_bulk_jobs(self):
+        params = [
+            '--bulk',
+            '--jobs',
+            '2',
+            '--disable-skip-cache',
+            PATHS['audio_bulk'],
+        ]
+        sys.argv.extend(params)
+
+        smarthash = SmartHash()
+        plugin = DefaultPlugin()
+        smarthash.plugins['default'] = plugin
+        handled = []
+
+        when(baseplugin.BasePlugin).get_bulk_mode(ANY).thenReturn(BulkMode.MUSIC)
+        when(plugin).handle(ANY).thenAnswer(lambda data: handled.append(data['path']) or PluginOutput(None))
+
+        # the worker processes queue on the server started by this process
+        assert smarthash.job_queue.connect()
+        smarthash.process()
+
+        # items are analysed in parallel, but handed to the plugin in order
+        assert handled == [PATHS['audio_1'], PATHS['audio_2']]
+        # each worker took the analyse stage, as process_folder does
+        assert smarthash.job_queue.status()['analyse']['granted'] == 2
+
+    def test_requeue_unfinished(self):
+        analysed, lost, queued = Future(), Future(), Future()
+        analysed.set_result(({}, StageTimer()))
+        lost.set_exception(BrokenProcessPool())
+        pending = collections.deque([('analysed', analysed), ('lost', lost), ('queued', queued)])
+        submitted = []
+
+        def submit(path: str) -> Future:
+            submitted.append(path)
+            return Future()
+
+        requeued = smarthash_module.requeue_unfinished(pending, submit)
+
+        # only the items lost with the pool are analysed again, in their original order
+        assert submitted == ['lost', 'queued']
+        assert [path for path, _ in requeued] == ['analysed', 'lost', 'queued']
+        assert requeued[0][1] is analysed
+
+    def test_bulk_worker(self):
+        sys.argv.extend([PATHS['video']])
+        smarthash = SmartHash()
+
+        worker = smarthash_module.BulkWorker(smarthash.args, 'default', {}, None)
+
+        # workers start from the same attributes as SmartHash, apart from those passed in
+        assert set(vars(smarthash)) <= set(vars(worker))
+        assert worker.args is smarthash.args
+        assert worker.skip_cache is None and worker.journal is None
+
+    def test_process_bulk_resume(self):
+        params = [
+            '--bulk',
+            '--disable-skip-cache',
+            PATHS['video_bulk'],
+        ]
+        sys.argv.extend(params)
+
+        # runs are journaled in the temporary directory from setUp, not the run_journal.db alongside config.py
+        journal_path = os.path.join(self.temp_dir, RunJournal.filename)
+
+        smarthash = SmartHash()
+        plugin = DefaultPlugin()
+        smarthash.plugins['default'] = plugin
+
+        when(plugin).handle(ANY).thenReturn(PluginOutput(b'torrent'))
+        when(smarthash.output_plugin).handle(ANY, ANY).thenRaise(PluginError("client unavailable"))
+
+        smarthash.process()
+        assert smarthash.journal.state(PATHS['video']) == ItemState.UPLOADED
+        journal = RunJournal(smarthash.journal.run, journal_path)
+        assert journal.state(PATHS['video']) == ItemState.UPLOADED
+        journal.close()
+
+        # the resumed run only hands the plugin's output to the client
+        sys.argv.insert(1, '--resume')
+        smarthash = SmartHash()
+        plugin = DefaultPlugin()
+        smarthash.plugins['default'] = plugin
+        handed = []
+
+        when(plugin).handle(ANY).thenReturn(PluginOutput(b'other'))
+        when(smarthash.output_plugin).handle(ANY, ANY).thenAnswer(lambda output, path: handed.append(output))
+
+        smarthash.process()
+        verify(plugin, times=0).handle(ANY)
+        assert [output.torrent_data for output in handed] == [b'torrent']
+        assert smarthash.journal.state(PATHS['video']) == ItemState.DONE
+
+    def test_process_bulk_output_batch(self):
+        params = [
+            '--bulk',
+            '--output-batch-size',
+            '2',
+            '--disable-skip-cache',
+            PATHS['audio_bulk'],
+        ]
+        sys.argv.extend(params)
+
+        smarthash = SmartHash()
+        plugin = DefaultPlugin()
+        smarthash.plugins['default'] = plugin
+        batches = []
+
+        when(baseplugin.BasePlugin).get_bulk_mode(ANY).thenReturn(BulkMode.MUSIC)
+        when(plugin).handle(ANY).thenAnswer(lambda data: PluginOutput(data['path'].encode()))
+        when(smarthash.output_plugin).handle_batch(ANY).thenAnswer(
+            lambda items: batches.append(items) or [None] * len(items))
+
+        smarthash.process()
+
+        # both items are handed to the output plugin in one call
+        assert [[(output.torrent_data, path) for output, path in batch] for batch in batches] == \
+            [[(PATHS['audio_1'].encode(), PATHS['audio_bulk']), (PATHS['audio_2'].encode(), PATHS['audio_bulk'])]]
+        assert smarthash.journal.summary() == {ItemState.DONE: 2}
+
+    def test_process_bulk_handoff(self):
+        params = [
+            '--bulk',
+            '--handoff-queue',
+            '1',
+            '--disable-skip-cache',
+            PATHS['audio_bulk'],
+        ]
+        sys.argv.extend(params)
+
+        smarthash = SmartHash()
+        plugin = DefaultPlugin()
+        smarthash.plugins['default'] = plugin
+        handled = []
+
+        def handle(data):
+            handled.append((data['path'], threading.current_thread().name))
+            if data['path'] == PATHS['audio_1']:
+                raise PluginError("upload failed")
+            return PluginOutput(b'torrent')
+
+        when(baseplugin.BasePlugin).get_bulk_mode(ANY).thenReturn(BulkMode.MUSIC)
+        when(plugin).handle(ANY).thenAnswer(handle)
+
+        smarthash.process()
+
+        # items are uploaded in order on the hand-off thread, and a failed upload does not stop the next one
+        assert handled == [(PATHS['audio_1'], 'handoff'), (PATHS['audio_2'], 'handoff')]
+        assert smarthash.journal.failures() == [(PATHS['audio_1'], "upload failed")]
+        assert smarthash.journal.state(PATHS['audio_2']) == ItemState.DONE
+        assert smarthash.handoff is None
+
     def test_process_folder(self):
         params = [
             '--plugin',
@@ -113,6 +407,97 @@ class SmartHashTests(unittest.TestCase):
 
         verify(plugin, times=1).handle(ANY)
 
+    def test_process_folder_compact_info(self):
+        params = [
+            '--info-encoding',
+            'compact-zlib',
+            PATHS['audio_bulk'],
+        ]
+        sys.argv.extend(params)
+
+        smarthash = SmartHash()
+        plugin = DefaultPlugin()
+        smarthash.plugins['default'] = plugin
+        torrents = []
+
+        when(plugin).handle(ANY).thenAnswer(lambda data: torrents.append(data['torrent_file']) or PluginOutput(None))
+
+        smarthash.process_folder(PATHS['audio_bulk'], plugin)
+
+        # the torrent's metadata expands to the whitelisted fields of the extracted metadata
+        info = bdecode(torrents[0])['info']
+        decoded = info_codec.decode_files(info)
+        expected = extract_metadata(PATHS['audio_bulk'])[2]
+        assert len(decoded) == 2
+        for path, file_info in decoded.items():
+            track_types = [track['track_type'] for track in expected[os.path.join('audio', *path)]['mediainfo']]
+            assert [track['track_type'] for track in file_info['mediainfo']] == track_types
+            assert file_info['tags'] == expected[os.path.join('audio', *path)]['tags']
+
+    def test_analyse_folder_abort(self):
+        params = [
+            '--no-hash-cache',
+            PATHS['audio_bulk'],
+        ]
+        sys.argv.extend(params)
+
+        smarthash = SmartHash()
+        plugin = DefaultPlugin()
+        make_meta_file = smarthash_module.make_meta_file
+        hashed = []
+
+        def hash_until_aborted(path, url, flag, filedone, **kwargs):
+            def wait_for_validation(*hashed_file):
+                hashed.append(hashed_file[0])
+                flag.wait(10)
+                filedone(*hashed_file)
+            return make_meta_file(path, url, flag=flag, filedone=wait_for_validation, **kwargs)
+
+        when(smarthash_module).make_meta_file(...).thenAnswer(hash_until_aborted)
+        when(plugin).early_validation(ANY, ANY).thenRaise(ValidationError(["rejected"]))
+
+        with self.assertRaises(ValidationError):
+            smarthash.analyse_folder(PATHS['audio_bulk'], plugin, StageTimer())
+
+        # the failed validation aborts hashing once the file being hashed is done
+        assert len(hashed) == 1
+
+    def test_analyse_folder_file_digests(self):
+        params = [
+            '--no-hash-cache',
+            PATHS['audio_bulk'],
+            '--extra-digests',
+            'crc32',
+        ]
+        sys.argv.extend(params)
+
+        smarthash = SmartHash()
+        data = smarthash.analyse_folder(PATHS['audio_bulk'], DefaultPlugin(), StageTimer())
+
+        # every file is reported once it is hashed, in torrent order
+        files = bdecode(data['torrent_file'])['info']['files']
+        assert list(data['file_digests']) == [os.path.join('audio', *file['path']) for file in files]
+        assert all(list(digests) == ['crc32'] for digests in data['file_digests'].values())
+
+    def test_analyse_folder_hashing_fails(self):
+        params = [
+            '--no-hash-cache',
+            PATHS['audio_bulk'],
+        ]
+        sys.argv.extend(params)
+
+        smarthash = SmartHash()
+
+        def fail_hashing(path, url, filedone, **kwargs):
+            filedone(['track.mp3'], {})
+            raise OSError("read failed")
+
+        when(smarthash_module).make_meta_file(...).thenAnswer(fail_hashing)
+
+        # the hashed file queue is closed, so that the failure is raised rather than waiting for more files
+        with self.assertRaises(OSError):
+            smarthash.analyse_folder(PATHS['audio_bulk'], DefaultPlugin(), StageTimer())
+
     def test_extract_images(self):
         params = [
             PATHS['video']
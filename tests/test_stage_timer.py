@@ -0,0 +1,39 @@
+import time
+import unittest
+
+from mockito import when, unstub
+
+from tools.stage_timer import StageTimer
+
+
+class StageTimerTests(unittest.TestCase):
+
+    def tearDown(self) -> None:
+        unstub()
+
+    def test_accumulate(self):
+        when(time).perf_counter().thenReturn(0, 1, 3, 4, 5, 5, 7.5, 10)
+        timer = StageTimer()
+
+        with timer.stage('metadata'):
+            pass
+        with timer.stage('hashing'):
+            pass
+        # a stage that fails is still recorded
+        with self.assertRaises(ValueError):
+            with timer.stage('metadata'):
+                raise ValueError()
+
+        assert timer.durations == {'metadata': 4.5, 'hashing': 1}
+        assert list(timer.durations) == ['metadata', 'hashing']
+        assert timer.summary() == "metadata 4.5s, hashing 1.0s, total 10.0s"
+
+    def test_overlapping_stages(self):
+        when(time).perf_counter().thenReturn(0, 1, 2, 6, 9, 10)
+        timer = StageTimer()
+
+        with timer.stage('hashing'):
+            with timer.stage('metadata'):
+                pass
+
+        assert timer.summary() == "metadata 4.0s, hashing 8.0s, total 10.0s (saved 2.0s)"
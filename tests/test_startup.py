@@ -0,0 +1,45 @@
+import os
+import subprocess
+import sys
+import unittest
+from typing import List, Tuple
+
+from tests.test_smarthash import FIXTURES_ROOT
+
+ROOT = os.path.dirname(FIXTURES_ROOT)
+
+# modules only needed by some stages, which must not be loaded at startup
+LAZY_MODULES = ['av', 'cv2', 'imdb', 'libprick', 'magic', 'mutagen', 'numpy', 'pymediainfo', 'qbittorrentapi',
+                'requests', 'transmission_rpc']
+
+
+def import_times(*args: str) -> List[Tuple[str, int, float]]:
+    """Run smarthash.py with -X importtime, returning (name, depth, cumulative seconds) of each module imported"""
+    return run_import_times(['smarthash.py'] + list(args))
+
+
+def run_import_times(args: List[str]) -> List[Tuple[str, int, float]]:
+    """Run the interpreter with -X importtime and the given arguments, returning the modules imported"""
+    result = subprocess.run([sys.executable, '-X', 'importtime'] + args, cwd=ROOT,
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True, check=True)
+
+    times = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        _, cumulative, name = line.split('|')
+        if not cumulative.strip().isdigit():
+            # the header
+            continue
+        # nested imports are indented by two spaces per level
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        times.append((name.strip(), depth, int(cumulative) / 1e6))
+    return times
+
+
+class StartupTests(unittest.TestCase):
+
+    def test_version_lazy_modules(self):
+        imported = {name.split('.')[0] for name, _, _ in import_times('--version')}
+
+        assert not set(LAZY_MODULES) & imported
@@ -0,0 +1,219 @@
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import time
+from typing import Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+from BitTornado.Meta.FileTable import FileTable
+from config import watch_retry_max_interval
+
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+IN_EVENT = struct.Struct('iIII')  # wd, mask, cookie, len, followed by a null-padded name
+
+
+def list_dirs(path: str) -> Set[str]:
+    with os.scandir(path) as entries:
+        return {entry.path for entry in entries if entry.is_dir()}
+
+
+class PollingWatcher:
+    """Reports directories that appear in a folder, by listing it at regular intervals"""
+    mode = "polling"
+
+    def __init__(self, path: str, interval: float):
+        self.path = path
+        self.interval = interval
+        self.known = list_dirs(path)
+
+    def existing(self) -> Set[str]:
+        return set(self.known)
+
+    def poll(self, timeout: float) -> Set[str]:
+        """Wait up to timeout seconds, returning the directories created since the last call"""
+        time.sleep(min(timeout, self.interval))
+        current = list_dirs(self.path)
+        created = current - self.known
+        self.known = current
+        return created
+
+    def close(self) -> None:
+        pass
+
+
+class InotifyWatcher:
+    """Reports directories created in or moved into a folder, using Linux inotify through libc"""
+    mode = "inotify"
+
+    def __init__(self, path: str):
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self.path = path
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+        if libc.inotify_add_watch(self.fd, os.fsencode(path), IN_CREATE | IN_MOVED_TO | IN_DELETE_SELF |
+                                  IN_MOVE_SELF) < 0:
+            error = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(error, f"inotify_add_watch failed: {path}")
+
+        # listed after the watch is added, so that nothing created in between is missed
+        self.known = list_dirs(path)
+
+    def existing(self) -> Set[str]:
+        return set(self.known)
+
+    def poll(self, timeout: float) -> Set[str]:
+        """Wait up to timeout seconds for events, returning the directories created since the last call"""
+        created = set()
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return created
+
+        try:
+            data = os.read(self.fd, 65536)
+        except BlockingIOError:
+            return created
+
+        offset = 0
+        while offset < len(data):
+            _, mask, _, length = IN_EVENT.unpack_from(data, offset)
+            name = data[offset + IN_EVENT.size:offset + IN_EVENT.size + length].rstrip(b'\0')
+            offset += IN_EVENT.size + length
+
+            if mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+                raise FileNotFoundError(errno.ENOENT, "Watched folder was removed", self.path)
+            if mask & IN_Q_OVERFLOW:
+                # events were dropped, so compare a full listing instead
+                current = list_dirs(self.path)
+                created |= current - self.known
+                self.known = current
+            elif mask & IN_ISDIR and name:
+                path = os.path.join(self.path, os.fsdecode(name))
+                created.add(path)
+                self.known.add(path)
+
+        return created
+
+    def close(self) -> None:
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+class StableFileDetector:
+    """
+    Tracks directories until their contents have stopped changing. A directory is stable once it contains files,
+    and the names, sizes and modification times of every file below it have stayed the same for settle_time seconds.
+    Directories that failed to process can be tracked again after a delay, which doubles after each failure
+    """
+    def __init__(self, settle_time: float, clock: Callable[[], float] = time.monotonic, retry_interval: float = 300,
+                 retry_max_interval: float = watch_retry_max_interval):
+        self.settle_time = settle_time
+        self.clock = clock
+        self.retry_interval = retry_interval
+        self.retry_max_interval = retry_max_interval
+        self.pending: Dict[str, Tuple[Optional[tuple], float]] = {}  # path -> (signature, unchanged since)
+        self.failures: Dict[str, Tuple[int, float]] = {}  # path -> (failed attempts, retried from)
+
+    def track(self, path: str) -> None:
+        if path not in self.pending:
+            self.pending[path] = (None, self.clock())
+
+    def retry(self, path: str) -> float:
+        """Track a directory that failed to process again, once the retry delay has passed. Return the delay"""
+        attempts = self.failures.get(path, (0, 0.0))[0] + 1
+        delay = min(self.retry_interval * 2 ** (attempts - 1), self.retry_max_interval)
+        self.failures[path] = (attempts, self.clock() + delay)
+        self.track(path)
+        return delay
+
+    def succeeded(self, path: str) -> None:
+        """Forget the failures of a directory once it has been processed, so that a later failure starts over"""
+        self.failures.pop(path, None)
+
+    @staticmethod
+    def signature(path: str) -> Optional[tuple]:
+        try:
+            return tuple(FileTable(path).iter_files())
+        except OSError:
+            # e.g. a file was removed during the walk
+            return None
+
+    def ready(self) -> List[str]:
+        """Return and stop tracking the directories that are stable, in order of name. Directories that no longer
+        exist are dropped, and those waiting to be retried are held until their delay has passed"""
+        now = self.clock()
+        stable = []
+        for path, (previous, since) in list(self.pending.items()):
+            if not os.path.isdir(path):
+                del self.pending[path]
+                self.failures.pop(path, None)
+                continue
+            if path in self.failures and now < self.failures[path][1]:
+                continue
+
+            signature = self.signature(path)
+            if not signature or signature != previous:
+                self.pending[path] = (signature, now)
+            elif now - since >= self.settle_time:
+                stable.append(path)
+                del self.pending[path]
+
+        return sorted(stable)
+
+
+class FolderWatcher:
+    """
+    Watches a folder for new subdirectories, yielding each one once it has stopped changing. Directories already in
+    the folder are yielded first, once stable. Uses inotify where available, falling back to listing the folder at
+    regular intervals
+    """
+    def __init__(self, path: str, settle_time: float, interval: float, use_inotify: bool = True,
+                 retry_interval: float = 300):
+        self.interval = interval
+        self.detector = StableFileDetector(settle_time, retry_interval=retry_interval)
+        self.watcher = None
+
+        if use_inotify:
+            try:
+                self.watcher = InotifyWatcher(path)
+            except (OSError, AttributeError, TypeError):
+                # not Linux, or out of inotify watches
+                pass
+        if self.watcher is None:
+            self.watcher = PollingWatcher(path, interval)
+
+        self.mode = self.watcher.mode
+        for item in self.watcher.existing():
+            self.detector.track(item)
+
+    def watch(self) -> Iterator[List[str]]:
+        """Yield lists of stable directories, indefinitely"""
+        next_check = time.monotonic()
+        while True:
+            for item in self.watcher.poll(max(0.0, next_check - time.monotonic())):
+                self.detector.track(item)
+
+            if time.monotonic() >= next_check:
+                next_check = time.monotonic() + self.interval
+                stable = self.detector.ready()
+                if stable:
+                    yield stable
+
+    def retry(self, path: str) -> float:
+        """Yield a directory that failed to process again after a delay, which is returned"""
+        return self.detector.retry(path)
+
+    def succeeded(self, path: str) -> None:
+        self.detector.succeeded(path)
+
+    def close(self) -> None:
+        self.watcher.close()
@@ -0,0 +1,60 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Optional
+
+
+class HandoffQueue:
+    """
+    Runs jobs on a background thread, one at a time and in the order they were submitted, so that the caller can
+    carry on with the next item. submit() blocks while the queue is full, holding back a caller that gets ahead of
+    the jobs. A failed job does not stop the ones after it: its error is passed to on_error and set on its future.
+    drain() waits for every job submitted so far, and close() drains before stopping the thread
+    """
+    def __init__(self, size: int, on_error: Callable[[str, BaseException], None] = None):
+        self.queue = queue.Queue(maxsize=size)
+        self.on_error = on_error
+        self.blocked = 0.0  # seconds submit() spent waiting for the queue
+        self.thread = threading.Thread(target=self.run, name='handoff', daemon=True)
+        self.thread.start()
+
+    def submit(self, name: str, func: Callable[[], None]) -> Future:
+        """Queue func, waiting while the queue is full. name identifies the job in errors"""
+        if not self.thread.is_alive():
+            raise RuntimeError("hand-off queue is closed")
+
+        future = Future()
+        start = time.perf_counter()
+        self.queue.put((name, func, future))
+        self.blocked += time.perf_counter() - start
+        return future
+
+    def run(self) -> None:
+        while True:
+            job = self.queue.get()
+            try:
+                if job is None:
+                    return
+                name, func, future = job
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    future.set_result(func())
+                except Exception as e:
+                    logging.error(f"Hand-off failed: {name}", exc_info=e)
+                    future.set_exception(e)
+                    if self.on_error:
+                        self.on_error(name, e)
+            finally:
+                self.queue.task_done()
+
+    def drain(self) -> None:
+        """Wait until every job submitted so far has finished"""
+        self.queue.join()
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join(timeout)
@@ -0,0 +1,125 @@
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+
+from BitTornado.Meta.FileTable import FileEntry
+from config import hash_cache_max_size
+from tools.sqlite_store import SqliteStore
+
+
+class HashCache(SqliteStore):
+    """
+    Persistent cache of piece digests, per-file digests and extracted metadata, keyed by each file's stat signature
+    """
+    filename = 'hash_cache.db'
+    schema = [
+        "CREATE TABLE IF NOT EXISTS pieces (path TEXT, size INTEGER, mtime INTEGER, inode INTEGER, "
+        "piece_length INTEGER, offset INTEGER, digests BLOB, last_used REAL, "
+        "PRIMARY KEY (path, size, mtime, inode, piece_length, offset))",
+        "CREATE TABLE IF NOT EXISTS metadata (path TEXT, size INTEGER, mtime INTEGER, inode INTEGER, "
+        "parent_dir TEXT, info TEXT, last_used REAL, PRIMARY KEY (path, size, mtime, inode, parent_dir))",
+        "CREATE TABLE IF NOT EXISTS file_digests (path TEXT, size INTEGER, mtime INTEGER, inode INTEGER, "
+        "name TEXT, hexdigest TEXT, last_used REAL, PRIMARY KEY (path, size, mtime, inode, name))",
+    ]
+
+    def __init__(self, path: str = None, max_size: int = hash_cache_max_size):
+        super().__init__(path)
+        self.max_size = max_size
+
+    @staticmethod
+    def signature(path: str, entry: FileEntry = None) -> Tuple[str, int, int, int]:
+        """(path, size, mtime, inode), from entry if the file has already been stat'ed"""
+        if entry is None:
+            stat = os.stat(path)
+            entry = FileEntry(None, stat.st_size, stat.st_mtime_ns, stat.st_ino)
+        return os.path.abspath(path), entry.size, entry.mtime, entry.inode
+
+    def get_pieces(self, path: str, piece_length: int, offset: int, entry: FileEntry = None) -> Optional[bytes]:
+        """
+        Look up the digests of the whole pieces contained in a file
+        :param path: file location
+        :param piece_length: torrent piece length
+        :param offset: number of bytes of the file needed to complete the piece started by previous files
+        :param entry: the file's FileEntry, if known
+        :return: concatenated 20 byte digests, or None if the file is not cached
+        """
+        key = self.signature(path, entry) + (piece_length, offset)
+        rows = self.execute("SELECT digests FROM pieces WHERE path=? AND size=? AND mtime=? AND inode=? "
+                            "AND piece_length=? AND offset=?", key)
+        if not rows:
+            return None
+        self.execute("UPDATE pieces SET last_used=? WHERE path=? AND size=? AND mtime=? AND inode=? "
+                     "AND piece_length=? AND offset=?", (time.time(),) + key)
+        return rows[0][0]
+
+    def put_pieces(self, path: str, piece_length: int, offset: int, digests: bytes, entry: FileEntry = None) -> None:
+        self.execute("INSERT OR REPLACE INTO pieces VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                     self.signature(path, entry) + (piece_length, offset, digests, time.time()))
+
+    def get_digests(self, path: str, names: Iterable[str], entry: FileEntry = None) -> Optional[Dict[str, str]]:
+        """
+        Look up the additional digests of a whole file, e.g. crc32 and md5
+        :param path: file location
+        :param names: digest names
+        :param entry: the file's FileEntry, if known
+        :return: {name: hexdigest}, or None unless every digest is cached
+        """
+        key = self.signature(path, entry)
+        rows = dict(self.execute("SELECT name, hexdigest FROM file_digests WHERE path=? AND size=? AND mtime=? "
+                                 "AND inode=?", key))
+        if not set(names) <= set(rows):
+            return None
+        self.execute("UPDATE file_digests SET last_used=? WHERE path=? AND size=? AND mtime=? AND inode=?",
+                     (time.time(),) + key)
+        return {name: rows[name] for name in names}
+
+    def put_digests(self, path: str, digests: Dict[str, str], entry: FileEntry = None) -> None:
+        key = self.signature(path, entry)
+        now = time.time()
+        self.execute_many("INSERT OR REPLACE INTO file_digests VALUES (?, ?, ?, ?, ?, ?, ?)",
+                          [key + (name, hexdigest, now) for name, hexdigest in digests.items()])
+
+    def get_metadata(self, path: str, parent_dir: str, entry: FileEntry = None) -> Tuple[bool, Optional[OrderedDict]]:
+        """
+        Look up the extracted metadata for a file
+        :param path: file location
+        :param parent_dir: directory that paths within the metadata are relative to
+        :param entry: the file's FileEntry, if known
+        :return: (hit, smarthash_info). smarthash_info is None for files with no media metadata
+        """
+        key = self.signature(path, entry) + (parent_dir,)
+        rows = self.execute("SELECT info FROM metadata WHERE path=? AND size=? AND mtime=? AND inode=? "
+                            "AND parent_dir=?", key)
+        if not rows:
+            return False, None
+        self.execute("UPDATE metadata SET last_used=? WHERE path=? AND size=? AND mtime=? AND inode=? "
+                     "AND parent_dir=?", (time.time(),) + key)
+        return True, json.loads(rows[0][0], object_pairs_hook=OrderedDict)
+
+    def put_metadata(self, path: str, parent_dir: str, info: Optional[OrderedDict], entry: FileEntry = None) -> None:
+        self.execute("INSERT OR REPLACE INTO metadata VALUES (?, ?, ?, ?, ?, ?, ?)",
+                     self.signature(path, entry) + (parent_dir, json.dumps(info), time.time()))
+
+    def size(self) -> int:
+        return self.execute("SELECT COALESCE(SUM(LENGTH(digests)), 0) FROM pieces")[0][0] + \
+            self.execute("SELECT COALESCE(SUM(LENGTH(info)), 0) FROM metadata")[0][0] + \
+            self.execute("SELECT COALESCE(SUM(LENGTH(hexdigest)), 0) FROM file_digests")[0][0]
+
+    def evict(self) -> None:
+        """Remove the least recently used entries until the cache fits in max_size"""
+        excess = self.size() - self.max_size
+        if excess <= 0:
+            return
+
+        entries = self.execute("SELECT 'pieces', rowid, LENGTH(digests), last_used FROM pieces UNION ALL "
+                               "SELECT 'metadata', rowid, LENGTH(info), last_used FROM metadata UNION ALL "
+                               "SELECT 'file_digests', rowid, LENGTH(hexdigest), last_used FROM file_digests "
+                               "ORDER BY last_used")
+        with self.lock, self.db:
+            for table, rowid, length, _ in entries:
+                if excess <= 0:
+                    break
+                self.db.execute(f"DELETE FROM {table} WHERE rowid=?", (rowid,))
+                excess -= length
@@ -0,0 +1,151 @@
+import http.cookiejar
+import logging
+import random
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, Optional, TYPE_CHECKING
+from urllib.parse import urlsplit
+
+from termcolor import cprint
+
+# requests is imported by the first request, see functions.import_requests
+if TYPE_CHECKING:
+    from requests import Response, Session
+
+
+class HostMetrics:
+    """Request counts and latencies for one host. Latencies are kept for the most recent requests only"""
+    def __init__(self, window: int = 1000):
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.failures = 0  # attempts that raised, whether or not they were retried
+        self.retries = 0
+        self.total_time = 0.0
+        self.latencies = deque(maxlen=window)
+
+    def record(self, seconds: float) -> None:
+        with self.lock:
+            self.requests += 1
+            self.total_time += seconds
+            self.latencies.append(seconds)
+
+    def record_failure(self, retried: bool) -> None:
+        with self.lock:
+            self.failures += 1
+            self.retries += retried
+
+    def summary(self) -> Dict:
+        with self.lock:
+            latencies = sorted(self.latencies)
+
+            def percentile(p: float) -> float:
+                return latencies[min(len(latencies) - 1, int(len(latencies) * p))] if latencies else 0.0
+
+            return {
+                'requests': self.requests,
+                'failures': self.failures,
+                'retries': self.retries,
+                'mean': self.total_time / self.requests if self.requests else 0.0,
+                'p50': percentile(0.5),
+                'p95': percentile(0.95),
+                'max': latencies[-1] if latencies else 0.0,
+            }
+
+
+class HttpPool:
+    """
+    Shared requests sessions, one per host, so that requests to the same host reuse kept-alive connections. Safe to
+    share between threads: up to max_connections requests run at once per host, and further requests wait for a
+    connection. Connection errors and timeouts are retried with exponential backoff and jitter, starting at
+    retry_interval and doubling up to max_retry_interval, and the latency of each request is recorded per host.
+    Sessions keep no cookies, so that as with separate requests.post calls, cookies set by a response are not sent
+    with later, unrelated requests. Cookies passed with a request are sent
+    """
+    def __init__(self, max_connections: int, retry_interval: float, max_retry_interval: float,
+                 import_requests: Callable):
+        self.max_connections = max_connections
+        self.retry_interval = retry_interval
+        self.max_retry_interval = max_retry_interval
+        self.import_requests = import_requests
+        self.lock = threading.Lock()
+        self.sessions: Dict[str, "Session"] = {}
+        self.slots: Dict[str, threading.BoundedSemaphore] = {}
+        self.metrics: Dict[str, HostMetrics] = {}
+
+    @staticmethod
+    def host(url: str) -> str:
+        parts = urlsplit(url)
+        return f"{parts.scheme}://{parts.netloc}".lower()
+
+    def session(self, url: str) -> "Session":
+        """The session for the url's host, created on first use"""
+        host = self.host(url)
+        with self.lock:
+            if host not in self.sessions:
+                requests = self.import_requests()
+                session = requests.Session()
+                adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=self.max_connections)
+                session.mount(host, adapter)
+                session.cookies.set_policy(http.cookiejar.DefaultCookiePolicy(allowed_domains=[]))
+                self.sessions[host] = session
+                self.slots.setdefault(host, threading.BoundedSemaphore(self.max_connections))
+                self.metrics.setdefault(host, HostMetrics())
+            return self.sessions[host]
+
+    def backoff(self, attempt: int) -> float:
+        """Seconds to wait before retrying after the given failed attempt, between half and all of the doubled
+        interval, so that clients which failed together do not retry together"""
+        interval = min(self.max_retry_interval, self.retry_interval * 2 ** (attempt - 1))
+        return random.uniform(interval / 2, interval)
+
+    def request(self, method: str, url: str, max_attempts: int = 0, **kwargs) -> "Response":
+        """
+        Send a request through the host's session, retrying connection errors and timeouts
+        :param max_attempts: attempts before giving up with the last error, or 0 to retry until the request succeeds
+        """
+        requests = self.import_requests()
+        session = self.session(url)
+        host = self.host(url)
+        metrics = self.metrics[host]
+
+        attempt = 0
+        while True:
+            attempt += 1
+            start = time.perf_counter()
+            try:
+                with self.slots[host]:
+                    response = session.request(method, url, **kwargs)
+                metrics.record(time.perf_counter() - start)
+                return response
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                metrics.record_failure(attempt != max_attempts)
+                if attempt == max_attempts:
+                    raise
+                error, cause = "Connection error", repr(e)
+            except requests.exceptions.RequestException as e:
+                retried = e.response is not None and e.response.status_code in [504] and attempt != max_attempts
+                metrics.record_failure(retried)
+                if not retried:
+                    raise
+                error, cause = f"HTTP error {e.response.status_code}", repr(e)
+
+            delay = self.backoff(attempt)
+            logging.info(f"{method} {url} failed: {cause}, retrying in {delay:.1f}s")
+            cprint(f"{error}, retrying in {delay:.0f} seconds...", 'red')
+            time.sleep(delay)
+
+    def summary(self) -> Optional[str]:
+        """e.g. 'https://tracker: 12 requests, mean 0.21s, p95 0.40s, 1 retries', or None if no request was made"""
+        with self.lock:
+            hosts = [(host, metrics.summary()) for host, metrics in self.metrics.items()]
+        if not hosts:
+            return None
+        return "; ".join(f"{host}: {stats['requests']} requests, mean {stats['mean']:.2f}s, "
+                         f"p95 {stats['p95']:.2f}s, {stats['retries']} retries" for host, stats in hosts)
+
+    def close(self) -> None:
+        with self.lock:
+            for session in self.sessions.values():
+                session.close()
+            self.sessions.clear()
@@ -0,0 +1,58 @@
+import time
+from typing import Optional, Tuple
+
+from config import imdb_cache_ttl, imdb_cache_negative_ttl
+from tools.sqlite_store import SqliteStore
+
+
+class ImdbCache(SqliteStore):
+    """
+    Persistent cache of IMDb lookups, keyed by the IMDb ID looked up. Stores the canonical ID it resolves to and the
+    title, or that the ID does not exist. Found IDs expire after ttl seconds and invalid ones after negative_ttl, a
+    ttl of 0 disables caching
+    """
+    filename = 'imdb_cache.db'
+    schema = [
+        "CREATE TABLE IF NOT EXISTS lookups (imdb_id TEXT PRIMARY KEY, canonical_id TEXT, title TEXT, fetched REAL)",
+    ]
+
+    def __init__(self, path: str = None, ttl: float = imdb_cache_ttl, negative_ttl: float = imdb_cache_negative_ttl):
+        super().__init__(path)
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+
+    def get(self, imdb_id: str) -> Tuple[bool, Optional[Tuple[str, str]]]:
+        """:return: (hit, (canonical_id, title)). A hit without a result means the ID was found to be invalid"""
+        rows = self.execute("SELECT canonical_id, title, fetched FROM lookups WHERE imdb_id=?", (imdb_id,))
+        if not rows:
+            return False, None
+
+        canonical_id, title, fetched = rows[0]
+        ttl = self.ttl if canonical_id is not None else self.negative_ttl
+        if time.time() - fetched >= ttl:
+            return False, None
+        return True, (canonical_id, title) if canonical_id is not None else None
+
+    def put(self, imdb_id: str, canonical_id: Optional[str], title: Optional[str]) -> None:
+        """Record a lookup, with a canonical_id of None if the ID is invalid"""
+        if (self.ttl if canonical_id is not None else self.negative_ttl) <= 0:
+            return
+        now = time.time()
+        with self.lock, self.db:
+            self.db.execute("INSERT OR REPLACE INTO lookups VALUES (?, ?, ?, ?)", (imdb_id, canonical_id, title, now))
+            if canonical_id is not None and canonical_id != imdb_id:
+                # the ID redirected to is valid in its own right
+                self.db.execute("INSERT OR REPLACE INTO lookups VALUES (?, ?, ?, ?)",
+                                (canonical_id, canonical_id, title, now))
+
+    def evict(self) -> None:
+        """Remove expired entries"""
+        now = time.time()
+        self.execute("DELETE FROM lookups WHERE (canonical_id IS NOT NULL AND fetched<=?) OR "
+                     "(canonical_id IS NULL AND fetched<=?)", (now - self.ttl, now - self.negative_ttl))
+
+    @staticmethod
+    def is_not_found(e: Exception) -> bool:
+        """Whether an IMDbDataAccessError means the ID does not exist, rather than that IMDb could not be reached"""
+        details = e.args[0] if e.args else None
+        return isinstance(details, dict) and details.get('errcode') == 404
@@ -0,0 +1,221 @@
+import base64
+import json
+import zlib
+from collections import Counter, OrderedDict
+from typing import Any, Dict, List, Tuple
+
+# Compact encoding of the per-file smarthash_info of a torrent. The torrent's info dict gains a header,
+# 'smarthash_info_format', and each file's 'smarthash_info' holds an encoded payload instead of the full JSON:
+#  - MediaInfo tracks only keep the fields in MEDIAINFO_FIELDS. Everything else (tags, mp3_info, ...) is kept
+#  - dict keys are replaced by their index in the header's key dictionary, in base 36
+#  - values repeated across the torrent's files are stored once in the header, and referenced as {"": index}
+#  - the header and payloads are optionally compressed with zlib, where that makes them smaller. Compressed strings
+#    are base64 encoded, prefixed with 'z'
+# The header is JSON: {"version", "keys", "values"}. Decoders must reject versions they do not know
+
+FORMAT_VERSION = 1
+
+# MediaInfo fields kept by the compact encoding: those used to compose the MediaInfo text (see MIFormat), plus the raw
+# values of the main properties
+MEDIAINFO_FIELDS = frozenset([
+    'track_type', 'track_id', 'unique_id', 'complete_name', 'file_name', 'file_extension', 'format', 'format_info',
+    'format_version', 'format_profile', 'format_settings', 'format_settings__bvop', 'format_settings__qpel',
+    'format_settings__gmc', 'format_settings__matrix', 'codec_settings__cabac', 'codec_settings_refframes',
+    'muxing_mode', 'codec_id', 'codec_id_hint', 'codec_info', 'commercial_name', 'file_size', 'other_file_size',
+    'duration', 'other_duration', 'overall_bit_rate', 'other_overall_bit_rate', 'overall_bit_rate_mode',
+    'other_overall_bit_rate_mode', 'bit_rate', 'other_bit_rate', 'bit_rate_mode', 'other_bit_rate_mode',
+    'maximum_bit_rate', 'other_maximum_bit_rate', 'minimum_bit_rate', 'other_minimum_bit_rate', 'width',
+    'other_width', 'height', 'other_height', 'display_aspect_ratio', 'other_display_aspect_ratio', 'frame_rate',
+    'other_frame_rate', 'frame_rate_mode', 'other_frame_rate_mode', 'original_frame_rate',
+    'other_original_frame_rate', 'color_space', 'chroma_subsampling', 'bit_depth', 'other_bit_depth', 'scan_type',
+    'bits__pixel_frame', 'stream_size', 'other_stream_size', 'writing_application', 'writing_library',
+    'other_writing_library', 'encoding_settings', 'encoded_date', 'language', 'other_language', 'default', 'forced',
+    'title', 'color_range', 'color_primaries', 'transfer_characteristics', 'matrix_coefficients', 'channel_s',
+    'other_channel_s', 'channel_positions', 'sampling_rate', 'other_sampling_rate', 'compression_mode',
+    'other_compression_mode', 'other_alignment', 'other_interleave__duration', 'other_interleave__preload_duration',
+    'other_service_kind', 'count_of_elements', 'text_format_list',
+])
+
+# values whose JSON is shorter than this are not worth a reference
+MIN_SHARED_LENGTH = 8
+
+
+class InfoCodecError(Exception):
+    pass
+
+
+def _json(value: Any) -> str:
+    return json.dumps(value, separators=(',', ':'))
+
+
+def _pack(text: str, compress: bool) -> str:
+    if compress:
+        packed = 'z' + base64.b64encode(zlib.compress(text.encode(), 9)).decode()
+        if len(packed) < len(text):
+            return packed
+    return text
+
+
+def _unpack(text: str) -> str:
+    if text.startswith('z'):
+        return zlib.decompress(base64.b64decode(text[1:])).decode()
+    return text
+
+
+def _filter(info: Dict) -> Dict:
+    """Drop the MediaInfo fields that are not whitelisted"""
+    filtered = OrderedDict(info)
+    if 'mediainfo' in filtered:
+        filtered['mediainfo'] = [OrderedDict((key, value) for key, value in track.items() if key in MEDIAINFO_FIELDS)
+                                 for track in filtered['mediainfo']]
+    return filtered
+
+
+def _is_leaf(value: Any) -> bool:
+    """Scalars and lists of scalars are shared as a whole"""
+    return not isinstance(value, dict) and \
+        not (isinstance(value, list) and any(isinstance(item, (dict, list)) for item in value))
+
+
+def _leaf_key(value: Any) -> Tuple:
+    # typed, so that e.g. 1, 1.0 and True are told apart
+    if isinstance(value, list):
+        return (list,) + tuple((type(item), item) for item in value)
+    return type(value), value
+
+
+def _leaves(value: Any):
+    """Yield every leaf within value"""
+    if _is_leaf(value):
+        yield value
+    else:
+        for item in (value.values() if isinstance(value, dict) else value):
+            yield from _leaves(item)
+
+
+class _Encoder:
+    def __init__(self, shared: List[Any]):
+        self.keys: Dict[str, str] = OrderedDict()
+        self.shared = {_leaf_key(value): i for i, value in enumerate(shared)}
+
+    def key(self, key: str) -> str:
+        if key not in self.keys:
+            self.keys[key] = _base36(len(self.keys))
+        return self.keys[key]
+
+    def encode(self, value: Any) -> Any:
+        if isinstance(value, dict):
+            return OrderedDict((self.key(key), self.encode(item)) for key, item in value.items())
+        if not _is_leaf(value):
+            return [self.encode(item) for item in value]
+        index = self.shared.get(_leaf_key(value))
+        return {'': index} if index is not None else value
+
+
+def _base36(n: int) -> str:
+    digits = '0123456789abcdefghijklmnopqrstuvwxyz'
+    out = digits[n % 36]
+    while n >= 36:
+        n //= 36
+        out = digits[n % 36] + out
+    return out
+
+
+def encode(infos: Dict[str, Dict], compress: bool = False) -> Tuple[str, Dict[str, str]]:
+    """
+    Encode the smarthash_info of each file of a torrent
+    :param infos: smarthash_info by file
+    :param compress: compress with zlib where that saves space
+    :return: (header, payload by file)
+    """
+    filtered = OrderedDict((file, _filter(info)) for file, info in infos.items())
+
+    counts = Counter()
+    leaves = {}
+    for info in filtered.values():
+        for leaf in _leaves(info):
+            key = _leaf_key(leaf)
+            counts[key] += 1
+            leaves.setdefault(key, leaf)
+    shared = [leaves[key] for key, count in counts.items()
+              if count > 1 and len(_json(leaves[key])) >= MIN_SHARED_LENGTH]
+
+    encoder = _Encoder(shared)
+    payloads = OrderedDict((file, _pack(_json(encoder.encode(info)), compress)) for file, info in filtered.items())
+    header = _json(OrderedDict([('version', FORMAT_VERSION), ('keys', list(encoder.keys)),
+                                ('values', shared)]))
+    return _pack(header, compress), payloads
+
+
+class Decoder:
+    """Expands the payloads of a torrent, given its header"""
+    def __init__(self, header: str):
+        try:
+            header = json.loads(_unpack(header))
+        except (ValueError, zlib.error) as e:
+            raise InfoCodecError(f"Invalid smarthash_info header: {e}") from e
+        if header.get('version') != FORMAT_VERSION:
+            raise InfoCodecError(f"Unsupported smarthash_info format version {header.get('version')}")
+
+        self.keys = {_base36(i): key for i, key in enumerate(header['keys'])}
+        self.values = header['values']
+
+    def expand(self, value: Any) -> Any:
+        if isinstance(value, dict):
+            if len(value) == 1 and '' in value:
+                return self.values[value['']]
+            return OrderedDict((self.keys[key], self.expand(item)) for key, item in value.items())
+        if isinstance(value, list):
+            return [self.expand(item) for item in value]
+        return value
+
+    def decode(self, payload: str) -> OrderedDict:
+        try:
+            return self.expand(json.loads(_unpack(payload), object_pairs_hook=OrderedDict))
+        except (ValueError, KeyError, IndexError, zlib.error) as e:
+            raise InfoCodecError(f"Invalid smarthash_info payload: {e}") from e
+
+
+def encode_files(info: Dict, infos: Dict[str, Dict], file_key, compress: bool = False) -> Tuple[int, int]:
+    """
+    Store the compact smarthash_info of each file in a torrent's info dict
+    :param info: the torrent's info dict
+    :param infos: smarthash_info by file
+    :param file_key: function returning the key in infos of a file in info['files'], e.g. its path
+    :param compress: compress with zlib where that saves space
+    :return: (bytes of plain JSON, bytes encoded)
+    """
+    header, payloads = encode(infos, compress)
+    info['smarthash_info_format'] = header
+
+    plain, encoded = 0, len(header)
+    for file in info['files']:
+        key = file_key(file)
+        if key in payloads:
+            file['smarthash_info'] = payloads[key]
+            plain += len(json.dumps(infos[key]))
+            encoded += len(payloads[key])
+    return plain, encoded
+
+
+def decode_files(info: Dict) -> Dict[Tuple[str, ...], OrderedDict]:
+    """
+    Expand the smarthash_info of each file in a torrent's info dict, whether it is compact or plain JSON
+    :return: smarthash_info by file path
+    """
+    header = info.get('smarthash_info_format')
+    decoder = Decoder(header) if header is not None else None
+
+    infos = OrderedDict()
+    for file in info.get('files', []):
+        if 'smarthash_info' not in file:
+            continue
+        payload = file['smarthash_info']
+        infos[tuple(file['path'])] = decoder.decode(payload) if decoder else \
+            json.loads(payload, object_pairs_hook=OrderedDict)
+    return infos
+
+
+def decode(header: str, payload: str) -> OrderedDict:
+    """Expand a single file's payload"""
+    return Decoder(header).decode(payload)
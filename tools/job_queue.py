@@ -0,0 +1,396 @@
+import argparse
+import heapq
+import itertools
+import json
+import logging
+import os
+import selectors
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Dict, List, Optional
+
+import config
+
+
+def default_socket_path() -> str:
+    """Shared by every smarthash invocation of the current user"""
+    return os.path.join(tempfile.gettempdir(), f"smarthash-{os.getuid()}.sock")
+
+
+def send(sock: socket.socket, message: Dict) -> None:
+    sock.sendall(json.dumps(message).encode() + b'\n')
+
+
+class Job:
+    def __init__(self, sock: socket.socket):
+        self.sock = sock
+        self.buffer = b''
+        self.stage = None
+        self.name = None
+        self.key = None
+        self.queued_at = None
+        self.granted = False
+        self.position = None
+
+
+class Stage:
+    def __init__(self, concurrency: int):
+        self.concurrency = concurrency
+        self.running = set()
+        self.waiting = []  # heap of (-priority, sequence, Job)
+        self.granted = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def status(self) -> Dict:
+        return {
+            'concurrency': self.concurrency,
+            'running': sorted(job.name for job in self.running),
+            'queued': [job.name for _, _, job in sorted(self.waiting)],
+            'granted': self.granted,
+            'average_wait': self.total_wait / self.granted if self.granted else 0.0,
+            'max_wait': self.max_wait,
+        }
+
+
+class JobQueueServer:
+    """
+    Grants processing stages to jobs submitted over a Unix socket, one job per connection. Each stage runs up to its
+    concurrency of jobs at a time. Waiting jobs are granted a stage in order of priority, then submission, as soon as
+    a slot is released. A job's stage is released when it asks, or when it disconnects.
+
+    Messages are JSON, one per line. Clients send {"op": "acquire", "stage", "name", "priority"}, {"op": "release"}
+    or {"op": "status"}. The server replies with {"op": "queued", "position", "depth"} whenever a waiting job's
+    position changes, {"op": "granted", "waited", "depth"} and {"op": "status", "stages"}
+    """
+    def __init__(self, path: str, stages: Dict[str, int], idle_timeout: float = 600):
+        self.path = path
+        self.stages = {name: Stage(concurrency) for name, concurrency in stages.items()}
+        self.idle_timeout = idle_timeout
+        self.sequence = itertools.count()
+        self.selector = selectors.DefaultSelector()
+        self.jobs = set()
+        self.server = None
+        self.lock = None
+        self.stopped = False
+
+    def bind(self) -> bool:
+        """Listen on the socket, replacing a stale one. Returns False if another server is already running"""
+        import portalocker
+
+        self.lock = portalocker.Lock(self.path + '.lock', timeout=0, fail_when_locked=True)
+        try:
+            self.lock.acquire()
+        except portalocker.LockException:
+            return False
+
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server.bind(self.path)
+        self.server.listen()
+        self.selector.register(self.server, selectors.EVENT_READ)
+        return True
+
+    def serve(self) -> None:
+        """Serve until stopped, or until no job has been connected for idle_timeout seconds"""
+        idle_since = time.monotonic()
+        try:
+            while not self.stopped:
+                for key, _ in self.selector.select(timeout=0.5):
+                    if key.fileobj is self.server:
+                        self.accept()
+                    else:
+                        self.read(key.data)
+
+                if self.jobs:
+                    idle_since = time.monotonic()
+                elif time.monotonic() - idle_since > self.idle_timeout:
+                    break
+        finally:
+            self.close()
+
+    def stop(self) -> None:
+        self.stopped = True
+
+    def close(self) -> None:
+        for job in list(self.jobs):
+            self.disconnect(job)
+        if self.server is not None:
+            self.selector.unregister(self.server)
+            self.server.close()
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            self.lock.release()
+        self.selector.close()
+
+    def accept(self) -> None:
+        sock, _ = self.server.accept()
+        sock.settimeout(5)  # a client that stops reading is disconnected, rather than blocking the server
+        job = Job(sock)
+        self.jobs.add(job)
+        self.selector.register(sock, selectors.EVENT_READ, job)
+
+    def read(self, job: Job) -> None:
+        try:
+            data = job.sock.recv(4096)
+        except OSError:
+            data = b''
+        if not data:
+            self.disconnect(job)
+            return
+
+        job.buffer += data
+        while b'\n' in job.buffer:
+            line, job.buffer = job.buffer.split(b'\n', 1)
+            try:
+                self.handle(job, json.loads(line))
+            except (ValueError, KeyError, TypeError):
+                self.reply(job, {'op': 'error', 'error': f"invalid message: {line[:100]!r}"})
+            except OSError:
+                self.disconnect(job)
+                return
+
+    def reply(self, job: Job, message: Dict) -> None:
+        try:
+            send(job.sock, message)
+        except OSError:
+            logging.warning(f"Job queue client stopped responding: {job.name}")
+
+    def handle(self, job: Job, message: Dict) -> None:
+        if message['op'] == 'acquire':
+            if job.stage is not None:
+                self.reply(job, {'op': 'error', 'error': "a stage is already held or queued"})
+                return
+            job.stage = self.stages.setdefault(message['stage'], Stage(1))
+            job.name = str(message.get('name', ''))
+            job.key = (-int(message.get('priority', 0)), next(self.sequence), job)
+            job.queued_at = time.monotonic()
+            job.position = None
+            heapq.heappush(job.stage.waiting, job.key)
+            self.dispatch(job.stage)
+
+        elif message['op'] == 'release':
+            self.release(job)
+
+        elif message['op'] == 'status':
+            self.reply(job, {'op': 'status', 'stages': {name: stage.status() for name, stage in self.stages.items()}})
+
+        else:
+            raise KeyError(message['op'])
+
+    def release(self, job: Job) -> None:
+        stage = job.stage
+        if stage is None:
+            return
+        if job.granted:
+            stage.running.discard(job)
+        else:
+            stage.waiting.remove(job.key)
+            heapq.heapify(stage.waiting)
+        job.stage = None
+        job.granted = False
+        self.dispatch(stage)
+
+    def disconnect(self, job: Job) -> None:
+        self.release(job)
+        self.jobs.discard(job)
+        self.selector.unregister(job.sock)
+        job.sock.close()
+
+    def dispatch(self, stage: Stage) -> None:
+        """Grant free slots to the first waiting jobs, then tell the rest of their position"""
+        while stage.waiting and len(stage.running) < stage.concurrency:
+            _, _, job = heapq.heappop(stage.waiting)
+            waited = time.monotonic() - job.queued_at
+            stage.running.add(job)
+            stage.granted += 1
+            stage.total_wait += waited
+            stage.max_wait = max(stage.max_wait, waited)
+            job.granted = True
+            self.reply(job, {'op': 'granted', 'waited': waited, 'depth': len(stage.waiting)})
+
+        for position, (_, _, job) in enumerate(sorted(stage.waiting), 1):
+            if job.position != position:
+                job.position = position
+                self.reply(job, {'op': 'queued', 'position': position, 'depth': len(stage.waiting)})
+
+
+class JobQueue:
+    """
+    Orders processing stages across smarthash invocations, through a job queue server that is started on first use.
+    Where the server cannot be used (no Unix sockets, or a frozen build), every stage falls back to one inter-process
+    lock
+    """
+    CONNECT_TIMEOUT_SECONDS = 5
+
+    def __init__(self, priority: int = 0, path: str = None, stages: Dict[str, int] = None):
+        self.priority = priority
+        self.path = path
+        self.stages = stages or config.job_queue_stages
+        self.sock = None
+        self.file = None
+        self.fallback = None
+
+    def connect(self) -> bool:
+        if not hasattr(socket, 'AF_UNIX'):
+            return False
+        self.path = self.path or default_socket_path()
+
+        deadline = time.monotonic() + JobQueue.CONNECT_TIMEOUT_SECONDS
+        spawned = False
+        while True:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                sock.connect(self.path)
+                self.sock, self.file = sock, sock.makefile('rb')
+                return True
+            except OSError:
+                sock.close()
+
+            if not spawned:
+                spawned = self.spawn()
+                if not spawned:
+                    return False
+            if time.monotonic() > deadline:
+                return False
+            time.sleep(0.05)
+
+    def spawn(self) -> bool:
+        """Start a server in the background, which exits once it has been idle for a while"""
+        if getattr(sys, 'frozen', False):
+            return False
+        args = [sys.executable, '-m', 'tools.job_queue', '--socket', self.path]
+        for name, concurrency in self.stages.items():
+            args += ['--stage', f"{name}={concurrency}"]
+        try:
+            subprocess.Popen(args, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                             stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                             start_new_session=True)
+        except OSError:
+            return False
+        return True
+
+    def close(self) -> None:
+        if self.sock is not None:
+            self.file.close()
+            self.sock.close()
+            self.sock = self.file = None
+
+    def request(self, message: Dict) -> None:
+        if self.sock is None and not self.connect():
+            raise ConnectionError("job queue server unavailable")
+        send(self.sock, message)
+
+    def receive(self) -> Dict:
+        line = self.file.readline()
+        if not line:
+            raise ConnectionError("job queue server disconnected")
+        return json.loads(line)
+
+    def acquire(self, stage: str, name: str) -> float:
+        """Wait for a stage, returning the seconds waited"""
+        if self.fallback is None:
+            for _ in range(2):  # reconnect once, e.g. if the server exited while idle
+                try:
+                    self.request({'op': 'acquire', 'stage': stage, 'name': name, 'priority': self.priority})
+                    while True:
+                        message = self.receive()
+                        if message['op'] == 'queued':
+                            print(f"Queued for {stage}: {message['position']} of {message['depth']}...", end='\r')
+                        elif message['op'] == 'granted':
+                            print(" " * 100, end='\r')  # clear the prompt
+                            return message['waited']
+                        elif message['op'] == 'error':
+                            raise ConnectionError(message['error'])
+                except (OSError, ValueError):
+                    self.close()
+
+            logging.warning("Job queue server unavailable, falling back to a lock file")
+            from tools.process_lock import ProcessLock
+            self.fallback = ProcessLock()
+
+        start = time.monotonic()
+        self.fallback.acquire()
+        return time.monotonic() - start
+
+    def release(self) -> None:
+        if self.fallback is not None:
+            self.fallback.release()
+            return
+        try:
+            self.request({'op': 'release'})
+        except OSError:
+            # the stage is released when the connection closes
+            self.close()
+
+    @contextmanager
+    def stage(self, stage: str, name: str, timer=None):
+        """Hold a stage for the duration of the block. timer optionally records the time spent waiting"""
+        with timer.stage('queued') if timer is not None else nullcontext():
+            waited = self.acquire(stage, name)
+        if waited >= 1:
+            logging.info(f"Waited {waited:.1f}s for {stage}: {name}")
+        try:
+            yield
+        finally:
+            self.release()
+
+    def status(self) -> Optional[Dict]:
+        """Return the running and queued jobs of each stage, with wait times, or None if no server is running"""
+        if not hasattr(socket, 'AF_UNIX'):
+            return None
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(self.path or default_socket_path())
+            send(sock, {'op': 'status'})
+            with sock.makefile('rb') as file:
+                return json.loads(file.readline())['stages']
+        except (OSError, ValueError):
+            return None
+        finally:
+            sock.close()
+
+
+def parse_stage(value: str) -> List:
+    name, concurrency = value.split('=')
+    return [name, int(concurrency)]
+
+
+def main(argv: List[str] = None) -> None:
+    argparser = argparse.ArgumentParser(description="SmartHash job queue server")
+    argparser.add_argument("--socket", default=None, help="Unix socket path")
+    argparser.add_argument("--stage", type=parse_stage, action='append', default=[],
+                           help="Concurrency of a stage, e.g. analyse=2")
+    argparser.add_argument("--idle-timeout", type=float, default=600,
+                           help="Seconds without connected jobs before the server exits")
+    argparser.add_argument("--status", action="store_true", help="Print the queue of a running server")
+    args = argparser.parse_args(argv)
+
+    path = args.socket or default_socket_path()
+    if args.status:
+        stages = JobQueue(path=path).status()
+        if stages is None:
+            print("Job queue server is not running")
+        for name, stage in (stages or {}).items():
+            print(f"{name}: {len(stage['running'])}/{stage['concurrency']} running, {len(stage['queued'])} queued, "
+                  f"waited {stage['average_wait']:.1f}s on average, {stage['max_wait']:.1f}s at most")
+            for job in stage['running']:
+                print(f"  running: {job}")
+            for job in stage['queued']:
+                print(f"  queued:  {job}")
+        return
+
+    server = JobQueueServer(path, dict(config.job_queue_stages, **dict(args.stage)), args.idle_timeout)
+    if server.bind():
+        signal.signal(signal.SIGTERM, lambda *_: server.stop())
+        server.serve()
+
+
+if __name__ == '__main__':
+    main()
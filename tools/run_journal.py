@@ -0,0 +1,137 @@
+import json
+import time
+from collections import OrderedDict
+from enum import IntEnum
+from typing import Dict, List, Optional, Tuple
+
+from pluginmixin import PluginOutput
+from tools.sqlite_store import SqliteStore
+
+
+class ItemState(IntEnum):
+    """The last completed stage of a bulk mode item"""
+    QUEUED = 0
+    METADATA = 1
+    HASHED = 2
+    UPLOADED = 3
+    DONE = 4
+
+
+class RunJournal(SqliteStore):
+    """
+    Records the progress of each item in a bulk mode run, together with the intermediate results needed to continue
+    it from its last completed stage: the extracted metadata, the analysed dataset (torrent and screenshots included)
+    and the plugin output. Artifacts are removed once an item is done
+    """
+    filename = 'run_journal.db'
+    schema = [
+        "CREATE TABLE IF NOT EXISTS items (run TEXT, path TEXT, position INTEGER, state INTEGER, error TEXT, "
+        "updated REAL, PRIMARY KEY (run, path))",
+        "CREATE TABLE IF NOT EXISTS artifacts (run TEXT, path TEXT, name TEXT, data BLOB, "
+        "PRIMARY KEY (run, path, name))",
+    ]
+
+    def __init__(self, run: str, path: str = None):
+        super().__init__(path)
+        self.run = run
+
+    @staticmethod
+    def run_id(path: str, plugin: str) -> str:
+        """Runs are identified by the bulk mode folder and the plugin it is processed with"""
+        return f"{plugin}:{path}"
+
+    def start(self, items: List[str], resume: bool = False) -> None:
+        """
+        Start a run of items. A new run discards the journal of the previous run, a resumed run keeps the state of
+        the items it already contains
+        """
+        with self.lock, self.db:
+            if not resume:
+                self.db.execute("DELETE FROM items WHERE run=?", (self.run,))
+                self.db.execute("DELETE FROM artifacts WHERE run=?", (self.run,))
+            self.db.executemany("INSERT OR IGNORE INTO items VALUES (?, ?, ?, ?, NULL, ?)",
+                                [(self.run, item, i, ItemState.QUEUED, time.time()) for i, item in enumerate(items)])
+
+    def state(self, path: str) -> ItemState:
+        rows = self.execute("SELECT state FROM items WHERE run=? AND path=?", (self.run, path))
+        return ItemState(rows[0][0]) if rows else ItemState.QUEUED
+
+    def summary(self) -> Dict[ItemState, int]:
+        """Number of items in each state"""
+        return {ItemState(state): count for state, count in
+                self.execute("SELECT state, COUNT(*) FROM items WHERE run=? GROUP BY state", (self.run,))}
+
+    def failures(self) -> List[Tuple[str, str]]:
+        """(path, error) of the items that failed at their last attempt, in run order"""
+        return self.execute("SELECT path, error FROM items WHERE run=? AND error IS NOT NULL AND state<? "
+                            "ORDER BY position", (self.run, ItemState.DONE))
+
+    def advance(self, path: str, state: ItemState, artifacts: Dict[str, Optional[bytes]] = None) -> None:
+        """Record that an item completed a stage, along with the artifacts needed to continue from it"""
+        with self.lock, self.db:
+            self.db.execute("INSERT OR REPLACE INTO items VALUES (?, ?, "
+                            "COALESCE((SELECT position FROM items WHERE run=? AND path=?), -1), ?, NULL, ?)",
+                            (self.run, path, self.run, path, state, time.time()))
+            if state == ItemState.DONE:
+                self.db.execute("DELETE FROM artifacts WHERE run=? AND path=?", (self.run, path))
+            else:
+                self.db.executemany("INSERT OR REPLACE INTO artifacts VALUES (?, ?, ?, ?)",
+                                    [(self.run, path, name, data) for name, data in (artifacts or {}).items()])
+
+    def fail(self, path: str, error: str) -> None:
+        """Record an item's error, keeping the stage it reached"""
+        self.execute("UPDATE items SET error=?, updated=? WHERE run=? AND path=?", (error, time.time(), self.run, path))
+
+    def artifact(self, path: str, name: str) -> Tuple[bool, Optional[bytes]]:
+        """:return: (found, data)"""
+        rows = self.execute("SELECT data FROM artifacts WHERE run=? AND path=? AND name=?", (self.run, path, name))
+        return (True, rows[0][0]) if rows else (False, None)
+
+    def save_metadata(self, path: str, total_media_size: int, total_duration: float,
+                      smarthash_info: OrderedDict) -> None:
+        metadata = json.dumps([total_media_size, total_duration, smarthash_info])
+        self.advance(path, ItemState.METADATA, {'metadata': metadata.encode()})
+
+    def load_metadata(self, path: str) -> Optional[Tuple[int, float, OrderedDict]]:
+        """:return: (total_media_size, total_duration, smarthash_info), if the item's metadata was extracted"""
+        if self.state(path) < ItemState.METADATA:
+            return None
+        found, metadata = self.artifact(path, 'metadata')
+        return tuple(json.loads(metadata, object_pairs_hook=OrderedDict)) if found else None
+
+    def save_analysis(self, path: str, data: Dict) -> None:
+        """Store the dataset for the plugin. The torrent and screenshots are stored as they are, everything else
+        apart from the command line arguments as JSON"""
+        analysis = {key: value for key, value in data.items()
+                    if key not in ['args', 'torrent_file', 'extracted_images']}
+        analysis['screenshot_counts'] = [len(images) for images in data['extracted_images']]
+
+        artifacts = {'analysis': json.dumps(analysis).encode(), 'torrent': data['torrent_file']}
+        images = [image for file_images in data['extracted_images'] for image in file_images]
+        artifacts.update((f"screenshot_{i}", image) for i, image in enumerate(images))
+        self.advance(path, ItemState.HASHED, artifacts)
+
+    def load_analysis(self, path: str) -> Optional[Dict]:
+        """:return: the dataset for the plugin without 'args', if the item was analysed"""
+        if self.state(path) < ItemState.HASHED:
+            return None
+        found, analysis = self.artifact(path, 'analysis')
+        if not found:
+            return None
+
+        data = json.loads(analysis, object_pairs_hook=OrderedDict)
+        data['torrent_file'] = self.artifact(path, 'torrent')[1]
+
+        images = iter(self.artifact(path, f"screenshot_{i}")[1] for i in range(sum(data['screenshot_counts'])))
+        data['extracted_images'] = [[next(images) for _ in range(count)] for count in data.pop('screenshot_counts')]
+        return dict(data)
+
+    def save_output(self, path: str, plugin_output: PluginOutput) -> None:
+        self.advance(path, ItemState.UPLOADED, {'output': plugin_output.torrent_data})
+
+    def load_output(self, path: str) -> Optional[PluginOutput]:
+        """:return: the plugin's output, if the item was handed to the plugin"""
+        if self.state(path) < ItemState.UPLOADED:
+            return None
+        found, torrent_data = self.artifact(path, 'output')
+        return PluginOutput(torrent_data) if found else None
@@ -0,0 +1,93 @@
+import heapq
+import logging
+from typing import Callable, List, Optional
+
+import av
+# noinspection PyPackageRequirements
+import cv2
+from av.error import FFmpegError
+
+SCORE_WIDTH = 480  # pixels, frames are downscaled to at most this width before their sharpness is scored
+
+
+def score_frame(frame: av.VideoFrame) -> float:
+    """Sharpness of a frame, as the variance of the Laplacian of a downscaled grayscale copy"""
+    width = min(frame.width, SCORE_WIDTH)
+    height = max(1, round(frame.height * width / frame.width))
+    gray = frame.reformat(width=width, height=height, format='gray').to_ndarray()
+    return cv2.Laplacian(gray, cv2.CV_64F).var()
+
+
+def read_frame(container, stream, target: int, previous: Optional[int]) -> Optional[av.VideoFrame]:
+    """Return the keyframe at or before the target timestamp. If it was already returned for the previous target,
+    decode forward to the target instead, so that each candidate is a different frame"""
+    container.seek(target, stream=stream, backward=True, any_frame=False)
+    decoded = container.decode(stream)
+    frame = next(decoded, None)
+    if frame is None or previous is None or frame.pts is None or frame.pts > previous:
+        return frame
+
+    for frame in decoded:
+        if frame.pts is None or frame.pts >= target and frame.pts > previous:
+            return frame
+    return None
+
+
+def extract_screenshots(path: str, count: int, candidates: int, progress: Callable[[], None] = lambda: None) \
+        -> List[bytes]:
+    """
+    Take JPEG screenshots of a video file. Candidate frames are taken at regular intervals from a range excluding the
+    first and last 10% of the file, and the sharpest are kept, in order
+    :param path: video file
+    :param count: number of screenshots
+    :param candidates: number of candidate frames
+    :param progress: called once per candidate frame
+    :return: JPEG images
+    """
+    chosen = []  # heap of the sharpest (score, -index, frame)
+    taken = 0
+    container = None
+
+    try:
+        container = av.open(path)
+        stream = container.streams.video[0]
+        duration = stream.duration or container.duration / av.time_base / stream.time_base
+        start = (stream.start_time or 0) + duration / 10
+        interval = duration * 8 / 10 / (candidates + 1)
+
+        previous = None
+        for i in range(candidates):
+            try:
+                frame = read_frame(container, stream, int(start + i * interval), previous)
+            except FFmpegError:
+                frame = None
+
+            if frame is not None:
+                previous = frame.pts
+                heapq.heappush(chosen, (score_frame(frame), -i, frame))
+                if len(chosen) > count:
+                    heapq.heappop(chosen)
+            else:
+                logging.error(f"Screenshot extraction failed ({i+1} of {candidates})")
+
+            taken += 1
+            progress()
+
+        # encode only the chosen frames, preserving order
+        images = []
+        for _, _, frame in sorted(chosen, key=lambda x: -x[1]):
+            success, buf = cv2.imencode(".jpeg", frame.to_ndarray(format='bgr24'))
+            if success:
+                images.append(buf.tobytes())
+        return images
+
+    except (FFmpegError, IndexError, TypeError) as e:
+        # unreadable, no video stream or unknown duration
+        logging.error(f"Screenshot extraction failed ({e!r})")
+        for _ in range(taken, candidates):
+            progress()
+        return []
+
+    finally:
+        if container is not None:
+            container.close()
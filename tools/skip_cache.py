@@ -1,80 +1,71 @@
-import platform
-
-import shutil
-
 import json
 import os
+import platform
 from json import JSONDecodeError
 
 from termcolor import cprint
 
-import config
+from tools.sqlite_store import SqliteStore
 
 
-class SkipCache:
-    """Store skipped items in a file to avoid calling a plugin with the same data"""
-    def __init__(self):
+class SkipCache(SqliteStore):
+    """
+    Store skipped items in a database to avoid calling a plugin with the same data. Entries are written as they are
+    added and looked up individually, so neither depends on the number of entries, and concurrent processes see each
+    other's entries immediately. Entries from the previous skip_cache.json are imported on first use
+    """
+    filename = 'skip_cache.db'
+    json_filename = 'skip_cache.json'
+    schema = [
+        "CREATE TABLE IF NOT EXISTS skipped (plugin TEXT, path TEXT, PRIMARY KEY (plugin, path)) WITHOUT ROWID",
+    ]
+
+    def __init__(self, path: str = None):
+        super().__init__(path)
         self.disabled = False
-        self.new_entries = {}
-        self.existing_entries = {}
-        self.load()
+        self.migrate(os.path.join(os.path.dirname(path or self.default_path()), self.json_filename))
 
     def disable(self) -> None:
         self.disabled = True
 
-    def load(self) -> None:
-        if os.path.isfile(SkipCache.__cache_filename()):
-            with open(SkipCache.__cache_filename(), 'r') as f:
-                try:
-                    serializable = json.loads(f.read())
-                    self.existing_entries = {plugin: set(serializable[plugin]) for plugin in serializable.keys()}
-                except JSONDecodeError:
-                    cprint("Error loading skip_cache.json, file may be corrupt", 'red')
-
-    def save(self) -> None:
-        """Save out to a file. Reload existing file in case it's been overwritten by another process."""
-        self.load()
+    def migrate(self, json_path: str) -> None:
+        """Import the entries of a skip_cache.json, then rename it so that it is only imported once"""
+        if not os.path.isfile(json_path):
+            return
 
-        for plugin in self.new_entries:
-            if plugin not in self.existing_entries:
-                self.existing_entries[plugin] = set()
-            self.existing_entries[plugin].update(self.new_entries[plugin])
+        try:
+            with open(json_path, 'r') as f:
+                serializable = json.loads(f.read())
+        except JSONDecodeError:
+            cprint(f"Error loading {self.json_filename}, file may be corrupt", 'red')
+            return
 
-        with open(f"{SkipCache.__cache_filename()}.tmp", 'w') as f:
-            serializable = {plugin: list(self.existing_entries[plugin]) for plugin in self.existing_entries.keys()}
-            f.write(json.dumps(serializable))
-        shutil.move(f"{SkipCache.__cache_filename()}.tmp", SkipCache.__cache_filename())
+        self.execute_many("INSERT OR IGNORE INTO skipped VALUES (?, ?)",
+                          [(plugin, path) for plugin, paths in serializable.items() for path in paths])
+        try:
+            os.replace(json_path, f"{json_path}.migrated")
+        except FileNotFoundError:
+            # migrated concurrently by another process
+            pass
 
-        self.new_entries = {}
+    def save(self) -> None:
+        """Entries are saved as they are added. Compact the database if enough space has been freed"""
+        free, total = self.execute("PRAGMA freelist_count")[0][0], self.execute("PRAGMA page_count")[0][0]
+        if free > total // 4:
+            self.execute("VACUUM")
 
     def add(self, plugin: str, path: str) -> None:
         if self.disabled:
             return
 
-        if plugin not in self.new_entries:
-            self.new_entries[plugin] = set()
-
-        self.new_entries[plugin].add(SkipCache.cache_entry_normalized(path))
-
-        # Save new entries every so often when running large bulk jobs
-        if len(self.new_entries[plugin]) == 5:
-            self.save()
+        self.execute("INSERT OR IGNORE INTO skipped VALUES (?, ?)", (plugin, SkipCache.cache_entry_normalized(path)))
 
     def in_cache(self, plugin, path) -> bool:
         if self.disabled:
             return False
 
-        normalized_path = SkipCache.cache_entry_normalized(path)
-
-        if plugin in self.existing_entries and normalized_path in self.existing_entries[plugin]:
-            return True
-        if plugin in self.new_entries and normalized_path in self.new_entries[plugin]:
-            return True
-        return False
-
-    @staticmethod
-    def __cache_filename() -> str:
-        return os.path.join(os.path.dirname(os.path.abspath(config.__file__)), 'skip_cache.json')
+        return bool(self.execute("SELECT 1 FROM skipped WHERE plugin=? AND path=?",
+                                 (plugin, SkipCache.cache_entry_normalized(path))))
 
     @staticmethod
     def cache_entry_normalized(path: str) -> str:
@@ -0,0 +1,37 @@
+import os
+import sqlite3
+import threading
+from typing import List
+
+import config
+
+
+class SqliteStore:
+    """Base class for SQLite databases stored alongside the config file. Safe to share between threads."""
+    filename = None
+    schema = []
+
+    def __init__(self, path: str = None):
+        self.lock = threading.RLock()
+        self.db = sqlite3.connect(path or self.default_path(), timeout=30, check_same_thread=False)
+        with self.lock, self.db:
+            for statement in self.schema:
+                self.db.execute(statement)
+
+    @classmethod
+    def default_path(cls) -> str:
+        return os.path.join(os.path.dirname(os.path.abspath(config.__file__)), cls.filename)
+
+    def execute(self, sql: str, params=()) -> List:
+        """Run a statement in its own transaction, returning all rows"""
+        with self.lock, self.db:
+            return self.db.execute(sql, params).fetchall()
+
+    def execute_many(self, sql: str, rows: List) -> None:
+        """Run a statement for each row, in a single transaction"""
+        with self.lock, self.db:
+            self.db.executemany(sql, rows)
+
+    def close(self) -> None:
+        with self.lock:
+            self.db.close()
@@ -0,0 +1,28 @@
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+
+class StageTimer:
+    """Record the wall-clock time spent in each processing stage. Stages may overlap."""
+    def __init__(self):
+        self.start_time = time.perf_counter()
+        self.durations = OrderedDict()
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.durations[name] = self.durations.get(name, 0) + time.perf_counter() - start
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.start_time
+
+    def summary(self) -> str:
+        """e.g. 'metadata 1.2s, hashing 8.1s, total 8.4s (saved 0.9s)'"""
+        elapsed = self.elapsed()
+        stages = [f"{name} {duration:.1f}s" for name, duration in self.durations.items()]
+        saved = sum(self.durations.values()) - elapsed
+        return ", ".join(stages + [f"total {elapsed:.1f}s"]) + (f" (saved {saved:.1f}s)" if saved > 0 else "")